@@ -0,0 +1,189 @@
+"""
+ShopPy - Checkout Admission Control
+Keeps checkout orderly during traffic spikes.
+
+Views tagged @workload('checkout') (checkout and the cart mutation APIs)
+need one of ADMISSION_CHECKOUT_CONCURRENCY slots per worker process. When
+all slots are busy the request joins a first-come, first-served waiting
+room. Sync views wait there up to ADMISSION_WAIT_MS, taking over a slot the
+moment one is handed on; after that (at once for async views, which must not
+block the event loop) the request gets a 503 JSON answer with its place in
+line:
+
+    {"success": false, "queued": true, "position": 3, "eta_seconds": 1,
+     "retry_after_ms": 400, "ticket": "...", "message": "..."}
+
+The client resends the same request after retry_after_ms with the ticket in
+an X-Queue-Ticket header (see fetchAdmitted() in layouts/default.html) and
+is admitted once nobody who arrived earlier is still waiting and a slot is
+free. Tickets are signed and carry their arrival time, so a retry that lands
+on another worker still queues by when the customer first arrived. A waiter
+that misses its next poll (twice retry_after_ms, plus a grace period) drops
+out of line, so it never holds up the line on a worker it has left. Beyond
+ADMISSION_MAX_WAITING waiters, requests are turned away with a plain 503.
+"""
+
+import logging
+import math
+import secrets
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core import signing
+from django.http import JsonResponse
+
+from lib.ECommerce.AsyncSupport import HybridMiddleware
+from lib.ECommerce.Workloads import CHECKOUT, busy_response
+
+
+logger = logging.getLogger('shoppy.admission')
+
+TICKET_HEADER = 'X-Queue-Ticket'
+TICKET_SALT = 'shoppy.admission'
+TICKET_MAX_AGE = 600
+POLL_GRACE_SECONDS = 0.5
+
+
+class WaitingRoom:
+    """Per-process slot counter plus the line of tickets waiting for a slot."""
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.changed = threading.Condition()
+        self.active = 0
+        self.waiting = {}  # ticket id -> [arrived_at, drop-out time (inf while waiting here)]
+        self.service_seconds = 0.05  # moving average of admitted request time
+
+    def enter(self, ticket_id, arrived_at, wait=0):
+        """
+        None when admitted (call leave() afterwards), else the place in line
+        (1-based) after waiting up to `wait` seconds, or 0 if the line is full.
+        """
+        deadline = time.monotonic() + wait
+        with self.changed:
+            while True:
+                now = time.monotonic()
+                for waiter in [t for t, (_, drop_at) in self.waiting.items() if drop_at < now]:
+                    del self.waiting[waiter]
+
+                me = (arrived_at, ticket_id)
+                ahead = sum(1 for waiter, (arrived, _) in self.waiting.items()
+                            if waiter != ticket_id and (arrived, waiter) < me)
+                if ahead < self.slots - self.active:
+                    self.waiting.pop(ticket_id, None)
+                    self.active += 1
+                    # Whoever is next may fit in a slot still free
+                    self.changed.notify_all()
+                    return None
+
+                if ticket_id not in self.waiting and len(self.waiting) >= settings.ADMISSION_MAX_WAITING:
+                    return 0
+                position = ahead + 1
+                if now >= deadline:
+                    # Expect the next poll within twice the suggested delay
+                    self.waiting[ticket_id] = [arrived_at, now + 2 * self.retry_after(position) + POLL_GRACE_SECONDS]
+                    return position
+                self.waiting[ticket_id] = [arrived_at, math.inf]
+                self.changed.wait(deadline - now)
+
+    def leave(self, elapsed):
+        with self.changed:
+            self.active -= 1
+            self.service_seconds += (elapsed - self.service_seconds) * 0.2
+            self.changed.notify_all()
+
+    def eta(self, position):
+        """Seconds until `position` is likely to be admitted."""
+        return position * self.service_seconds / self.slots
+
+    def retry_after(self, position):
+        """Seconds a queued client should wait before polling again."""
+        return min(max(self.eta(position), 0.1), 2.0)
+
+
+_room = None
+_room_lock = threading.Lock()
+
+
+def get_waiting_room():
+    global _room
+    with _room_lock:
+        if _room is None:
+            _room = WaitingRoom(max(settings.ADMISSION_CHECKOUT_CONCURRENCY, 1))
+        return _room
+
+
+def read_ticket(request):
+    """(ticket id, arrival time) from the request's ticket, or a new one."""
+    raw = request.headers.get(TICKET_HEADER, '')
+    if raw:
+        try:
+            ticket = signing.loads(raw, salt=TICKET_SALT, max_age=TICKET_MAX_AGE)
+            return ticket['id'], ticket['at']
+        except (signing.BadSignature, KeyError, TypeError):
+            pass
+    return secrets.token_hex(8), time.time()
+
+
+def queued_response(request, room, ticket_id, arrived_at, position):
+    eta = room.eta(position)
+    retry_after_ms = int(room.retry_after(position) * 1000)
+    message = (f"The store is very busy. You're number {position} in line "
+               f"(about {math.ceil(eta)} second{'s' if math.ceil(eta) != 1 else ''}).")
+    ticket = signing.dumps({'id': ticket_id, 'at': arrived_at}, salt=TICKET_SALT, compress=True)
+
+    wants_json = (request.path.startswith('/api/')
+                  or request.headers.get('X-Requested-With') == 'XMLHttpRequest')
+    if not wants_json:
+        return busy_response(request, message, math.ceil(retry_after_ms / 1000))
+    response = JsonResponse({
+        'success': False,
+        'queued': True,
+        'message': message,
+        'position': position,
+        'eta_seconds': math.ceil(eta),
+        'retry_after_ms': retry_after_ms,
+        'ticket': ticket,
+    }, status=503)
+    response['Retry-After'] = str(math.ceil(retry_after_ms / 1000))
+    response[TICKET_HEADER] = ticket
+    return response
+
+
+class AdmissionMiddleware(HybridMiddleware):
+    """Admits checkout-class requests through the waiting room."""
+
+    def release(self, request):
+        started = getattr(request, 'admitted_at', None)
+        if started is not None:
+            get_waiting_room().leave(time.perf_counter() - started)
+
+    def call(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            self.release(request)
+
+    async def acall(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            self.release(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'workload_class', None) != CHECKOUT:
+            return None
+
+        room = get_waiting_room()
+        ticket_id, arrived_at = read_ticket(request)
+        wait = 0 if iscoroutinefunction(view_func) else settings.ADMISSION_WAIT_MS / 1000
+        position = room.enter(ticket_id, arrived_at, wait)
+        if position is None:
+            request.admitted_at = time.perf_counter()
+            return None
+        if position == 0:
+            logger.warning('Turned away %s: waiting room full', request.path)
+            return busy_response(request, 'The store is very busy right now. Please try again in a moment.', 5)
+        return queued_response(request, room, ticket_id, arrived_at, position)
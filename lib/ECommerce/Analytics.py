@@ -0,0 +1,125 @@
+"""
+ShopPy - Analytics Queries
+Date logic shared by the dashboard, reports and customer KPIs.
+
+- Periods become half-open ranges on the raw timestamp,
+  created_at >= start AND created_at < end, with start and end at midnight
+  in the store time zone (TIME_ZONE, set by STORE_TIME_ZONE). Unlike
+  created_at__date, which casts every row, these comparisons range-scan the
+  created_at index.
+- bucketed() groups with TruncDate / TruncHour in the store time zone, so
+  days follow the store's clock on SQLite and PostgreSQL alike (DATE() in
+  .extra() was SQLite-only and always UTC), and fills buckets that have no
+  rows with zero in the same pass.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+
+
+PERIOD_DAYS = {
+    'week': 7,
+    'month': 30,
+    'quarter': 90,
+    'year': 365,
+}
+
+
+def store_today():
+    """Today's date in the store time zone."""
+    return timezone.localdate()
+
+
+def midnight(day):
+    """Start of `day` in the store time zone, as an aware datetime."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class DateRange:
+    """Whole days first_day..last_day (inclusive), queried as [start, end)."""
+
+    def __init__(self, first_day, last_day):
+        self.first_day = first_day
+        self.last_day = last_day
+        self.start = midnight(first_day)
+        self.end = midnight(last_day + timedelta(days=1))
+
+    def q(self, field='created_at'):
+        """Filter for rows whose `field` falls in the range (sargable)."""
+        return Q(**{f'{field}__gte': self.start, f'{field}__lt': self.end})
+
+    @property
+    def granularity(self):
+        """Chart buckets: hours for a single day, else days."""
+        return 'hour' if self.first_day == self.last_day else 'day'
+
+    def buckets(self, granularity):
+        """Every bucket key in the range, in order."""
+        if granularity == 'hour':
+            # Step in UTC so DST changes add or drop an hour, never repeat one
+            tz = timezone.get_current_timezone()
+            hour, end = self.start.astimezone(timezone.utc), self.end.astimezone(timezone.utc)
+            keys = []
+            while hour < end:
+                keys.append(hour.astimezone(tz))
+                hour += timedelta(hours=1)
+            return keys
+        return [self.first_day + timedelta(days=i) for i in range((self.last_day - self.first_day).days + 1)]
+
+
+def last_days(days):
+    """The `days` days ending today (store time)."""
+    today = store_today()
+    return DateRange(today - timedelta(days=days - 1), today)
+
+
+def month_to_date():
+    """The first of this month to today (store time)."""
+    today = store_today()
+    return DateRange(today.replace(day=1), today)
+
+
+def period_range(period, date_from='', date_to=''):
+    """
+    DateRange for the reports period selector: 'today', 'week', 'month',
+    'quarter', 'year' (that many days back through today) or 'custom' with
+    YYYY-MM-DD date_from/date_to. Anything else, or an unparsable custom
+    range, is the last 30 days.
+    """
+    today = store_today()
+    if period == 'today':
+        return DateRange(today, today)
+    if period == 'custom' and date_from and date_to:
+        try:
+            first_day = datetime.strptime(date_from, '%Y-%m-%d').date()
+            last_day = datetime.strptime(date_to, '%Y-%m-%d').date()
+        except ValueError:
+            pass
+        else:
+            return DateRange(min(first_day, last_day), max(first_day, last_day))
+    return DateRange(today - timedelta(days=PERIOD_DAYS.get(period, 30)), today)
+
+
+def bucketed(queryset, date_range, value, granularity='day', field='created_at'):
+    """
+    [(bucket, value)] for every day or hour of `date_range`, where value is
+    the aggregate `value` (e.g. Sum('total_cents')) over the queryset's rows
+    in that bucket, or 0 when it has none.
+    """
+    trunc = TruncHour if granularity == 'hour' else TruncDate
+    rows = queryset.filter(date_range.q(field)).annotate(
+        bucket=trunc(field, tzinfo=timezone.get_current_timezone())
+    ).values('bucket').annotate(value=value).order_by('bucket')
+
+    totals = {row['bucket']: row['value'] for row in rows}
+    return [(bucket, totals.get(bucket) or 0) for bucket in date_range.buckets(granularity)]
+
+
+def bucket_label(bucket):
+    """Chart label: YYYY-MM-DD for days, HH:00 for hours."""
+    if isinstance(bucket, datetime):
+        return bucket.strftime('%H:00')
+    return str(bucket)
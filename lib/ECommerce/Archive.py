@@ -0,0 +1,77 @@
+"""
+ShopPy - Archive Reads
+Reports and customer history over the live and archived order tables.
+
+Finished orders move to the archive tables (see Models/Archive.py), so a
+query over orders has to read both only when what it shows can contain
+archived rows:
+
+- a date range reaches the archive when it starts at or before the newest
+  archived created_at (ArchivedOrder.horizon(), a MAX over an index); the
+  default report periods and every hot view stay on the live tables
+- a customer's history reaches it when the customer has archived orders
+
+order_tables() returns the (order, item) model pairs to run a query over;
+the archive models have the live models' fields and relation names, so the
+same filters, annotations and aggregates work on both and the results are
+added up here. merged_page() pages through several ordered querysets as
+one list.
+"""
+
+import heapq
+from collections import defaultdict
+from itertools import islice
+from operator import attrgetter
+
+from lib.ECommerce.Models.Archive import ArchivedOrder, ArchivedOrderItem
+from lib.ECommerce.Models.Order import Order, OrderItem
+
+
+LIVE = (Order, OrderItem)
+ARCHIVED = (ArchivedOrder, ArchivedOrderItem)
+
+
+def reaches_archive(date_range):
+    """Whether archived orders can fall inside `date_range`."""
+    horizon = ArchivedOrder.horizon()
+    return horizon is not None and date_range.start <= horizon
+
+
+def order_tables(date_range=None, customer_id=None):
+    """
+    [(order model, item model)] a query has to read: the live tables, plus
+    the archive when `date_range` or `customer_id`'s history reaches it.
+    """
+    if date_range is not None and reaches_archive(date_range):
+        return [LIVE, ARCHIVED]
+    if customer_id is not None and ArchivedOrder.objects.filter(customer_id=customer_id).exists():
+        return [LIVE, ARCHIVED]
+    return [LIVE]
+
+
+def merge_totals(querysets, key, fields):
+    """
+    Add up grouped values() rows from several tables:
+    {row[key]: {field: total}} over `fields` (None counts as 0).
+    """
+    totals = defaultdict(lambda: dict.fromkeys(fields, 0))
+    for queryset in querysets:
+        for row in queryset:
+            merged = totals[row[key]]
+            for field in fields:
+                merged[field] += row[field] or 0
+    return dict(totals)
+
+
+def merged_page(querysets, ordering, offset, limit):
+    """
+    Rows offset..offset+limit of `querysets`, each already ordered by
+    `ordering` (one field, '-' for descending), merged as one list. Reads
+    at most offset+limit rows from each.
+    """
+    if len(querysets) == 1:
+        return list(querysets[0][offset:offset + limit])
+    key = attrgetter(ordering.lstrip('-'))
+    heads = [list(queryset[:offset + limit]) for queryset in querysets]
+    merged = heapq.merge(*heads, key=key, reverse=ordering.startswith('-'))
+    return list(islice(merged, offset, offset + limit))
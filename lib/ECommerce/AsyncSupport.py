@@ -0,0 +1,149 @@
+"""
+ShopPy - Async Support
+Helpers for running under ASGI (lib/ECommerce/asgi.py).
+
+Django 4.2 has no async session API, no request.auser() and no async-aware
+login_required/require_POST, so async views use the equivalents here:
+
+- aload_user() / aload_session() resolve the lazy user and session in a
+  worker thread once; afterwards both are plain in-memory objects that are
+  safe to use on the event loop (the session is saved by SessionMiddleware
+  in a thread as usual).
+- async_login_required, async_role_required and async_require_http_methods
+  mirror the sync decorators.
+
+HybridMiddleware is the base for ShopPy middleware that has to serve both
+sync and async views without pinning a thread per request under ASGI.
+"""
+
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.contrib import messages
+from django.http import HttpResponseNotAllowed
+from django.shortcuts import redirect
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+
+
+# =============================================================================
+# MIDDLEWARE
+# =============================================================================
+
+class HybridMiddleware:
+    """
+    Middleware usable in both sync and async chains. Subclasses implement
+    call() (sync) and acall() (async); __call__ dispatches on the chain type.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.acall(request)
+        return self.call(request)
+
+    def call(self, request):
+        return self.get_response(request)
+
+    async def acall(self, request):
+        return await self.get_response(request)
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """WhiteNoise that stays async under ASGI (static lookups are in-memory)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.acall(request)
+        return super().__call__(request)
+
+    async def acall(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+# =============================================================================
+# REQUEST STATE
+# =============================================================================
+
+async def aload_user(request):
+    """Resolve request.user off the event loop; returns the loaded user."""
+    def load():
+        request.user.is_authenticated  # forces the SimpleLazyObject (session + DB)
+        return request.user
+    return await sync_to_async(load)()
+
+
+async def aload_session(request):
+    """Load the session from its backend off the event loop; returns it."""
+    await sync_to_async(request.session.keys)()
+    return request.session
+
+
+# =============================================================================
+# DECORATORS
+# =============================================================================
+
+def async_login_required(view_func):
+    """login_required for async views."""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        from django.contrib.auth.views import redirect_to_login
+
+        user = await aload_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def async_role_required(roles, message):
+    """Like admin_required/customer_required: login plus one of `roles`."""
+    def decorator(view_func):
+        @wraps(view_func)
+        @async_login_required
+        async def wrapper(request, *args, **kwargs):
+            if request.user.role not in roles:
+                await aload_session(request)  # messages are stored in the session
+                messages.error(request, message)
+                return redirect('dashboard')
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def async_require_http_methods(methods):
+    """require_http_methods for async views."""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async_require_GET = async_require_http_methods(['GET'])
+async_require_POST = async_require_http_methods(['POST'])
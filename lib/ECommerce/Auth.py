@@ -5,9 +5,30 @@ Equivalent to Perl ECommerce::Controllers::Auth
 """
 
 from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth.backends import ModelBackend
 from django.contrib import messages
 from lib.ECommerce.Models.User import User
 from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Passwords import PasswordHashBusy, hash_password, verify_password
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend that checks passwords in the hashing pool (see Passwords.py)."""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as wrong passwords
+            hash_password(password)
+            return None
+        if verify_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
 
 
 class Auth:
@@ -18,6 +39,7 @@ class Auth:
         """
         Authenticate and login a user.
         Returns user object on success, None on failure.
+        Raises PasswordHashBusy when the hashing queue is full or a check times out.
         """
         user = authenticate(request, username=username, password=password)
 
@@ -65,12 +87,17 @@ class Auth:
         if User.objects.filter(email=email).exists():
             return {'success': False, 'message': 'Email address already registered'}
 
+        try:
+            password_hash = hash_password(password)
+        except PasswordHashBusy:
+            return {'success': False, 'message': 'We are very busy right now. Please try again in a moment.'}
+
         try:
             # Create user
             user = User.objects.create_user(
                 username=username,
                 email=email,
-                password=password,
+                password_hash=password_hash,
                 role=role
             )
 
@@ -112,6 +139,12 @@ class Auth:
         if customer_id:
             return customer_id
 
+        # Then the cached principal (see Principal.py)
+        customer_id = getattr(request.user, 'principal_customer_id', None)
+        if customer_id:
+            request.session['customer_id'] = customer_id
+            return customer_id
+
         # Then check user's customer profile
         if request.user.is_authenticated and request.user.role == 'customer':
             customer = Customer.get_customer_by_user_id(request.user.id)
@@ -0,0 +1,154 @@
+"""
+ShopPy - Order Changefeed
+Incremental sync for ERP / warehouse integrations (GET /api/orders/changes/).
+
+Instead of paging through the order list, a client keeps an opaque cursor
+and asks for what changed after it:
+
+    GET /api/orders/changes/?cursor=<cursor>&limit=500&channels=orders,timeline
+
+and stores the returned `cursor` for the next call, repeating at once while
+`has_more` is true. An empty cursor starts from the beginning (initial
+sync); cursor=now starts from the current position without returning rows.
+
+Channels:
+- orders     orders whose updated_at is past the cursor, each with its
+             items, read in (updated_at, id) order on the matching index.
+             A changed order shows up again with its latest state.
+- timeline   new order timeline events, in id order.
+- inventory  new inventory ledger rows, in id order.
+
+Each page is a keyset range (no OFFSET, no COUNT). Rows newer than
+CHANGEFEED_SETTLE_SECONDS are held back until the next call (the id-ordered
+channels stop at the first such row), so a transaction that committed after
+a later-stamped one isn't skipped by the cursor. Every write that changes an
+order must bump updated_at (update() calls set it by hand).
+
+The settle window only covers commit skew on the primary, so the feed is
+always read from 'default', never from the replica or the analytics alias:
+a replica snapshot older than the window could hold a later-stamped row
+without an earlier one, and the cursor would move past the earlier one.
+"""
+
+import base64
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Min, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from lib.ECommerce.Models.Order import InventoryTransaction, Order, OrderItem, OrderTimeline
+from lib.ECommerce.Serializers import INVENTORY_FEED, ORDER_FEED, ORDER_ITEM_FEED, TIMELINE_FEED
+
+
+CHANNELS = ('orders', 'timeline', 'inventory')
+
+# Always the primary, see above
+FEED_DB = 'default'
+
+
+class InvalidCursor(ValueError):
+    """A cursor this feed didn't issue (or a bad channel list)."""
+
+
+def encode_cursor(position):
+    raw = json.dumps(position, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """{'orders': [updated_at, id] or None, 'timeline': id, 'inventory': id}."""
+    position = {'orders': None, 'timeline': 0, 'inventory': 0}
+    if not cursor:
+        return position
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if data.get('orders') is not None:
+            updated_at, order_id = data['orders']
+            if parse_datetime(updated_at) is None:
+                raise ValueError(updated_at)
+            position['orders'] = [updated_at, int(order_id)]
+        position['timeline'] = int(data.get('timeline', 0))
+        position['inventory'] = int(data.get('inventory', 0))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise InvalidCursor('Invalid cursor')
+    return position
+
+
+def parse_channels(raw):
+    channels = [channel.strip() for channel in (raw or 'orders').split(',') if channel.strip()]
+    unknown = [channel for channel in channels if channel not in CHANNELS]
+    if unknown or not channels:
+        raise InvalidCursor(f"Unknown channel(s): {', '.join(unknown) or raw}")
+    return channels
+
+
+def current_position():
+    """Cursor position at the newest settled rows (for cursor=now)."""
+    settled = settled_before()
+    latest = Order.objects.using(FEED_DB).filter(updated_at__lt=settled).order_by(
+        '-updated_at', '-id').values_list('updated_at', 'id').first()
+    return {
+        'orders': [latest[0].isoformat(), latest[1]] if latest else None,
+        'timeline': OrderTimeline.objects.using(FEED_DB).filter(created_at__lt=settled).order_by(
+            '-id').values_list('id', flat=True).first() or 0,
+        'inventory': InventoryTransaction.objects.using(FEED_DB).filter(created_at__lt=settled).order_by(
+            '-id').values_list('id', flat=True).first() or 0,
+    }
+
+
+def settled_before():
+    return timezone.now() - timedelta(seconds=settings.CHANGEFEED_SETTLE_SECONDS)
+
+
+def read_changes(cursor, channels, limit):
+    """One page of changes after `cursor`: {'success', <channel>: [...], 'cursor', 'has_more'}."""
+    position = current_position() if cursor == 'now' else decode_cursor(cursor)
+    settled = settled_before()
+    page = {'success': True}
+    has_more = False
+
+    if 'orders' in channels:
+        orders = Order.objects.using(FEED_DB).filter(updated_at__lt=settled)
+        if position['orders']:
+            updated_at, order_id = position['orders']
+            updated_at = parse_datetime(updated_at)
+            orders = orders.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=order_id))
+        rows = ORDER_FEED.build(ORDER_FEED.rows(orders.order_by('updated_at', 'id'))[:limit + 1])
+        has_more |= len(rows) > limit
+        rows = rows[:limit]
+
+        items = {}
+        if rows:
+            item_rows = ORDER_ITEM_FEED.serialize(
+                OrderItem.objects.using(FEED_DB).filter(order_id__in=[row['id'] for row in rows]).order_by('id')
+            )
+            for item in item_rows:
+                items.setdefault(item['order_id'], []).append(item)
+            position['orders'] = [rows[-1]['updated_at'], rows[-1]['id']]
+        for row in rows:
+            row['items'] = items.get(row['id'], [])
+        page['orders'] = rows
+
+    for channel, model, projection in (('timeline', OrderTimeline, TIMELINE_FEED),
+                                       ('inventory', InventoryTransaction, INVENTORY_FEED)):
+        if channel not in channels:
+            continue
+        queryset = model.objects.using(FEED_DB).filter(id__gt=position[channel])
+        # Stop before the first unsettled row, even if later ids have settled
+        frontier = queryset.filter(created_at__gte=settled).aggregate(first=Min('id'))['first']
+        if frontier is not None:
+            queryset = queryset.filter(id__lt=frontier)
+        queryset = queryset.order_by('id')
+        rows = projection.build(projection.rows(queryset)[:limit + 1])
+        has_more |= len(rows) > limit
+        rows = rows[:limit]
+        if rows:
+            position[channel] = rows[-1]['id']
+        page[channel] = rows
+
+    page['cursor'] = encode_cursor(position)
+    page['has_more'] = has_more
+    return page
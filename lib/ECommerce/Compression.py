@@ -0,0 +1,74 @@
+"""
+ShopPy - JSON Compression
+Compresses JSON responses of at least JSON_COMPRESS_MIN_BYTES for clients
+that accept it: brotli ('br') when the optional brotli package is installed,
+gzip otherwise. Smaller bodies go out as they are, since compressing them
+costs more CPU than it saves on the wire. HTML and static files are left to
+the proxy and WhiteNoise.
+"""
+
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from lib.ECommerce.AsyncSupport import HybridMiddleware
+
+try:
+    import brotli
+except ImportError:  # optional, see requirements.txt
+    brotli = None
+
+
+def accepted_encodings(request):
+    """Codings in the request's Accept-Encoding, minus those refused with q=0."""
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').lower().split(','):
+        coding, _, params = part.partition(';')
+        if re.fullmatch(r'\s*q\s*=\s*0(\.0*)?\s*', params):
+            continue
+        if coding.strip():
+            accepted.add(coding.strip())
+    return accepted
+
+
+def compress_json(request, response):
+    """Compress `response` in place when it is JSON, big enough and the client accepts it."""
+    if (not settings.JSON_COMPRESSION_ENABLED
+            or response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith('application/json')):
+        return response
+
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if len(response.content) < settings.JSON_COMPRESS_MIN_BYTES:
+        return response
+
+    accepted = accepted_encodings(request)
+    if brotli is not None and 'br' in accepted:
+        encoding, body = 'br', brotli.compress(response.content, quality=settings.JSON_BROTLI_QUALITY)
+    elif 'gzip' in accepted:
+        encoding, body = 'gzip', gzip.compress(response.content, compresslevel=settings.JSON_GZIP_LEVEL, mtime=0)
+    else:
+        return response
+
+    if len(body) >= len(response.content):
+        return response
+    response.content = body
+    response['Content-Length'] = str(len(body))
+    response['Content-Encoding'] = encoding
+    # The compressed body is a different byte sequence, so a strong ETag must weaken
+    if response.get('ETag', '').startswith('"'):
+        response['ETag'] = 'W/' + response['ETag']
+    return response
+
+
+class CompressionMiddleware(HybridMiddleware):
+    """Applies compress_json() to every response."""
+
+    def call(self, request):
+        return compress_json(request, self.get_response(request))
+
+    async def acall(self, request):
+        return compress_json(request, await self.get_response(request))
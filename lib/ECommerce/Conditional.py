@@ -0,0 +1,106 @@
+"""
+ShopPy - Conditional GET
+ETag / Last-Modified validators for the catalog and order views.
+
+Each view gets a validator: one aggregate query (latest updated_at plus a
+row count, so deletions count too) returning (last_modified, key). When the
+client's If-None-Match / If-Modified-Since still match, the view answers
+304 Not Modified without loading rows or rendering templates.
+
+HTML pages also depend on who is looking: the user, their cart (header
+badge) and the CSRF token in forms. For those views (page=True) that state
+is folded into the ETag, If-Modified-Since alone is not trusted, and a
+pending flash message always gets a full page, or it would never be shown.
+Responses carry Cache-Control: private, no-cache, so browsers revalidate on
+every navigation instead of reusing pages heuristically.
+"""
+
+import hashlib
+import json
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.messages.storage.session import SessionStorage
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from lib.ECommerce.Principal import current_version
+
+
+def viewer_state(request):
+    """What a page shows besides its data: user, principal version, cart, CSRF token."""
+    user = request.user
+    return (
+        user.pk,
+        user.role,
+        current_version(user.pk),
+        json.dumps(request.session.get('cart', []), sort_keys=True),
+        request.META.get('CSRF_COOKIE', ''),
+    )
+
+
+def validators(request, validator, page, args, kwargs):
+    """(etag, last_modified timestamp, honour If-Modified-Since) or None to skip."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    if page and request.session.get(SessionStorage.session_key):
+        return None
+    state = validator(request, *args, **kwargs)
+    if state is None:
+        return None
+
+    last_modified, key = state
+    parts = [request.get_full_path(), last_modified.isoformat() if last_modified else '', key]
+    if page:
+        parts.append(viewer_state(request))
+    digest = hashlib.md5(json.dumps(parts, default=str).encode(), usedforsecurity=False).hexdigest()
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return quote_etag(digest), timestamp, not page
+
+
+def not_modified(request, etag, timestamp, use_last_modified):
+    return get_conditional_response(
+        request, etag=etag, last_modified=timestamp if use_last_modified else None,
+    )
+
+
+def add_headers(response, etag, timestamp):
+    if response.status_code in (200, 304):
+        if not response.has_header('ETag'):
+            response['ETag'] = etag
+        if timestamp is not None and not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(timestamp)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_get(validator, page=True):
+    """
+    Conditional GET for a view. `validator(request, *args, **kwargs)` returns
+    (last_modified, key) or None (no validators for this request, e.g. access
+    denied). Works on sync and async views.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                found = await sync_to_async(validators)(request, validator, page, args, kwargs)
+                if found is None:
+                    return await view_func(request, *args, **kwargs)
+                response = not_modified(request, *found)
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                return add_headers(response, found[0], found[1])
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            found = validators(request, validator, page, args, kwargs)
+            if found is None:
+                return view_func(request, *args, **kwargs)
+            response = not_modified(request, *found)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+            return add_headers(response, found[0], found[1])
+        return wrapper
+    return decorator
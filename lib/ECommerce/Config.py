@@ -6,6 +6,7 @@ This module contains all Django configuration settings for the ShopPy applicatio
 Equivalent to the Perl ECommerce::Config module.
 """
 
+import copy
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -48,11 +49,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'lib.ECommerce.SlowQueryLog.SlowQueryMiddleware',
+    'lib.ECommerce.Tracing.TracingMiddleware',
+    'lib.ECommerce.AsyncSupport.WhiteNoiseMiddleware',  # WhiteNoise, async-capable under ASGI
+    'lib.ECommerce.Compression.CompressionMiddleware',  # gzip/br for large JSON responses
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'lib.ECommerce.Principal.PrincipalMiddleware',  # AuthenticationMiddleware with a cached principal
+    'lib.ECommerce.Profiler.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,6 +83,11 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'lib.ECommerce.wsgi.application'
+ASGI_APPLICATION = 'lib.ECommerce.asgi.application'
+
+# Async JSON endpoints (Controllers/async_routes.py) shadow their sync
+# versions when enabled; asgi.py turns this on unless set explicitly
+ASYNC_API = os.getenv('ASYNC_API', 'False').lower() == 'true'
 
 # Database
 # Use DATABASE_URL for production (PostgreSQL on Render)
@@ -94,14 +104,89 @@ if DATABASE_URL:
         )
     }
 else:
-    # Development: Use SQLite
+    # Development / single node: Use SQLite
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'data' / 'ecommerce.db',
+            'NAME': os.getenv('SQLITE_PATH', str(BASE_DIR / 'data' / 'ecommerce.db')),
+            # A file, not :memory:, so concurrency tests can open several connections
+            'TEST': {'NAME': str(BASE_DIR / 'data' / 'test_ecommerce.db')},
         }
     }
 
+    # Tuned profile: WAL, busy timeout and cache PRAGMAs on every connection,
+    # BEGIN IMMEDIATE for checkout (see lib/ECommerce/backends/sqlite3)
+    if os.getenv('SQLITE_TUNED', 'True').lower() == 'true':
+        DATABASES['default']['ENGINE'] = 'lib.ECommerce.backends.sqlite3'
+        DATABASES['default']['OPTIONS'] = {
+            'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')) / 1000,
+            'transaction_mode': os.getenv('SQLITE_TRANSACTION_MODE', 'DEFERRED'),
+            'pragmas': {
+                'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+                'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+                'cache_size': -int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536')),
+                'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE_MB', '256')) * 1024 * 1024,
+            },
+        }
+
+# Read replica for analytics views (reports, dashboard, customer KPIs, exports).
+# Locally: DATABASE_REPLICA_URL=sqlite:///data/replica.db plus
+# `manage.py sync_replica --interval 5` as the replication stand-in.
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', '10'))
+
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(
+        DATABASE_REPLICA_URL,
+        conn_max_age=DATABASES['default'].get('CONN_MAX_AGE', 0),
+    )
+    if DATABASES['replica']['ENGINE'] == 'django.db.backends.sqlite3':
+        # Same backend and PRAGMAs as the primary
+        DATABASES['replica']['ENGINE'] = DATABASES['default']['ENGINE']
+        DATABASES['replica']['OPTIONS'] = DATABASES['default'].get('OPTIONS', {})
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+# Workload isolation (see lib/ECommerce/Workloads.py): checkout and cart APIs
+# always keep WORKLOAD_CHECKOUT_RESERVED of the WEB_THREADS worker threads;
+# analytics views run WORKLOAD_ANALYTICS_CONCURRENCY at a time on the
+# 'analytics' alias (the replica if configured) with a statement timeout.
+WORKLOAD_ISOLATION = os.getenv('WORKLOAD_ISOLATION', 'True').lower() == 'true'
+WEB_THREADS = int(os.getenv('WEB_THREADS', '4'))  # gunicorn --threads
+WORKLOAD_CHECKOUT_RESERVED = int(os.getenv('WORKLOAD_CHECKOUT_RESERVED', '1'))
+WORKLOAD_ANALYTICS_CONCURRENCY = int(os.getenv('WORKLOAD_ANALYTICS_CONCURRENCY', '1'))
+WORKLOAD_QUEUE_TIMEOUT_MS = float(os.getenv('WORKLOAD_QUEUE_TIMEOUT_MS', '250'))
+ANALYTICS_STATEMENT_TIMEOUT_MS = int(os.getenv('ANALYTICS_STATEMENT_TIMEOUT_MS', '10000'))
+
+if WORKLOAD_ISOLATION:
+    DATABASES['analytics'] = copy.deepcopy(DATABASES.get('replica', DATABASES['default']))
+    DATABASES['analytics']['TEST'] = {'MIRROR': 'default'}
+    analytics_options = DATABASES['analytics'].setdefault('OPTIONS', {})
+    if DATABASES['analytics']['ENGINE'] == 'lib.ECommerce.backends.sqlite3':
+        analytics_options['statement_timeout'] = ANALYTICS_STATEMENT_TIMEOUT_MS
+    elif 'postgresql' in DATABASES['analytics']['ENGINE']:
+        analytics_options['options'] = f'-c statement_timeout={ANALYTICS_STATEMENT_TIMEOUT_MS}'
+    # Last, so CSRF and auth checks run before a request takes a slot
+    MIDDLEWARE.append('lib.ECommerce.Workloads.WorkloadMiddleware')
+
+# Checkout admission control (see lib/ECommerce/Admission.py): checkout and
+# cart mutations run ADMISSION_CHECKOUT_CONCURRENCY at a time per worker; the
+# rest wait their turn in a FIFO waiting room (in-process for up to
+# ADMISSION_WAIT_MS, then by polling with a queue ticket)
+ADMISSION_CONTROL_ENABLED = os.getenv('ADMISSION_CONTROL_ENABLED', 'True').lower() == 'true'
+ADMISSION_CHECKOUT_CONCURRENCY = int(os.getenv('ADMISSION_CHECKOUT_CONCURRENCY', '2'))
+ADMISSION_MAX_WAITING = int(os.getenv('ADMISSION_MAX_WAITING', '500'))
+ADMISSION_WAIT_MS = float(os.getenv('ADMISSION_WAIT_MS', '1000'))
+
+if ADMISSION_CONTROL_ENABLED:
+    MIDDLEWARE.append('lib.ECommerce.Admission.AdmissionMiddleware')
+
+if 'replica' in DATABASES or 'analytics' in DATABASES:
+    DATABASE_ROUTERS = ['lib.ECommerce.DatabaseRouter.ReplicaRouter']
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('lib.ECommerce.Principal.PrincipalMiddleware') + 1,
+        'lib.ECommerce.DatabaseRouter.ReplicaMiddleware',
+    )
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -117,10 +202,59 @@ AUTH_PASSWORD_VALIDATORS = [
 
 # Custom User Model
 AUTH_USER_MODEL = 'ECommerce.User'
+AUTHENTICATION_BACKENDS = ['lib.ECommerce.Auth.PooledModelBackend']
+
+# Cache (login throttle buckets, principal versions). The default is per
+# process; point CACHE_BACKEND/CACHE_LOCATION at a shared cache, e.g.
+# django.core.cache.backends.redis.RedisCache + redis://..., to share them
+# across workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'shoppy'),
+    }
+}
+
+# Authenticated requests reuse the principal kept in the session for up to
+# this many seconds (see Principal.py); 0 looks the user up every request.
+# Only with a shared cache: a per-process cache can't tell other workers that
+# a user was deactivated, so there it is always 0.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+PRINCIPAL_CACHE_TTL = (
+    int(os.getenv('PRINCIPAL_CACHE_TTL', '60'))
+    if CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS else 0
+)
+
+# Password hashing (see Passwords.py): hasher and cost, existing hashes are
+# upgraded on the next login. Hashing runs in PASSWORD_HASH_WORKERS processes
+# per web worker (0 = inline) with at most PASSWORD_HASH_QUEUE_SIZE queued jobs.
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2').lower()  # pbkdf2 or bcrypt
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', '600000'))
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv('PASSWORD_BCRYPT_ROUNDS', '12'))
+PASSWORD_HASHERS = [
+    'lib.ECommerce.Passwords.PBKDF2PasswordHasher',
+    'lib.ECommerce.Passwords.BCryptSHA256PasswordHasher',
+]
+if PASSWORD_HASHER == 'bcrypt':
+    PASSWORD_HASHERS.reverse()  # the first entry hashes new passwords
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '1'))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', '8'))
+PASSWORD_HASH_TIMEOUT_S = float(os.getenv('PASSWORD_HASH_TIMEOUT_S', '10'))
+
+# Login throttle: token buckets per client IP and per username
+LOGIN_THROTTLE_ENABLED = os.getenv('LOGIN_THROTTLE_ENABLED', 'True').lower() == 'true'
+LOGIN_THROTTLE_IP_BURST = int(os.getenv('LOGIN_THROTTLE_IP_BURST', '20'))
+LOGIN_THROTTLE_IP_PER_MINUTE = float(os.getenv('LOGIN_THROTTLE_IP_PER_MINUTE', '10'))
+LOGIN_THROTTLE_USER_BURST = int(os.getenv('LOGIN_THROTTLE_USER_BURST', '5'))
+LOGIN_THROTTLE_USER_PER_MINUTE = float(os.getenv('LOGIN_THROTTLE_USER_PER_MINUTE', '3'))
 
 # Internationalization
 LANGUAGE_CODE = 'en-us'
-TIME_ZONE = 'UTC'
+# Store time zone: day boundaries for the dashboard and reports (stored times stay UTC)
+TIME_ZONE = os.getenv('STORE_TIME_ZONE', 'UTC')
 USE_I18N = True
 USE_TZ = True
 
@@ -145,6 +279,7 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
 
 # Session settings (1 hour expiration like Perl version)
+SESSION_ENGINE = 'lib.ECommerce.Sessions'  # db sessions with tracing spans
 SESSION_COOKIE_AGE = 3600
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 SESSION_COOKIE_HTTPONLY = True  # Prevent JavaScript access
@@ -186,6 +321,89 @@ if not DEBUG:
 # Message settings
 MESSAGE_STORAGE = 'django.contrib.messages.storage.session.SessionStorage'
 
+# Per-request profiler (admin/staff add ?_profile=1 to a URL)
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'False').lower() == 'true'
+PROFILER_DIR = os.getenv('PROFILER_DIR', str(BASE_DIR / 'data' / 'profiles'))
+PROFILER_MAX_PROFILES = int(os.getenv('PROFILER_MAX_PROFILES', '50'))
+
+# Slow query log (rank offenders with `manage.py slow_queries`)
+SLOW_QUERY_ENABLED = os.getenv('SLOW_QUERY_ENABLED', 'False').lower() == 'true'
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '200'))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'False').lower() == 'true'  # plans at report time
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', str(BASE_DIR / 'data' / 'slow_queries.jsonl'))
+
+# Request tracing: phase spans for a sample of requests, exported as OTLP/JSON
+# lines (summarize or merge with `manage.py trace_report`)
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'False').lower() == 'true'
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', str(BASE_DIR / 'data' / 'traces.jsonl'))
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'shoppy')
+
+# JSON response compression (see Compression.py): br if brotli is installed,
+# else gzip, for bodies of at least JSON_COMPRESS_MIN_BYTES
+JSON_COMPRESSION_ENABLED = os.getenv('JSON_COMPRESSION_ENABLED', 'True').lower() == 'true'
+JSON_COMPRESS_MIN_BYTES = int(os.getenv('JSON_COMPRESS_MIN_BYTES', '1024'))
+JSON_GZIP_LEVEL = int(os.getenv('JSON_GZIP_LEVEL', '6'))
+JSON_BROTLI_QUALITY = int(os.getenv('JSON_BROTLI_QUALITY', '5'))
+
+# Cart stock reservations (see Models/Reservation.py): adding to the cart holds
+# the units for STOCK_RESERVATION_MINUTES; `manage.py release_reservations`
+# deletes expired holds
+STOCK_RESERVATIONS_ENABLED = os.getenv('STOCK_RESERVATIONS_ENABLED', 'False').lower() == 'true'
+STOCK_RESERVATION_MINUTES = float(os.getenv('STOCK_RESERVATION_MINUTES', '15'))
+
+# Batch order ingestion (see lib/ECommerce/OrderIngest.py): POST
+# /api/orders/ingest/ with `Authorization: Bearer <token>`, one of the
+# comma-separated ORDER_INGEST_TOKENS (none = endpoint off)
+ORDER_INGEST_TOKENS = [token.strip() for token in os.getenv('ORDER_INGEST_TOKENS', '').split(',') if token.strip()]
+ORDER_INGEST_MAX_BATCH = int(os.getenv('ORDER_INGEST_MAX_BATCH', '1000'))
+
+# Order changefeed (see lib/ECommerce/Changefeed.py): GET /api/orders/changes/
+# with a bearer token from CHANGEFEED_TOKENS (read-only, separate from the
+# ingest tokens; none = endpoint off)
+CHANGEFEED_TOKENS = [token.strip() for token in os.getenv('CHANGEFEED_TOKENS', '').split(',') if token.strip()]
+CHANGEFEED_SETTLE_SECONDS = float(os.getenv('CHANGEFEED_SETTLE_SECONDS', '2'))
+CHANGEFEED_MAX_LIMIT = int(os.getenv('CHANGEFEED_MAX_LIMIT', '1000'))
+
+# Transactional outbox (see Models/Outbox.py and Outbox.py): order and stock
+# changes queue events in their own transaction; `manage.py dispatch_outbox`
+# delivers them to OUTBOX_SINK (stub, file:<path>[.gz] or an http(s) URL)
+OUTBOX_ENABLED = os.getenv('OUTBOX_ENABLED', 'True').lower() == 'true'
+OUTBOX_SINK = os.getenv('OUTBOX_SINK', 'stub')
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '200'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '10'))
+OUTBOX_HTTP_TOKEN = os.getenv('OUTBOX_HTTP_TOKEN', '')
+OUTBOX_HTTP_TIMEOUT_S = float(os.getenv('OUTBOX_HTTP_TIMEOUT_S', '10'))
+
+# Payment capture (see lib/ECommerce/Payments.py): `manage.py capture_payments`
+# captures pending orders through PAYMENT_GATEWAY (stub or http) with
+# PAYMENT_CONCURRENCY gateway calls in flight
+PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'stub')
+PAYMENT_CONCURRENCY = int(os.getenv('PAYMENT_CONCURRENCY', '8'))
+PAYMENT_MAX_ATTEMPTS = int(os.getenv('PAYMENT_MAX_ATTEMPTS', '5'))
+PAYMENT_CLAIM_TIMEOUT_S = float(os.getenv('PAYMENT_CLAIM_TIMEOUT_S', '300'))
+PAYMENT_CURRENCY = os.getenv('PAYMENT_CURRENCY', 'USD')
+PAYMENT_GATEWAY_URL = os.getenv('PAYMENT_GATEWAY_URL', '')
+PAYMENT_GATEWAY_TOKEN = os.getenv('PAYMENT_GATEWAY_TOKEN', '')
+PAYMENT_GATEWAY_TIMEOUT_S = float(os.getenv('PAYMENT_GATEWAY_TIMEOUT_S', '10'))
+PAYMENT_STUB_LATENCY_MS = float(os.getenv('PAYMENT_STUB_LATENCY_MS', '300'))
+PAYMENT_STUB_DECLINE_RATE = float(os.getenv('PAYMENT_STUB_DECLINE_RATE', '0.05'))
+PAYMENT_STUB_ERROR_RATE = float(os.getenv('PAYMENT_STUB_ERROR_RATE', '0.05'))
+
+# Order archive (see Models/Archive.py and Archive.py): `manage.py
+# archive_orders` moves delivered/cancelled/refunded orders unchanged for
+# ARCHIVE_AFTER_DAYS to the archive tables, ARCHIVE_BATCH_SIZE per transaction
+ARCHIVE_AFTER_DAYS = float(os.getenv('ARCHIVE_AFTER_DAYS', '365'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+
+# Customer/order purges (see lib/ECommerce/Purge.py): history is deleted
+# PURGE_CHUNK_SIZE rows per transaction; customers with more than
+# PURGE_INLINE_MAX_ORDERS orders are queued for `manage.py purge_jobs`,
+# which pauses PURGE_CHUNK_PAUSE_MS between chunks
+PURGE_CHUNK_SIZE = int(os.getenv('PURGE_CHUNK_SIZE', '500'))
+PURGE_INLINE_MAX_ORDERS = int(os.getenv('PURGE_INLINE_MAX_ORDERS', '100'))
+PURGE_CHUNK_PAUSE_MS = float(os.getenv('PURGE_CHUNK_PAUSE_MS', '10'))
+
 # =============================================================================
 # APPLICATION CONFIGURATION (Equivalent to Perl %APP_CONFIG)
 # =============================================================================
@@ -8,16 +8,30 @@ from django.urls import path
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.views.decorators.http import require_POST
-from django.http import JsonResponse
-from django.db import models
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from django.http import JsonResponse, FileResponse, Http404
+from django.db import models, transaction
+from django.utils import timezone
 from functools import wraps
+import hmac
 import json
 
+from lib.ECommerce.Analytics import bucket_label, bucketed, last_days, month_to_date, period_range
+from lib.ECommerce.Archive import merge_totals, merged_page, order_tables
+from lib.ECommerce.Changefeed import InvalidCursor, parse_channels, read_changes
 from lib.ECommerce.Models.Product import Product
 from lib.ECommerce.Models.Order import Order
+from lib.ECommerce.Models.Outbox import ORDER_STATUS_CHANGED, OutboxEvent
 from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Purge import PurgeJob
 from lib.ECommerce.Config import PRODUCT_CATEGORIES, ORDER_STATUS
+from lib.ECommerce.Money import cents_to_float, from_cents
+from lib.ECommerce.OrderIngest import ingest_batch
+from lib.ECommerce.Purge import Purger, delete_customer
+from lib.ECommerce.Workloads import workload
+from lib.ECommerce.Profiler import get_profile_path
 
 
 def admin_required(view_func):
@@ -32,6 +46,23 @@ def admin_required(view_func):
     return wrapper
 
 
+def api_token_required(setting_name):
+    """Decorator for integration APIs: require a bearer token listed in settings.<setting_name>."""
+    def decorator(view_func):
+        @wraps(view_func)
+        @csrf_exempt  # no session cookie to protect; the token is the credential
+        def wrapper(request, *args, **kwargs):
+            scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+            valid = scheme.lower() == 'bearer' and any(
+                hmac.compare_digest(token.encode(), allowed.encode()) for allowed in getattr(settings, setting_name)
+            )
+            if not valid:
+                return JsonResponse({'success': False, 'message': 'Invalid or missing API token'}, status=401)
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 # =============================================================================
 # PRODUCT MANAGEMENT
 # =============================================================================
@@ -124,6 +155,8 @@ def product_edit_submit(request, product_id):
 
     try:
         product.save()
+        if product.stock_shard_count:
+            product.set_stock(int(product.stock_quantity))
         messages.success(request, 'Product updated successfully!')
         return redirect('products')
     except Exception as e:
@@ -157,7 +190,8 @@ def product_adjust_stock(request, product_id):
             messages.error(request, 'Quantity cannot be negative')
             return redirect('products')
         
-        old_stock = product.stock_quantity
+        old_stock = product.available_stock()
+        product.stock_quantity = old_stock
         
         if adjustment_type == 'add':
             product.stock_quantity += quantity
@@ -169,7 +203,7 @@ def product_adjust_stock(request, product_id):
             messages.error(request, 'Invalid adjustment type')
             return redirect('products')
         
-        product.save()
+        product.set_stock(product.stock_quantity)
         
         # Create a meaningful success message
         if adjustment_type == 'add':
@@ -197,26 +231,12 @@ def product_adjust_stock(request, product_id):
 @require_POST
 def order_update_status(request, order_id):
     """Update order status."""
-    from lib.ECommerce.Models.Order import OrderTimeline
-    
     order = get_object_or_404(Order, id=order_id)
     new_status = request.POST.get('status', '')
 
     if new_status and new_status != order.status:
-        old_status = order.status
-        order.status = new_status
-        order.save()
-        
-        # Add timeline event
-        status_descriptions = {
-            'pending': 'Order is pending',
-            'processing': 'Order is being processed',
-            'shipped': 'Order has been shipped',
-            'delivered': 'Order has been delivered',
-            'cancelled': 'Order has been cancelled',
-        }
-        description = status_descriptions.get(new_status, f'Status changed to {new_status}')
-        OrderTimeline.add_event(order, new_status, description, request.user)
+        # Saves the status with its timeline and outbox events
+        order.update_status(new_status, request.user)
         
         messages.success(request, f'Order status updated to {new_status}')
 
@@ -227,8 +247,6 @@ def order_update_status(request, order_id):
 @require_POST
 def api_order_update_status(request):
     """API endpoint to update order status (returns JSON)."""
-    from lib.ECommerce.Models.Order import OrderTimeline
-    
     try:
         data = json.loads(request.body)
         order_id = data.get('order_id')
@@ -241,22 +259,8 @@ def api_order_update_status(request):
             }, status=400)
         
         order = get_object_or_404(Order, id=order_id)
-        old_status = order.status
-        
-        if new_status != old_status:
-            order.status = new_status
-            order.save()
-            
-            # Add timeline event
-            status_descriptions = {
-                'pending': 'Order is pending',
-                'processing': 'Order is being processed',
-                'shipped': 'Order has been shipped',
-                'delivered': 'Order has been delivered',
-                'cancelled': 'Order has been cancelled',
-            }
-            description = status_descriptions.get(new_status, f'Status changed to {new_status}')
-            OrderTimeline.add_event(order, new_status, description, request.user)
+        # Saves the status with its timeline and outbox events
+        order.update_status(new_status, request.user)
         
         return JsonResponse({
             'success': True,
@@ -284,7 +288,19 @@ def api_order_bulk_update(request):
                 'message': 'Order IDs and status are required'
             }, status=400)
         
-        updated_count = Order.objects.filter(id__in=order_ids).update(status=new_status)
+        # update() skips auto_now; updated_at feeds the order ETags
+        with transaction.atomic():
+            orders = Order.objects.filter(id__in=order_ids)
+            events = [
+                (ORDER_STATUS_CHANGED, order.id, order.event_payload(status=new_status, previous_status=order.status))
+                for order in orders.exclude(status=new_status).only(
+                    'id', 'order_number', 'customer_id', 'status', 'payment_status', 'total_cents'
+                )
+            ]
+            updated_count = orders.update(status=new_status, updated_at=timezone.now())
+            if new_status == 'cancelled':
+                Order.close_payments(order_ids, request.user)
+            OutboxEvent.publish_many(events)
         
         return JsonResponse({
             'success': True,
@@ -298,15 +314,60 @@ def api_order_bulk_update(request):
         }, status=500)
 
 
+@api_token_required('ORDER_INGEST_TOKENS')
+@require_POST
+def api_order_ingest(request):
+    """API endpoint for connectors to create a batch of orders (returns per-order results)."""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid JSON'}, status=400)
+
+    entries = data.get('orders') if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        return JsonResponse({'success': False, 'message': 'orders must be a non-empty list'}, status=400)
+    if len(entries) > settings.ORDER_INGEST_MAX_BATCH:
+        return JsonResponse({
+            'success': False,
+            'message': f'At most {settings.ORDER_INGEST_MAX_BATCH} orders per batch'
+        }, status=413)
+
+    try:
+        return JsonResponse(ingest_batch(entries))
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': f'Failed to ingest orders: {str(e)}'
+        }, status=500)
+
+
+# Not an analytics workload: the feed must read the primary. On a lagging
+# replica a late commit could land behind the cursor and never be returned
+# (see Changefeed.py)
+@api_token_required('CHANGEFEED_TOKENS')
+@require_GET
+def api_order_changes(request):
+    """API endpoint for ERP/warehouse sync: orders and events changed after ?cursor= (returns JSON)."""
+    try:
+        limit = min(max(int(request.GET.get('limit', 500)), 1), settings.CHANGEFEED_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'limit must be a number'}, status=400)
+
+    try:
+        channels = parse_channels(request.GET.get('channels'))
+        return JsonResponse(read_changes(request.GET.get('cursor', ''), channels, limit))
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+
 @admin_required
 @require_POST
 def order_delete(request, order_id):
     """Delete an order."""
     order = get_object_or_404(Order, id=order_id)
 
-    # Delete order items first
-    order.items.all().delete()
-    order.delete()
+    # Items, timeline and ledger references go first, in short chunks
+    Purger().order(order.id)
 
     messages.success(request, 'Order deleted successfully!')
     return redirect('orders')
@@ -317,11 +378,10 @@ def order_delete(request, order_id):
 # =============================================================================
 
 @admin_required
+@workload('analytics')
 def customers(request):
     """List all customers."""
     from django.db.models import Sum, Count
-    from django.utils import timezone
-    from datetime import timedelta
     
     search = request.GET.get('search', '')
     sort = request.GET.get('sort', 'newest')
@@ -336,7 +396,7 @@ def customers(request):
     # Annotate customers with order count and total spent
     customers_list = customers_list.annotate(
         order_count=Count('orders'),
-        total_spent=Sum('orders__total', filter=~models.Q(orders__status='cancelled'))
+        total_spent_cents=Sum('orders__total_cents', filter=~models.Q(orders__status='cancelled'))
     )
     
     # Apply sorting
@@ -347,30 +407,25 @@ def customers(request):
     elif sort == 'orders':
         customers_list = customers_list.order_by('-order_count')
     elif sort == 'spent':
-        customers_list = customers_list.order_by('-total_spent')
+        customers_list = customers_list.order_by('-total_spent_cents')
     elif sort == 'name':
         customers_list = customers_list.order_by('first_name', 'last_name')
 
     # Calculate KPI stats
-    today = timezone.now()
-    month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
     total_customers = Customer.objects.count()
     
     # Active customers (placed order in last 30 days)
-    active_customers = Customer.objects.filter(
-        orders__created_at__gte=today - timedelta(days=30)
-    ).distinct().count()
+    active_customers = Order.objects.filter(
+        last_days(30).q()
+    ).values('customer_id').distinct().count()
     
     # New customers this month
-    new_this_month = Customer.objects.filter(
-        created_at__gte=month_start
-    ).count()
+    new_this_month = Customer.objects.filter(month_to_date().q()).count()
     
     # Total revenue from all customers
-    total_revenue = Order.objects.exclude(status='cancelled').aggregate(
-        total=Sum('total')
-    )['total'] or 0
+    total_revenue = from_cents(Order.objects.exclude(status='cancelled').aggregate(
+        total=Sum('total_cents')
+    )['total'])
     
     stats = {
         'total_customers': total_customers,
@@ -383,7 +438,9 @@ def customers(request):
     total = customers_list.count()
     start = (page - 1) * per_page
     end = start + per_page
-    customers_page = customers_list[start:end]
+    customers_page = list(customers_list[start:end])
+    for customer in customers_page:
+        customer.total_spent = from_cents(customer.total_spent_cents)
     total_pages = (total + per_page - 1) // per_page
     page_range = range(1, total_pages + 1)
 
@@ -406,29 +463,39 @@ def customer_delete(request, customer_id):
     """Delete a customer."""
     customer = get_object_or_404(Customer, id=customer_id)
 
-    # Also delete associated user if exists
-    if customer.user:
-        customer.user.delete()
-
-    customer.delete()
-    messages.success(request, 'Customer deleted successfully!')
+    # Also deletes the associated user; large histories are purged in the background
+    result = delete_customer(customer, requested_by=request.user)
+    messages.success(request, result['message'])
     return redirect('customers')
 
 
+@admin_required
+@require_GET
+def api_purge_job(request, job_id):
+    """Progress of a background purge (rows deleted per table so far)."""
+    job = get_object_or_404(PurgeJob, id=job_id)
+    return JsonResponse({'success': True, 'job': job.as_dict()})
+
+
 @admin_required
 def customer_detail(request, customer_id):
     """View customer details."""
     customer = get_object_or_404(Customer.objects.select_related('user'), id=customer_id)
     
+    # Live orders, plus archived ones if the customer has any (Archive.py)
+    histories = [order_model.objects.filter(customer=customer) for order_model, _ in order_tables(customer_id=customer.id)]
+
     # Get customer's orders
-    orders = Order.objects.filter(customer=customer).order_by('-created_at')[:10]
+    orders = merged_page([history.order_by('-created_at') for history in histories], '-created_at', 0, 10)
     
     # Calculate stats
     from django.db.models import Sum, Count
-    stats = Order.objects.filter(customer=customer).aggregate(
-        total_orders=Count('id'),
-        total_spent=Sum('total')
-    )
+    stats = {'total_orders': 0, 'total_spent_cents': 0}
+    for history in histories:
+        totals = history.aggregate(total_orders=Count('id'), total_spent_cents=Sum('total_cents'))
+        stats['total_orders'] += totals['total_orders']
+        stats['total_spent_cents'] += totals['total_spent_cents'] or 0
+    stats['total_spent'] = from_cents(stats['total_spent_cents'])
     
     return render(request, 'admin/customer_detail.html', {
         'customer': customer,
@@ -443,11 +510,10 @@ def customer_detail(request, customer_id):
 # =============================================================================
 
 @admin_required
+@workload('analytics')
 def reports(request):
     """Show reports and analytics."""
     from django.db.models import Sum, Count, F
-    from django.utils import timezone
-    from datetime import timedelta
     import json
 
     # Get date range parameters
@@ -456,140 +522,129 @@ def reports(request):
     date_to = request.GET.get('date_to', '')
     
     # Calculate date range
-    today = timezone.now().date()
-    if period == 'today':
-        start_date = today
-        end_date = today
-    elif period == 'week':
-        start_date = today - timedelta(days=7)
-        end_date = today
-    elif period == 'month':
-        start_date = today - timedelta(days=30)
-        end_date = today
-    elif period == 'quarter':
-        start_date = today - timedelta(days=90)
-        end_date = today
-    elif period == 'year':
-        start_date = today - timedelta(days=365)
-        end_date = today
-    elif period == 'custom' and date_from and date_to:
-        from datetime import datetime
-        start_date = datetime.strptime(date_from, '%Y-%m-%d').date()
-        end_date = datetime.strptime(date_to, '%Y-%m-%d').date()
-    else:
-        start_date = today - timedelta(days=30)
-        end_date = today
-
-    # Filter orders by date range
-    orders_in_range = Order.objects.filter(
-        created_at__date__gte=start_date,
-        created_at__date__lte=end_date
-    )
+    date_range = period_range(period, date_from, date_to)
+    start_date, end_date = date_range.first_day, date_range.last_day
 
-    # Total revenue (exclude cancelled)
-    total_revenue = orders_in_range.exclude(status='cancelled').aggregate(
-        total=Sum('total')
-    )['total'] or 0
+    # Live tables, plus the archive when the range reaches it (Archive.py)
+    tables = order_tables(date_range)
+    not_cancelled = ~models.Q(status='cancelled')
 
-    # Total orders
-    total_orders = orders_in_range.count()
+    # Filter orders by date range
+    totals = {'revenue': 0, 'orders': 0, 'products_sold': 0}
+    product_ids = set()
+    status_counts = []
+    product_rows = []
+    customer_rows = []
+    category_rows = []
+    revenue_cents = {}
+    for order_model, item_model in tables:
+        orders_in_range = order_model.objects.filter(date_range.q())
+        items_in_range = item_model.objects.filter(order__in=orders_in_range)
+        sold_in_range = item_model.objects.filter(order__in=orders_in_range.exclude(status='cancelled'))
+
+        # Total revenue (exclude cancelled)
+        totals['revenue'] += orders_in_range.exclude(status='cancelled').aggregate(
+            total=Sum('total_cents')
+        )['total'] or 0
+
+        # Total orders
+        totals['orders'] += orders_in_range.count()
+
+        # Products sold
+        totals['products_sold'] += items_in_range.aggregate(total=Sum('quantity'))['total'] or 0
+        product_ids.update(items_in_range.values_list('product', flat=True).distinct())
+
+        product_rows.append(sold_in_range.values('product_name').annotate(
+            quantity_sold=Sum('quantity'),
+            revenue=Sum('subtotal_cents')
+        ).order_by('-revenue'))
+
+        customer_rows.append(orders_in_range.values('customer_id').annotate(
+            order_count=Count('id'),
+            total_spent_cents=Sum('total_cents', filter=not_cancelled)
+        ).order_by('-total_spent_cents'))
+
+        category_rows.append(sold_in_range.values('product__category').annotate(total=Sum('subtotal_cents')))
+        status_counts.append(orders_in_range.values('status').annotate(count=Count('id')))
+
+        # Chart data - Revenue over time (by hour for a single day)
+        for bucket, cents in bucketed(
+            order_model.objects.exclude(status='cancelled'), date_range, Sum('total_cents'), date_range.granularity
+        ):
+            revenue_cents[bucket] = revenue_cents.get(bucket, 0) + cents
+
+    if len(tables) == 1:
+        # Live tables only: the database ranks, just the top 5 are read
+        product_rows, customer_rows = [product_rows[0][:5]], [customer_rows[0][:5]]
+
+    total_revenue = from_cents(totals['revenue'])
+    total_orders = totals['orders']
 
     # Average order value
     avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
 
-    # Products sold
-    from lib.ECommerce.Models.Order import OrderItem
-    products_sold = OrderItem.objects.filter(
-        order__in=orders_in_range
-    ).aggregate(total=Sum('quantity'))['total'] or 0
-    
-    unique_products = OrderItem.objects.filter(
-        order__in=orders_in_range
-    ).values('product').distinct().count()
+    products_sold = totals['products_sold']
+    unique_products = len(product_ids)
 
     # New customers in period
-    new_customers = Customer.objects.filter(
-        created_at__date__gte=start_date,
-        created_at__date__lte=end_date
-    ).count()
+    new_customers = Customer.objects.filter(date_range.q()).count()
     
     # Returning customers (customers with orders before and during period)
     returning_customers = 0  # Simplified for now
 
     # Top products - limit to 5
-    top_products_data = OrderItem.objects.filter(
-        order__in=orders_in_range.exclude(status='cancelled')
-    ).values('product_name').annotate(
-        quantity_sold=Sum('quantity'),
-        revenue=Sum('subtotal')
-    ).order_by('-revenue')[:5]
+    top_products_data = sorted(
+        merge_totals(product_rows, 'product_name', ['quantity_sold', 'revenue']).items(),
+        key=lambda row: row[1]['revenue'], reverse=True
+    )[:5]
     
     top_products = [
         {
-            'name': p['product_name'],
+            'name': name,
             'quantity_sold': p['quantity_sold'],
-            'revenue': float(p['revenue'] or 0)
+            'revenue': cents_to_float(p['revenue'])
         }
-        for p in top_products_data
+        for name, p in top_products_data
     ]
 
     # Top customers - limit to 5
-    top_customers = Customer.objects.annotate(
-        order_count=Count('orders', filter=models.Q(
-            orders__created_at__date__gte=start_date,
-            orders__created_at__date__lte=end_date
-        )),
-        total_spent=Sum('orders__total', filter=models.Q(
-            orders__created_at__date__gte=start_date,
-            orders__created_at__date__lte=end_date,
-        ) & ~models.Q(orders__status='cancelled'))
-    ).filter(order_count__gt=0).order_by('-total_spent')[:5]
+    top_customers = sorted(
+        merge_totals(customer_rows, 'customer_id', ['order_count', 'total_spent_cents']).items(),
+        key=lambda row: row[1]['total_spent_cents'], reverse=True
+    )[:5]
+    names = Customer.objects.in_bulk([customer_id for customer_id, _ in top_customers])
 
     top_customers_list = [
         {
-            'first_name': c.first_name,
-            'last_name': c.last_name,
-            'order_count': c.order_count,
-            'total_spent': float(c.total_spent or 0)
+            'first_name': names[customer_id].first_name,
+            'last_name': names[customer_id].last_name,
+            'order_count': c['order_count'],
+            'total_spent': cents_to_float(c['total_spent_cents'])
         }
-        for c in top_customers
+        for customer_id, c in top_customers
     ]
 
-    # Chart data - Revenue over time
-    revenue_by_day = orders_in_range.exclude(status='cancelled').extra(
-        select={'day': 'DATE(created_at)'}
-    ).values('day').annotate(
-        daily_revenue=Sum('total')
-    ).order_by('day')
-    
-    revenue_labels = [str(r['day']) for r in revenue_by_day]
-    revenue_data = [float(r['daily_revenue'] or 0) for r in revenue_by_day]
-    
-    # If no data, provide empty arrays
-    if not revenue_labels:
-        revenue_labels = [str(start_date)]
-        revenue_data = [0]
+    revenue_labels = [bucket_label(bucket) for bucket in revenue_cents]
+    revenue_data = [cents_to_float(cents) for cents in revenue_cents.values()]
 
     # Category sales data
-    category_sales = OrderItem.objects.filter(
-        order__in=orders_in_range.exclude(status='cancelled')
-    ).values('product__category').annotate(
-        total=Sum('subtotal')
-    ).order_by('-total')[:6]
+    category_sales = sorted(
+        merge_totals(category_rows, 'product__category', ['total']).items(),
+        key=lambda row: row[1]['total'], reverse=True
+    )[:6]
     
-    category_labels = [c['product__category'] or 'Uncategorized' for c in category_sales]
-    category_data = [float(c['total'] or 0) for c in category_sales]
+    category_labels = [category or 'Uncategorized' for category, _ in category_sales]
+    category_data = [cents_to_float(c['total']) for _, c in category_sales]
     
     if not category_labels:
         category_labels = ['No Data']
         category_data = [0]
 
     # Status distribution
-    status_counts = orders_in_range.values('status').annotate(count=Count('id'))
     status_map = {'pending': 0, 'processing': 0, 'shipped': 0, 'delivered': 0, 'cancelled': 0}
-    for s in status_counts:
-        if s['status'] in status_map:
-            status_map[s['status']] = s['count']
+    for status, s in merge_totals(status_counts, 'status', ['count']).items():
+        if status in status_map:
+            status_map[status] = s['count']
     status_data = [status_map['pending'], status_map['processing'], status_map['shipped'], status_map['delivered'], status_map['cancelled']]
 
     # Build report data
@@ -745,6 +800,19 @@ def reports(request):
     })
 
 
+# =============================================================================
+# PROFILES
+# =============================================================================
+
+@admin_required
+def profile_download(request, profile_id, kind):
+    """Download a stored request profile (pstats file or SQL report)."""
+    path = get_profile_path(profile_id, kind)
+    if path is None or not path.exists():
+        raise Http404('Profile not found')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name)
+
+
 # =============================================================================
 # URL PATTERNS
 # =============================================================================
@@ -772,6 +840,8 @@ urlpatterns = [
     # Order API endpoints
     path('api/orders/update-status/', api_order_update_status, name='api_order_update_status'),
     path('api/orders/bulk-update/', api_order_bulk_update, name='api_order_bulk_update'),
+    path('api/orders/ingest/', api_order_ingest, name='api_order_ingest'),
+    path('api/orders/changes/', api_order_changes, name='api_order_changes'),
 
     # Customers - Admin
     path('customers/', customers, name='admin_customers'),
@@ -780,8 +850,12 @@ urlpatterns = [
     path('customers/<int:customer_id>/', customer_detail, name='customer_detail'),
     path('customers/<int:customer_id>/delete/', customer_delete, name='admin_customer_delete'),
     path('customers/<int:customer_id>/delete/', customer_delete, name='customer_delete'),
+    path('api/purge-jobs/<int:job_id>/', api_purge_job, name='api_purge_job'),
 
     # Reports - Admin
     path('reports/', reports, name='admin_reports'),
     path('reports/', reports, name='reports'),
+
+    # Profiles - Admin
+    path('profiles/<str:profile_id>/<str:kind>/', profile_download, name='profile_download'),
 ]
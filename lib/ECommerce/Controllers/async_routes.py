@@ -0,0 +1,294 @@
+"""
+ShopPy - Async API Routes
+Async versions of the JSON endpoints, served when ASYNC_API is enabled
+(asgi.py enables it). Same URLs, names and responses as the sync views in
+shared_routes, customer_routes and admin_routes, which they shadow.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.urls import path
+from django.http import JsonResponse
+
+from lib.ECommerce.Auth import Auth
+from lib.ECommerce.AsyncSupport import (
+    aload_session, async_login_required, async_require_GET, async_require_POST, async_role_required,
+)
+from lib.ECommerce.Conditional import conditional_get
+from lib.ECommerce.Models.Product import Product
+from lib.ECommerce.Models.Order import Order
+from lib.ECommerce.Models.Reservation import StockReservation
+from lib.ECommerce.Money import cart_json
+from lib.ECommerce.Serializers import PRODUCT_API, InvalidFields, requested_fields
+from lib.ECommerce.Tracing import span
+from lib.ECommerce.Workloads import workload
+
+
+async_admin_required = async_role_required(['admin', 'staff'], 'Access denied. Admin privileges required.')
+async_customer_required = async_role_required(['customer'], 'This page is for customers only.')
+
+
+# =============================================================================
+# PRODUCTS
+# =============================================================================
+
+@async_login_required
+@async_require_GET
+@conditional_get(lambda request: Product.get_catalog_version(), page=False)
+async def api_products(request):
+    """API endpoint for infinite scroll products."""
+    search = request.GET.get('search', '')
+    category = request.GET.get('category', '')
+    page = int(request.GET.get('page', 1))
+    per_page = 10
+
+    if search:
+        products = Product.search_products(search)
+    elif category:
+        products = Product.get_products_by_category(category)
+    else:
+        products = Product.get_active_products()
+
+    try:
+        fields = requested_fields(request, PRODUCT_API)
+    except InvalidFields as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    # Pagination (one extra row instead of a COUNT)
+    start = (page - 1) * per_page
+    end = start + per_page
+    rows = [row async for row in PRODUCT_API.rows(products, fields)[start:end + 1]]
+
+    return JsonResponse({
+        'products': PRODUCT_API.build(rows[:per_page], fields),
+        'has_more': len(rows) > per_page
+    })
+
+
+# =============================================================================
+# CART
+# =============================================================================
+
+@async_login_required
+@async_require_POST
+@workload('checkout')
+async def api_cart_add(request):
+    """API endpoint for adding to cart via JSON."""
+    try:
+        data = json.loads(request.body)
+        product_id = data.get('product_id')
+        quantity = int(data.get('quantity', 1))
+    except (json.JSONDecodeError, ValueError):
+        return JsonResponse({'success': False, 'message': 'Invalid request data'})
+
+    try:
+        with span('cart.product_lookup', product_id=product_id):
+            product = await Product.objects.aget(id=product_id)
+    except Product.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Product not found'})
+
+    session = await aload_session(request)
+    cart = session.get('cart', [])
+
+    # Check stock for the whole cart line (and hold it with reservations)
+    line_quantity = quantity + sum(item['quantity'] for item in cart if str(item['product_id']) == str(product_id))
+    result = await sync_to_async(StockReservation.reserve)(request.user.id, product, line_quantity)
+    if not result['success']:
+        return JsonResponse(result)
+
+    # Check if product already in cart
+    found = False
+    for item in cart:
+        if str(item['product_id']) == str(product_id):
+            item['quantity'] += quantity
+            found = True
+            break
+
+    if not found:
+        cart.append({
+            'product_id': product.id,
+            'name': product.name,
+            'price_cents': product.price_cents,
+            'quantity': quantity,
+            'image_url': product.image_url or '',
+        })
+
+    session['cart'] = cart
+    session.modified = True
+
+    return JsonResponse({
+        'success': True,
+        'product_name': product.name,
+        'cart_count': len(cart)
+    })
+
+
+@async_login_required
+@async_require_POST
+@workload('checkout')
+async def api_cart_update(request):
+    """API endpoint for updating cart item quantity."""
+    try:
+        data = json.loads(request.body)
+        product_id = data.get('product_id')
+        quantity = int(data.get('quantity', 1))
+    except (json.JSONDecodeError, ValueError):
+        return JsonResponse({'success': False, 'message': 'Invalid request data'})
+
+    if quantity < 1:
+        return JsonResponse({'success': False, 'message': 'Invalid quantity'})
+
+    try:
+        with span('cart.product_lookup', product_id=product_id):
+            product = await Product.objects.aget(id=product_id)
+    except Product.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Product not found'})
+
+    session = await aload_session(request)
+    cart = session.get('cart', [])
+
+    # Update quantity for the product
+    line = next((item for item in cart if str(item['product_id']) == str(product_id)), None)
+    if line is None:
+        return JsonResponse({'success': False, 'message': 'Product not in cart'})
+
+    # Check stock (and hold it with reservations)
+    result = await sync_to_async(StockReservation.reserve)(request.user.id, product, quantity)
+    if not result['success']:
+        return JsonResponse(result)
+    line['quantity'] = quantity
+
+    session['cart'] = cart
+    session.modified = True
+
+    return JsonResponse({
+        'success': True,
+        'cart_count': len(cart),
+        **cart_json(cart),
+    })
+
+
+@async_login_required
+@async_require_POST
+@workload('checkout')
+async def api_cart_remove(request):
+    """API endpoint for removing item from cart."""
+    try:
+        data = json.loads(request.body)
+        product_id = data.get('product_id')
+    except (json.JSONDecodeError, ValueError):
+        return JsonResponse({'success': False, 'message': 'Invalid request data'})
+
+    session = await aload_session(request)
+    cart = [item for item in session.get('cart', []) if str(item['product_id']) != str(product_id)]
+    session['cart'] = cart
+    session.modified = True
+    await sync_to_async(StockReservation.release)(request.user.id, product_id)
+
+    return JsonResponse({
+        'success': True,
+        'cart_count': len(cart),
+        **cart_json(cart),
+    })
+
+
+@async_login_required
+@async_require_POST
+@workload('checkout')
+async def api_cart_clear(request):
+    """API endpoint for clearing the entire cart."""
+    session = await aload_session(request)
+    session['cart'] = []
+    session.modified = True
+    await sync_to_async(StockReservation.release)(request.user.id)
+
+    return JsonResponse({
+        'success': True,
+        'message': 'Cart cleared successfully',
+        'cart_count': 0
+    })
+
+
+# =============================================================================
+# ORDERS
+# =============================================================================
+
+@async_customer_required
+@async_require_POST
+async def api_order_cancel(request):
+    """API endpoint for cancelling an order."""
+    try:
+        data = json.loads(request.body)
+        order_id = data.get('order_id')
+    except (json.JSONDecodeError, ValueError):
+        return JsonResponse({'success': False, 'message': 'Invalid request data'})
+
+    try:
+        order = await Order.objects.aget(id=order_id)
+    except Order.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Order not found'})
+
+    # Verify order belongs to customer
+    customer_id = await sync_to_async(Auth.get_customer_id)(request)
+    if order.customer_id != customer_id:
+        return JsonResponse({'success': False, 'message': 'Access denied'})
+
+    if order.status != 'pending':
+        return JsonResponse({'success': False, 'message': 'Only pending orders can be cancelled'})
+
+    # Stock restore runs in one transaction, which Django only supports in sync code
+    result = await sync_to_async(order.cancel_order)()
+
+    return JsonResponse(result)
+
+
+@async_admin_required
+@async_require_POST
+async def api_order_update_status(request):
+    """API endpoint to update order status (returns JSON)."""
+    try:
+        data = json.loads(request.body)
+        order_id = data.get('order_id')
+        new_status = data.get('status')
+
+        if not order_id or not new_status:
+            return JsonResponse({
+                'success': False,
+                'message': 'Order ID and status are required'
+            }, status=400)
+
+        try:
+            order = await Order.objects.aget(id=order_id)
+        except Order.DoesNotExist:
+            return JsonResponse({'success': False, 'message': 'Order not found'}, status=404)
+
+        # Status, timeline and outbox events in one transaction (sync only in Django)
+        await sync_to_async(order.update_status)(new_status, request.user)
+
+        return JsonResponse({
+            'success': True,
+            'message': f'Order status updated to {new_status}'
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        }, status=500)
+
+
+# =============================================================================
+# URL PATTERNS
+# =============================================================================
+
+urlpatterns = [
+    path('api/products/', api_products, name='api_products'),
+
+    path('api/cart/add/', api_cart_add, name='api_cart_add'),
+    path('api/cart/update/', api_cart_update, name='api_cart_update'),
+    path('api/cart/remove/', api_cart_remove, name='api_cart_remove'),
+    path('api/cart/clear/', api_cart_clear, name='api_cart_clear'),
+
+    path('api/order/cancel/', api_order_cancel, name='api_order_cancel'),
+    path('api/orders/update-status/', api_order_update_status, name='api_order_update_status'),
+]
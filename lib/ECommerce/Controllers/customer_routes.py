@@ -11,12 +11,19 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from functools import wraps
+import uuid
 
 from lib.ECommerce.Auth import Auth
 from lib.ECommerce.Models.Product import Product
-from lib.ECommerce.Models.Order import Order
+from lib.ECommerce.Models.Order import IdempotencyKey, Order
 from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Reservation import StockReservation
 from lib.ECommerce.Config import APP_CONFIG
+from lib.ECommerce.Money import cart_json, cart_totals, from_cents, item_price_cents, to_cents
+from lib.ECommerce.Passwords import PasswordHashBusy, hash_password, throttle_login, verify_password
+from lib.ECommerce.Purge import delete_customer
+from lib.ECommerce.Tracing import span
+from lib.ECommerce.Workloads import workload
 
 
 def customer_required(view_func):
@@ -38,18 +45,26 @@ def customer_required(view_func):
 @login_required
 def cart(request):
     """View shopping cart."""
-    cart_items = request.session.get('cart', [])
+    cart = request.session.get('cart', [])
 
-    # Ensure each cart item has an image_url and calculate subtotal
-    for item in cart_items:
+    # Ensure each cart item has an image_url
+    for item in cart:
         if not item.get('image_url'):
             try:
                 product = Product.objects.get(id=item['product_id'])
                 item['image_url'] = product.image_url
             except Product.DoesNotExist:
                 item['image_url'] = ''
-        # Calculate item subtotal
-        item['subtotal'] = float(item['price']) * int(item['quantity'])
+
+    # Display copies with Decimal dollars (the session keeps cents)
+    cart_items = []
+    for item in cart:
+        price_cents = item_price_cents(item)
+        cart_items.append(dict(
+            item,
+            price=from_cents(price_cents),
+            subtotal=from_cents(price_cents * int(item['quantity'])),
+        ))
 
     # Get customer's address
     customer_address = ''
@@ -62,38 +77,36 @@ def cart(request):
             pass
 
     # Calculate totals
-    subtotal = sum(item['price'] * item['quantity'] for item in cart_items)
+    totals = cart_totals(cart)
     tax_rate = APP_CONFIG.get('tax_rate', 0.08)
-    shipping_rate = APP_CONFIG.get('shipping_rate', 5.00)
-    free_shipping_threshold = APP_CONFIG.get('free_shipping_threshold', 100.00)
-
-    tax = subtotal * tax_rate
-    shipping = 0 if subtotal >= free_shipping_threshold else shipping_rate
-    total = subtotal + tax + shipping
+    free_shipping_threshold = from_cents(to_cents(APP_CONFIG.get('free_shipping_threshold', 100.00)))
 
     return render(request, 'customer/cart.html', {
         'cart_items': cart_items,
         'cart_count': len(cart_items),
-        'cart_subtotal': subtotal,
-        'cart_tax': tax,
+        'cart_subtotal': from_cents(totals['subtotal_cents']),
+        'cart_tax': from_cents(totals['tax_cents']),
         'tax_rate': tax_rate * 100,
-        'cart_shipping': shipping,
-        'cart_total': total,
+        'cart_shipping': from_cents(totals['shipping_cents']),
+        'cart_total': from_cents(totals['total_cents']),
         'customer_address': customer_address,
         'free_shipping_threshold': free_shipping_threshold,
+        'checkout_key': uuid.uuid4().hex,
         'role': request.user.role,
     })
 
 
 @login_required
 @require_POST
+@workload('checkout')
 def cart_add(request):
     """Add item to cart."""
     product_id = request.POST.get('product_id')
     quantity = int(request.POST.get('quantity', 1))
 
     try:
-        product = Product.objects.get(id=product_id)
+        with span('cart.product_lookup', product_id=product_id):
+            product = Product.objects.get(id=product_id)
     except Product.DoesNotExist:
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return JsonResponse({'success': False, 'message': 'Product not found'})
@@ -102,6 +115,15 @@ def cart_add(request):
 
     cart = request.session.get('cart', [])
 
+    # Check stock for the whole cart line (and hold it with reservations)
+    line_quantity = quantity + sum(item['quantity'] for item in cart if str(item['product_id']) == str(product_id))
+    result = StockReservation.reserve(request.user.id, product, line_quantity)
+    if not result['success']:
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse(result)
+        messages.error(request, result['message'])
+        return redirect('products')
+
     # Check if product already in cart
     found = False
     for item in cart:
@@ -114,7 +136,7 @@ def cart_add(request):
         cart.append({
             'product_id': product.id,
             'name': product.name,
-            'price': float(product.price),
+            'price_cents': product.price_cents,
             'quantity': quantity,
             'image_url': product.image_url,
         })
@@ -146,6 +168,7 @@ def cart_remove(request):
     # Filter out the product to remove
     cart = [item for item in cart if str(item['product_id']) != str(product_id)]
     request.session['cart'] = cart
+    StockReservation.release(request.user.id, product_id)
 
     messages.success(request, 'Product removed from cart')
     return redirect('cart')
@@ -153,6 +176,7 @@ def cart_remove(request):
 
 @login_required
 @require_POST
+@workload('checkout')
 def api_cart_add(request):
     """API endpoint for adding to cart via JSON."""
     import json
@@ -165,16 +189,19 @@ def api_cart_add(request):
         return JsonResponse({'success': False, 'message': 'Invalid request data'})
     
     try:
-        product = Product.objects.get(id=product_id)
+        with span('cart.product_lookup', product_id=product_id):
+            product = Product.objects.get(id=product_id)
     except Product.DoesNotExist:
         return JsonResponse({'success': False, 'message': 'Product not found'})
     
-    # Check stock
-    if product.stock_quantity < quantity:
-        return JsonResponse({'success': False, 'message': 'Not enough stock available'})
-    
     cart = request.session.get('cart', [])
     
+    # Check stock for the whole cart line (and hold it with reservations)
+    line_quantity = quantity + sum(item['quantity'] for item in cart if str(item['product_id']) == str(product_id))
+    result = StockReservation.reserve(request.user.id, product, line_quantity)
+    if not result['success']:
+        return JsonResponse(result)
+    
     # Check if product already in cart
     found = False
     for item in cart:
@@ -187,7 +214,7 @@ def api_cart_add(request):
         cart.append({
             'product_id': product.id,
             'name': product.name,
-            'price': float(product.price),
+            'price_cents': product.price_cents,
             'quantity': quantity,
             'image_url': product.image_url or '',
         })
@@ -207,6 +234,7 @@ def api_cart_add(request):
 
 @login_required
 @require_POST
+@workload('checkout')
 def api_cart_update(request):
     """API endpoint for updating cart item quantity."""
     import json
@@ -222,55 +250,37 @@ def api_cart_update(request):
         return JsonResponse({'success': False, 'message': 'Invalid quantity'})
     
     try:
-        product = Product.objects.get(id=product_id)
+        with span('cart.product_lookup', product_id=product_id):
+            product = Product.objects.get(id=product_id)
     except Product.DoesNotExist:
         return JsonResponse({'success': False, 'message': 'Product not found'})
     
-    # Check stock
-    if product.stock_quantity < quantity:
-        return JsonResponse({'success': False, 'message': 'Not enough stock available'})
-    
     cart = request.session.get('cart', [])
     
     # Update quantity for the product
-    found = False
-    for item in cart:
-        if str(item['product_id']) == str(product_id):
-            item['quantity'] = quantity
-            item['subtotal'] = float(item['price']) * quantity
-            found = True
-            break
-    
-    if not found:
+    line = next((item for item in cart if str(item['product_id']) == str(product_id)), None)
+    if line is None:
         return JsonResponse({'success': False, 'message': 'Product not in cart'})
     
+    # Check stock (and hold it with reservations)
+    result = StockReservation.reserve(request.user.id, product, quantity)
+    if not result['success']:
+        return JsonResponse(result)
+    line['quantity'] = quantity
+    
     request.session['cart'] = cart
     request.session.modified = True
     
-    # Calculate totals
-    subtotal = sum(float(item['price']) * int(item['quantity']) for item in cart)
-    tax_rate = APP_CONFIG.get('tax_rate', 0.08)
-    shipping_rate = APP_CONFIG.get('shipping_rate', 5.00)
-    free_shipping_threshold = APP_CONFIG.get('free_shipping_threshold', 100.00)
-    
-    tax = subtotal * tax_rate
-    shipping = 0 if subtotal >= free_shipping_threshold else shipping_rate
-    total = subtotal + tax + shipping
-    
     return JsonResponse({
         'success': True,
         'cart_count': len(cart),
-        'items': cart,
-        'subtotal': subtotal,
-        'tax': tax,
-        'shipping': shipping,
-        'free_shipping': subtotal >= free_shipping_threshold,
-        'total': total
+        **cart_json(cart),
     })
 
 
 @login_required
 @require_POST
+@workload('checkout')
 def api_cart_remove(request):
     """API endpoint for removing item from cart."""
     import json
@@ -287,35 +297,23 @@ def api_cart_remove(request):
     cart = [item for item in cart if str(item['product_id']) != str(product_id)]
     request.session['cart'] = cart
     request.session.modified = True
-    
-    # Calculate totals
-    subtotal = sum(float(item['price']) * int(item['quantity']) for item in cart)
-    tax_rate = APP_CONFIG.get('tax_rate', 0.08)
-    shipping_rate = APP_CONFIG.get('shipping_rate', 5.00)
-    free_shipping_threshold = APP_CONFIG.get('free_shipping_threshold', 100.00)
-    
-    tax = subtotal * tax_rate
-    shipping = 0 if subtotal >= free_shipping_threshold else shipping_rate
-    total = subtotal + tax + shipping
+    StockReservation.release(request.user.id, product_id)
     
     return JsonResponse({
         'success': True,
         'cart_count': len(cart),
-        'items': cart,
-        'subtotal': subtotal,
-        'tax': tax,
-        'shipping': shipping,
-        'free_shipping': subtotal >= free_shipping_threshold,
-        'total': total
+        **cart_json(cart),
     })
 
 
 @login_required
 @require_POST
+@workload('checkout')
 def api_cart_clear(request):
     """API endpoint for clearing the entire cart."""
     request.session['cart'] = []
     request.session.modified = True
+    StockReservation.release(request.user.id)
     
     return JsonResponse({
         'success': True,
@@ -330,10 +328,30 @@ def api_cart_clear(request):
 
 @login_required
 @require_POST
+@workload('checkout')
 def checkout(request):
-    """Process checkout."""
+    """
+    Process checkout.
+
+    An Idempotency-Key header (or idempotency_key field) makes retries safe:
+    a key this customer already checked out with gets the original answer.
+    """
     cart = request.session.get('cart', [])
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    idempotency_key = (request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key', '')).strip()
+
+    if len(idempotency_key) > IdempotencyKey.MAX_LENGTH:
+        if is_ajax:
+            return JsonResponse({'success': False, 'message': 'Invalid idempotency key'}, status=400)
+        messages.error(request, 'Invalid idempotency key')
+        return redirect('cart')
+
+    # A retry of a finished checkout: answer as before (the cart is already empty)
+    if idempotency_key:
+        with span('checkout.idempotency_lookup'):
+            result = IdempotencyKey.result_for(idempotency_key, user_id=request.user.id)
+        if result:
+            return checkout_response(request, result, is_ajax)
 
     if not cart:
         if is_ajax:
@@ -342,47 +360,55 @@ def checkout(request):
         return redirect('cart')
 
     # Get or create customer record
-    customer_id = Auth.get_customer_id(request)
-
-    if not customer_id:
-        # Try to get customer by user_id
-        customer = Customer.get_customer_by_user_id(request.user.id)
-
-        if customer:
-            customer_id = customer.id
-            request.session['customer_id'] = customer_id
-        else:
-            # Create customer profile
-            customer = Customer.objects.create(
-                user=request.user,
-                first_name=request.user.username,
-                last_name='',
-                phone='',
-                address=''
-            )
-            customer_id = customer.id
-            request.session['customer_id'] = customer_id
+    with span('checkout.customer_lookup'):
+        customer_id = Auth.get_customer_id(request)
+
+        if not customer_id:
+            # Try to get customer by user_id
+            customer = Customer.get_customer_by_user_id(request.user.id)
+
+            if customer:
+                customer_id = customer.id
+                request.session['customer_id'] = customer_id
+            else:
+                # Create customer profile
+                customer = Customer.objects.create(
+                    user=request.user,
+                    first_name=request.user.username,
+                    last_name='',
+                    phone='',
+                    address=''
+                )
+                customer_id = customer.id
+                request.session['customer_id'] = customer_id
+
+        # Get checkout form data
+        payment_method = request.POST.get('payment_method', '')
+        shipping_address = request.POST.get('shipping_address', '')
 
-    # Get checkout form data
-    payment_method = request.POST.get('payment_method', '')
-    shipping_address = request.POST.get('shipping_address', '')
+        try:
+            customer = Customer.objects.get(id=customer_id)
+        except Customer.DoesNotExist:
+            if is_ajax:
+                return JsonResponse({'success': False, 'message': 'Customer profile not found'})
+            messages.error(request, 'Customer profile not found')
+            return redirect('cart')
 
     # Create order
-    try:
-        customer = Customer.objects.get(id=customer_id)
-    except Customer.DoesNotExist:
-        if is_ajax:
-            return JsonResponse({'success': False, 'message': 'Customer profile not found'})
-        messages.error(request, 'Customer profile not found')
-        return redirect('cart')
+    with span('checkout.create_order', item_count=len(cart)):
+        result = Order.create_from_cart(
+            customer=customer,
+            cart_items=cart,
+            payment_method=payment_method,
+            shipping_address=shipping_address,
+            idempotency_key=idempotency_key or None
+        )
 
-    result = Order.create_from_cart(
-        customer=customer,
-        cart_items=cart,
-        payment_method=payment_method,
-        shipping_address=shipping_address
-    )
+    return checkout_response(request, result, is_ajax)
 
+
+def checkout_response(request, result, is_ajax):
+    """Answer a checkout from the create_from_cart() result."""
     if result['success']:
         # Clear cart
         request.session['cart'] = []
@@ -481,10 +507,10 @@ def account(request):
             # Get customer stats
             stats = Order.objects.filter(customer_id=customer_id).aggregate(
                 total_orders=Count('id'),
-                total_spent=Sum('total')
+                total_spent_cents=Sum('total_cents')
             )
             stats['total_orders'] = stats['total_orders'] or 0
-            stats['total_spent'] = stats['total_spent'] or 0
+            stats['total_spent'] = from_cents(stats['total_spent_cents'])
         except Customer.DoesNotExist:
             customer = None
             stats = {'total_orders': 0, 'total_spent': 0}
@@ -539,8 +565,6 @@ def account_update(request):
 @require_POST
 def change_password(request):
     """Change user password."""
-    from django.contrib.auth.hashers import check_password, make_password
-    
     current_password = request.POST.get('current_password', '')
     new_password = request.POST.get('new_password', '')
     confirm_password = request.POST.get('confirm_password', '')
@@ -557,12 +581,18 @@ def change_password(request):
     
     # Verify current password
     user = request.user
-    if not check_password(current_password, user.password):
-        return JsonResponse({'success': False, 'message': 'Current password is incorrect'})
+    if throttle_login(request, user.username):
+        return JsonResponse({'success': False, 'message': 'Too many attempts. Please try again later.'})
+    try:
+        if not verify_password(user, current_password):
+            return JsonResponse({'success': False, 'message': 'Current password is incorrect'})
+        new_password_hash = hash_password(new_password)
+    except PasswordHashBusy:
+        return JsonResponse({'success': False, 'message': 'We are very busy right now. Please try again in a moment.'})
     
     # Update password
     try:
-        user.password = make_password(new_password)
+        user.password = new_password_hash
         user.save()
         return JsonResponse({'success': True, 'message': 'Password updated successfully'})
     except Exception as e:
@@ -578,10 +608,8 @@ def account_delete(request):
     if customer_id:
         try:
             customer = Customer.objects.get(id=customer_id)
-            user = customer.user
-            customer.delete()
-            if user:
-                user.delete()
+            # Deletes the user too; a long order history is purged in the background
+            delete_customer(customer)
             
             # Logout user
             Auth.logout_user(request)
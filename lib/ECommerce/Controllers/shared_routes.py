@@ -11,12 +11,21 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST, require_GET
 
+from lib.ECommerce.Analytics import bucket_label, bucketed, last_days
+from lib.ECommerce.Archive import merged_page, order_tables
 from lib.ECommerce.Auth import Auth
 from lib.ECommerce.Models.User import User
 from lib.ECommerce.Models.Customer import Customer
 from lib.ECommerce.Models.Product import Product
 from lib.ECommerce.Models.Order import Order
+from lib.ECommerce.Models.Archive import ArchivedOrder
+from lib.ECommerce.Conditional import conditional_get
 from lib.ECommerce.Config import APP_CONFIG
+from lib.ECommerce.DatabaseRouter import use_replica
+from lib.ECommerce.Money import cents_to_float, from_cents
+from lib.ECommerce.Passwords import PasswordHashBusy, throttle_login
+from lib.ECommerce.Serializers import PRODUCT_API, PRODUCT_CARD, InvalidFields, requested_fields
+from lib.ECommerce.Workloads import admit, busy_response, workload
 
 
 # =============================================================================
@@ -36,7 +45,15 @@ def login_view(request):
     username = request.POST.get('username', '')
     password = request.POST.get('password', '')
 
-    user = Auth.login_user(request, username, password)
+    retry_after = throttle_login(request, username)
+    if retry_after:
+        messages.error(request, f'Too many login attempts. Please try again in {retry_after} seconds.')
+        return redirect('home')
+
+    try:
+        user = Auth.login_user(request, username, password)
+    except PasswordHashBusy:
+        return busy_response(request, 'We are very busy right now. Please try signing in again in a moment.', 2)
 
     if user:
         messages.success(request, 'Login successful!')
@@ -80,6 +97,11 @@ def register_submit(request):
         messages.error(request, 'Passwords do not match')
         return redirect('register')
 
+    retry_after = throttle_login(request)
+    if retry_after:
+        messages.error(request, f'Too many attempts. Please try again in {retry_after} seconds.')
+        return redirect('register')
+
     result = Auth.register_user(
         username=username,
         email=email,
@@ -112,106 +134,8 @@ def dashboard(request):
     role = user.role
 
     if role in ['admin', 'staff']:
-        # Admin/Staff Dashboard
-        import django.db.models as models
-        from datetime import timedelta
-        from django.utils import timezone
-        import json
-        
-        page = int(request.GET.get('page', 1))
-        per_page = 10
-
-        total_products = Product.objects.filter(is_active=True).count()
-        low_stock_products = Product.objects.filter(
-            is_active=True,
-            stock_quantity__lte=models.F('reorder_level')
-        ).count() if hasattr(Product, 'objects') else Product.get_low_stock_products().count()
-
-        # Get recent orders with pagination
-        all_orders = Order.objects.select_related('customer').order_by('-created_at')
-        total_orders = all_orders.count()
-        pending_orders = all_orders.filter(status='pending').count()
-        total_customers = Customer.objects.count()
-        
-        # Calculate total revenue (all time, excluding cancelled)
-        total_revenue = all_orders.exclude(status='cancelled').aggregate(
-            total=Sum('total')
-        )['total'] or 0
-
-        # Paginate recent orders
-        start = (page - 1) * per_page
-        end = start + per_page
-        recent_orders = all_orders[start:end]
-        total_pages = (all_orders.count() + per_page - 1) // per_page
-        
-        # Get low stock items for display
-        low_stock_items = Product.objects.filter(
-            is_active=True,
-            stock_quantity__lte=models.F('reorder_level')
-        ).order_by('stock_quantity')[:5]
-
-        # Chart data - Revenue over last 7 days
-        today = timezone.now().date()
-        start_date = today - timedelta(days=6)
-        
-        revenue_by_day = all_orders.filter(
-            created_at__date__gte=start_date,
-            created_at__date__lte=today
-        ).exclude(status='cancelled').extra(
-            select={'day': 'DATE(created_at)'}
-        ).values('day').annotate(
-            daily_revenue=Sum('total')
-        ).order_by('day')
-        
-        # Create complete date range
-        revenue_labels = []
-        revenue_data = []
-        revenue_dict = {str(r['day']): float(r['daily_revenue'] or 0) for r in revenue_by_day}
-        
-        for i in range(7):
-            date = start_date + timedelta(days=i)
-            date_str = str(date)
-            revenue_labels.append(date_str)
-            revenue_data.append(revenue_dict.get(date_str, 0))
-        
-        # Orders by status
-        status_counts = all_orders.values('status').annotate(count=models.Count('id'))
-        status_map = {s['status']: s['count'] for s in status_counts}
-        orders_by_status = {
-            'labels': ['Pending', 'Processing', 'Shipped', 'Delivered', 'Cancelled'],
-            'data': [
-                status_map.get('pending', 0),
-                status_map.get('processing', 0),
-                status_map.get('shipped', 0),
-                status_map.get('delivered', 0),
-                status_map.get('cancelled', 0)
-            ]
-        }
-
-        stats = {
-            'total_products': total_products,
-            'low_stock_products': low_stock_products,
-            'total_orders': total_orders,
-            'pending_orders': pending_orders,
-            'total_customers': total_customers,
-            'total_revenue': total_revenue,
-            'recent_orders': recent_orders[:5],  # Show only 5 in dashboard
-            'low_stock_items': low_stock_items,
-            'page': page,
-            'total_pages': total_pages,
-        }
-        
-        chart_data = {
-            'revenue_labels': json.dumps(revenue_labels),
-            'revenue_data': json.dumps(revenue_data),
-            'orders_by_status': json.dumps(orders_by_status),
-        }
-
-        return render(request, 'admin/dashboard_admin.html', {
-            'stats': stats,
-            'chart_data': chart_data,
-            'role': role,
-        })
+        # The role decides the workload, so take the analytics slot here
+        return admit(request, admin_dashboard.workload_class) or admin_dashboard(request)
     else:
         # Customer Dashboard
         customer_id = Auth.get_customer_id(request)
@@ -220,19 +144,22 @@ def dashboard(request):
             page = int(request.GET.get('page', 1))
             per_page = 10
 
-            orders = Order.objects.filter(customer_id=customer_id).order_by('-created_at')
-            total_orders = orders.count()
-            pending_orders = orders.filter(status='pending').count()
-            delivered_orders = orders.filter(status='delivered').count()
+            # Live orders, plus archived ones if the customer has any (Archive.py)
+            histories = [
+                order_model.objects.filter(customer_id=customer_id).order_by('-created_at')
+                for order_model, _ in order_tables(customer_id=customer_id)
+            ]
+            total_orders = sum(orders.count() for orders in histories)
+            pending_orders = sum(orders.filter(status='pending').count() for orders in histories)
+            delivered_orders = sum(orders.filter(status='delivered').count() for orders in histories)
 
-            total_spent = orders.exclude(status='cancelled').aggregate(
-                total=Sum('total')
-            )['total'] or 0
+            total_spent = from_cents(sum(orders.exclude(status='cancelled').aggregate(
+                total=Sum('total_cents')
+            )['total'] or 0 for orders in histories))
 
             # Paginate orders
             start = (page - 1) * per_page
-            end = start + per_page
-            recent_orders = orders[start:end]
+            recent_orders = merged_page(histories, '-created_at', start, per_page)
             total_pages = (total_orders + per_page - 1) // per_page
 
             stats = {
@@ -261,11 +188,103 @@ def dashboard(request):
         })
 
 
+@workload('analytics')
+def admin_dashboard(request):
+    """Admin/staff dashboard (aggregates only, safe to serve from the replica)."""
+    from django.db.models import Sum
+    import django.db.models as models
+    import json
+
+    use_replica()
+    role = request.user.role
+
+    page = int(request.GET.get('page', 1))
+    per_page = 10
+
+    total_products = Product.objects.filter(is_active=True).count()
+    low_stock_products = Product.objects.filter(
+        is_active=True,
+        stock_quantity__lte=models.F('reorder_level')
+    ).count() if hasattr(Product, 'objects') else Product.get_low_stock_products().count()
+
+    # Get recent orders with pagination
+    all_orders = Order.objects.select_related('customer').order_by('-created_at')
+    total_orders = all_orders.count()
+    pending_orders = all_orders.filter(status='pending').count()
+    total_customers = Customer.objects.count()
+    
+    # Calculate total revenue (all time, excluding cancelled)
+    total_revenue = from_cents(all_orders.exclude(status='cancelled').aggregate(
+        total=Sum('total_cents')
+    )['total'])
+
+    # Paginate recent orders
+    start = (page - 1) * per_page
+    end = start + per_page
+    recent_orders = all_orders[start:end]
+    total_pages = (all_orders.count() + per_page - 1) // per_page
+    
+    # Get low stock items for display
+    low_stock_items = Product.objects.filter(
+        is_active=True,
+        stock_quantity__lte=models.F('reorder_level')
+    ).order_by('stock_quantity')[:5]
+
+    # Chart data - Revenue over last 7 days
+    revenue_by_day = bucketed(Order.objects.exclude(status='cancelled'), last_days(7), Sum('total_cents'))
+    revenue_labels = [bucket_label(day) for day, _ in revenue_by_day]
+    revenue_data = [cents_to_float(cents) for _, cents in revenue_by_day]
+
+    # Orders by status
+    status_counts = all_orders.values('status').annotate(count=models.Count('id'))
+    status_map = {s['status']: s['count'] for s in status_counts}
+    orders_by_status = {
+        'labels': ['Pending', 'Processing', 'Shipped', 'Delivered', 'Cancelled'],
+        'data': [
+            status_map.get('pending', 0),
+            status_map.get('processing', 0),
+            status_map.get('shipped', 0),
+            status_map.get('delivered', 0),
+            status_map.get('cancelled', 0)
+        ]
+    }
+
+    stats = {
+        'total_products': total_products,
+        'low_stock_products': low_stock_products,
+        'total_orders': total_orders,
+        'pending_orders': pending_orders,
+        'total_customers': total_customers,
+        'total_revenue': total_revenue,
+        'recent_orders': recent_orders[:5],  # Show only 5 in dashboard
+        'low_stock_items': low_stock_items,
+        'page': page,
+        'total_pages': total_pages,
+    }
+    
+    chart_data = {
+        'revenue_labels': json.dumps(revenue_labels),
+        'revenue_data': json.dumps(revenue_data),
+        'orders_by_status': json.dumps(orders_by_status),
+    }
+
+    return render(request, 'admin/dashboard_admin.html', {
+        'stats': stats,
+        'chart_data': chart_data,
+        'role': role,
+    })
+
+
 # =============================================================================
 # PRODUCTS (Role-based)
 # =============================================================================
 
+def catalog_version(request):
+    return Product.get_catalog_version()
+
+
 @login_required
+@conditional_get(catalog_version)
 def products(request):
     """Products list view - role-based."""
     user = request.user
@@ -305,34 +324,30 @@ def products(request):
         else:
             products_list = products_list.order_by('id')
 
-    # Pagination
-    total = products_list.count()
     start = (page - 1) * per_page
     end = start + per_page
-    products_page = products_list[start:end]
-    total_pages = (total + per_page - 1) // per_page
-    has_more = end < total
-    next_page = page + 1 if has_more else None
 
-    # Handle AJAX request for infinite scroll
+    # Handle AJAX request for infinite scroll (one extra row instead of a COUNT)
     if request.GET.get('ajax') == '1' and role == 'customer':
-        products_data = []
-        for p in products_page:
-            products_data.append({
-                'id': p.id,
-                'name': p.name,
-                'description': p.description[:100] + '...' if len(p.description) > 100 else p.description,
-                'category': p.category,
-                'price': float(p.price),
-                'stock': p.stock_quantity,
-                'image_url': p.image_url or '',
-            })
+        try:
+            fields = requested_fields(request, PRODUCT_CARD)
+        except InvalidFields as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        rows = list(PRODUCT_CARD.rows(products_list, fields)[start:end + 1])
+        has_more = len(rows) > per_page
         return JsonResponse({
-            'products': products_data,
+            'products': PRODUCT_CARD.build(rows[:per_page], fields),
             'has_more': has_more,
-            'next_page': next_page,
+            'next_page': page + 1 if has_more else None,
         })
 
+    # Pagination
+    total = products_list.count()
+    products_page = products_list[start:end]
+    total_pages = (total + per_page - 1) // per_page
+    has_more = end < total
+    next_page = page + 1 if has_more else None
+
     # Generate page range for pagination (admin only)
     page_range = range(1, total_pages + 1)
 
@@ -359,7 +374,25 @@ def products(request):
 # ORDERS (Role-based)
 # =============================================================================
 
+# Orders list ?sort= values
+ORDER_SORTS = {
+    'newest': '-created_at',
+    'oldest': 'created_at',
+    'total_high': '-total_cents',
+    'total_low': 'total_cents',
+}
+
+
+def customer_orders_version(request):
+    # Customer list only: the admin list has store-wide stats
+    if request.user.role != 'customer':
+        return None
+    customer_id = Auth.get_customer_id(request)
+    return Order.get_customer_orders_version(customer_id) if customer_id else None
+
+
 @login_required
+@conditional_get(customer_orders_version)
 def orders(request):
     """Orders list view - role-based."""
     user = request.user
@@ -371,6 +404,7 @@ def orders(request):
     page = int(request.GET.get('page', 1))
     per_page = 10
 
+    archived_list = None
     if role in ['admin', 'staff']:
         orders_list = Order.objects.select_related('customer').order_by('-created_at')
         # Admin stats
@@ -392,6 +426,11 @@ def orders(request):
                 'processing_orders': Order.objects.filter(customer_id=customer_id, status='processing').count(),
                 'delivered_orders': Order.objects.filter(customer_id=customer_id, status='delivered').count(),
             }
+            # Order history includes archived orders (Archive.py)
+            if len(order_tables(customer_id=customer_id)) > 1:
+                archived_list = ArchivedOrder.objects.filter(customer_id=customer_id)
+                stats['total_orders'] += archived_list.count()
+                stats['delivered_orders'] += archived_list.filter(status='delivered').count()
         else:
             orders_list = Order.objects.none()
             stats = {
@@ -401,34 +440,32 @@ def orders(request):
                 'delivered_orders': 0,
             }
 
+    order_lists = [orders_list] if archived_list is None else [orders_list, archived_list]
+
     # Search filter
     if search:
         from django.db.models import Q
-        orders_list = orders_list.filter(
-            Q(order_number__icontains=search) |
-            Q(status__icontains=search) |
-            Q(payment_method__icontains=search)
-        )
+        order_lists = [
+            orders.filter(
+                Q(order_number__icontains=search) |
+                Q(status__icontains=search) |
+                Q(payment_method__icontains=search)
+            )
+            for orders in order_lists
+        ]
 
     # Status filter
     if status:
-        orders_list = orders_list.filter(status=status)
+        order_lists = [orders.filter(status=status) for orders in order_lists]
 
     # Sort
-    if sort == 'newest':
-        orders_list = orders_list.order_by('-created_at')
-    elif sort == 'oldest':
-        orders_list = orders_list.order_by('created_at')
-    elif sort == 'total_high':
-        orders_list = orders_list.order_by('-total')
-    elif sort == 'total_low':
-        orders_list = orders_list.order_by('total')
+    ordering = ORDER_SORTS.get(sort, '-created_at')
+    order_lists = [orders.order_by(ordering) for orders in order_lists]
 
     # Pagination
-    total = orders_list.count()
+    total = sum(orders.count() for orders in order_lists)
     start = (page - 1) * per_page
-    end = start + per_page
-    orders_page = orders_list[start:end]
+    orders_page = merged_page(order_lists, ordering, start, per_page)
     total_pages = (total + per_page - 1) // per_page
 
     context = {
@@ -447,7 +484,18 @@ def orders(request):
         return render(request, 'customer/orders_customer.html', context)
 
 
+def order_detail_version(request, order_id):
+    version = Order.get_detail_version(order_id)
+    if version is None:
+        return None
+    customer_id, last_modified = version
+    if request.user.role == 'customer' and customer_id != Auth.get_customer_id(request):
+        return None
+    return last_modified, customer_id
+
+
 @login_required
+@conditional_get(order_detail_version)
 def order_detail(request, order_id):
     """Order detail view - role-based."""
     user = request.user
@@ -456,8 +504,11 @@ def order_detail(request, order_id):
     try:
         order = Order.objects.select_related('customer').prefetch_related('items').get(id=order_id)
     except Order.DoesNotExist:
-        messages.error(request, 'Order not found')
-        return redirect('orders')
+        # Archived orders keep their id and stay viewable (read-only)
+        order = ArchivedOrder.objects.select_related('customer').prefetch_related('items').filter(id=order_id).first()
+        if order is None:
+            messages.error(request, 'Order not found')
+            return redirect('orders')
 
     # Customers can only view their own orders
     if role == 'customer':
@@ -484,6 +535,7 @@ def order_detail(request, order_id):
 
 @login_required
 @require_GET
+@conditional_get(catalog_version, page=False)
 def api_products(request):
     """API endpoint for infinite scroll products."""
     search = request.GET.get('search', '')
@@ -498,31 +550,19 @@ def api_products(request):
     else:
         products = Product.get_active_products()
 
-    # Pagination
-    total = products.count()
+    try:
+        fields = requested_fields(request, PRODUCT_API)
+    except InvalidFields as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    # Pagination (one extra row instead of a COUNT)
     start = (page - 1) * per_page
     end = start + per_page
-    products_page = products[start:end]
-    has_more = end < total
-
-    # Serialize products
-    products_data = []
-    for p in products_page:
-        products_data.append({
-            'id': p.id,
-            'name': p.name,
-            'description': p.description,
-            'sku': p.sku,
-            'category': p.category,
-            'price': float(p.price),
-            'stock_quantity': p.stock_quantity,
-            'reorder_level': p.reorder_level,
-            'image_url': p.image_url,
-        })
+    rows = list(PRODUCT_API.rows(products, fields)[start:end + 1])
 
     return JsonResponse({
-        'products': products_data,
-        'has_more': has_more
+        'products': PRODUCT_API.build(rows[:per_page], fields),
+        'has_more': len(rows) > per_page
     })
 
 
@@ -5,8 +5,10 @@ Equivalent to Perl ECommerce::Database
 """
 
 import os
+from contextlib import contextmanager
 from pathlib import Path
 from django.conf import settings
+from django.db import transaction
 
 
 def get_db_path():
@@ -14,6 +16,27 @@ def get_db_path():
     return settings.DATABASES['default']['NAME']
 
 
+@contextmanager
+def immediate_transaction(using=None):
+    """
+    transaction.atomic() that takes the write lock up front on SQLite.
+
+    With the tuned backend the outermost block starts with BEGIN IMMEDIATE,
+    so concurrent read-then-write transactions (checkout, cancellation)
+    queue on busy_timeout instead of failing with `database is locked`.
+    Nested blocks and other databases behave exactly like atomic().
+    """
+    connection = transaction.get_connection(using)
+    if hasattr(connection, 'next_transaction_mode') and not connection.in_atomic_block:
+        connection.next_transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            yield
+    finally:
+        if hasattr(connection, 'next_transaction_mode'):
+            connection.next_transaction_mode = None
+
+
 def initialize_database():
     """
     Initialize database and create sample data if needed.
@@ -0,0 +1,138 @@
+"""
+ShopPy - Database Router
+Sends read-only analytics traffic to a separate database alias.
+
+Analytics reads go to the 'analytics' alias (the replica, or the primary
+behind its own connections, with a statement timeout - see Workloads.py) or,
+without it, to the 'replica' alias defined by DATABASE_REPLICA_URL. Views
+opt in through @workload('analytics') or by calling use_replica() part-way
+through a view; everything else, and every write, stays on 'default'.
+ReplicaMiddleware provides read-your-writes: once a request writes a ShopPy
+model, that user's session is pinned to the primary for
+REPLICA_STICKY_SECONDS so reports and dashboards never look older than the
+user's own changes.
+"""
+
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from lib.ECommerce.AsyncSupport import HybridMiddleware
+
+
+REPLICA_ALIAS = 'replica'
+ANALYTICS_ALIAS = 'analytics'
+PINNED_SESSION_KEY = '_replica_pinned_until'
+ROUTED_APP_LABEL = 'ECommerce'
+
+_request_state = ContextVar('shoppy_replica_state', default=None)
+
+
+class RoutingState:
+    """Per-request routing decisions."""
+
+    __slots__ = ('pinned', 'use_replica', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.use_replica = False
+        self.wrote = False
+
+
+def replica_configured():
+    """True if a 'replica' database alias exists."""
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def analytics_read_alias():
+    """Alias that opted-in reads go to: 'analytics', else 'replica', else None."""
+    if ANALYTICS_ALIAS in settings.DATABASES:
+        return ANALYTICS_ALIAS
+    if replica_configured():
+        return REPLICA_ALIAS
+    return None
+
+
+def use_replica():
+    """Route the rest of this request's reads to the analytics alias (unless pinned to the primary)."""
+    state = _request_state.get()
+    if state is not None:
+        state.use_replica = True
+
+
+class ReplicaRouter:
+    """
+    Reads leave the primary only inside an opted-in request that is not
+    pinned, has not written anything and is not inside a transaction.
+    Writes always go to the primary and are remembered for stickiness.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if (state is None or not state.use_replica or state.pinned or state.wrote
+                or model._meta.app_label != ROUTED_APP_LABEL):
+            return None
+        if connections['default'].in_atomic_block:
+            return None
+        return analytics_read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and model._meta.app_label == ROUTED_APP_LABEL:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both aliases
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Read-only aliases receive their schema from the primary
+        return db not in (REPLICA_ALIAS, ANALYTICS_ALIAS)
+
+
+class ReplicaMiddleware(HybridMiddleware):
+    """Tracks per-request routing state and pins sessions to the primary after writes."""
+
+    def pinned_until(self, request):
+        session = getattr(request, 'session', None)
+        return session.get(PINNED_SESSION_KEY, 0) if session is not None else 0
+
+    def update_pin(self, request, state, pinned_until):
+        session = getattr(request, 'session', None)
+        if session is None:
+            return
+        if state.wrote:
+            session[PINNED_SESSION_KEY] = time.time() + settings.REPLICA_STICKY_SECONDS
+        elif pinned_until and not state.pinned:
+            session.pop(PINNED_SESSION_KEY, None)
+
+    def call(self, request):
+        pinned_until = self.pinned_until(request)
+        state = RoutingState(pinned=pinned_until > time.time())
+
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        self.update_pin(request, state, pinned_until)
+        return response
+
+    async def acall(self, request):
+        # Reading the session may hit its backend; afterwards it is in memory
+        pinned_until = await sync_to_async(self.pinned_until)(request)
+        state = RoutingState(pinned=pinned_until > time.time())
+
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        self.update_pin(request, state, pinned_until)
+        return response
@@ -0,0 +1,192 @@
+"""
+ShopPy - Order Archive Models
+Cold storage for finished orders.
+
+`manage.py archive_orders` moves delivered, cancelled and refunded orders
+whose last change is older than ARCHIVE_AFTER_DAYS, with their items and
+timeline, out of the live tables into these archive tables, a chunk per
+transaction (ArchivedOrder.archive_batch). Rows keep their ids, so order
+links and idempotency replays still name the same order. The live tables
+stay the size of the working set: dashboards, order lists, checkout and
+the changefeed only ever read them. Reports and customer history add the
+archived rows back in when the range they show reaches the archive (see
+lib/ECommerce/Archive.py).
+"""
+
+from django.db import models
+from django.db.models import Max
+from django.utils import timezone
+
+from lib.ECommerce.Database import immediate_transaction
+from lib.ECommerce.Models.Order import Order, OrderItem, OrderTimeline
+from lib.ECommerce.Money import cents_property
+
+
+def _columns(model):
+    """Column attribute names (customer_id, not customer) for values()."""
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+class ArchivedOrder(models.Model):
+    """An order moved out of the live orders table (same columns and id)."""
+
+    ARCHIVED_STATUSES = ['delivered', 'cancelled', 'refunded']
+
+    STATUS_CHOICES = Order.STATUS_CHOICES
+    PAYMENT_STATUS_CHOICES = Order.PAYMENT_STATUS_CHOICES
+    PAYMENT_METHOD_CHOICES = Order.PAYMENT_METHOD_CHOICES
+
+    id = models.IntegerField(primary_key=True)
+    order_number = models.CharField(max_length=50, unique=True)
+    customer = models.ForeignKey(
+        'Customer',
+        on_delete=models.CASCADE,
+        related_name='archived_orders'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    subtotal_cents = models.IntegerField()
+    tax_cents = models.IntegerField(default=0)
+    shipping_cents = models.IntegerField(default=0)
+    total_cents = models.IntegerField()
+    payment_method = models.CharField(max_length=30, choices=PAYMENT_METHOD_CHOICES, blank=True, default='')
+    payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
+    payment_reference = models.CharField(max_length=100, blank=True, default='')
+    payment_attempts = models.PositiveSmallIntegerField(default=0)
+    payment_retry_at = models.DateTimeField(null=True, blank=True)
+    shipping_address = models.TextField(blank=True, default='')
+    billing_address = models.TextField(blank=True, default='')
+    notes = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()  # as it was in the live table, not auto_now
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'orders_archive'
+        verbose_name = 'Archived Order'
+        verbose_name_plural = 'Archived Orders'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),  # report ranges, archive horizon
+            models.Index(fields=['customer', 'created_at']),  # customer history
+        ]
+
+    is_archived = True  # templates: read-only, no status changes
+
+    def __str__(self):
+        return self.order_number
+
+    # Decimal dollars over the cents columns (see Money.py)
+    subtotal = cents_property('subtotal_cents')
+    tax = cents_property('tax_cents')
+    shipping = cents_property('shipping_cents')
+    total = cents_property('total_cents')
+
+    @classmethod
+    def horizon(cls):
+        """created_at of the newest archived order, or None while the archive is empty."""
+        return cls.objects.aggregate(newest=Max('created_at'))['newest']
+
+    @classmethod
+    def archivable(cls, cutoff):
+        """Live orders in a final status that haven't changed since `cutoff`, with no payment in flight or owed back."""
+        return Order.objects.filter(
+            status__in=cls.ARCHIVED_STATUSES, updated_at__lt=cutoff
+        ).exclude(payment_status__in=['processing', 'refund_pending'])
+
+    @classmethod
+    def archive_batch(cls, cutoff, batch_size):
+        """
+        Move up to `batch_size` archivable orders, oldest first, with their
+        items and timeline in one transaction. Returns (orders, items,
+        timeline events) moved; (0, 0, 0) when there is nothing left.
+        """
+        with immediate_transaction():
+            ids = list(cls.archivable(cutoff).order_by('updated_at', 'id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return 0, 0, 0
+
+            now = timezone.now()
+            orders = [
+                cls(archived_at=now, **row)
+                for row in Order.objects.filter(id__in=ids).values(*_columns(Order))
+            ]
+            items = [
+                ArchivedOrderItem(**row)
+                for row in OrderItem.objects.filter(order_id__in=ids).values(*_columns(OrderItem))
+            ]
+            events = [
+                ArchivedOrderTimeline(**row)
+                for row in OrderTimeline.objects.filter(order_id__in=ids).values(*_columns(OrderTimeline))
+            ]
+            cls.objects.bulk_create(orders)
+            ArchivedOrderItem.objects.bulk_create(items)
+            ArchivedOrderTimeline.objects.bulk_create(events)
+
+            OrderItem.objects.filter(order_id__in=ids).delete()
+            OrderTimeline.objects.filter(order_id__in=ids).delete()
+            Order.objects.filter(id__in=ids).delete()
+        return len(orders), len(items), len(events)
+
+
+class ArchivedOrderItem(models.Model):
+    """An item of an archived order."""
+
+    id = models.IntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    product = models.ForeignKey(
+        'Product',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+'
+    )
+    product_name = models.CharField(max_length=255)
+    product_sku = models.CharField(max_length=50)
+    quantity = models.IntegerField()
+    unit_price_cents = models.IntegerField()
+    subtotal_cents = models.IntegerField()
+
+    class Meta:
+        db_table = 'order_items_archive'
+        verbose_name = 'Archived Order Item'
+        verbose_name_plural = 'Archived Order Items'
+
+    def __str__(self):
+        return f"{self.product_name} x {self.quantity}"
+
+    # Decimal dollars over the cents columns (see Money.py)
+    unit_price = cents_property('unit_price_cents')
+    subtotal = cents_property('subtotal_cents')
+
+
+class ArchivedOrderTimeline(models.Model):
+    """A timeline event of an archived order."""
+
+    id = models.IntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    status = models.CharField(max_length=20)
+    description = models.CharField(max_length=255)
+    user = models.ForeignKey(
+        'User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'order_timeline_archive'
+        verbose_name = 'Archived Order Timeline'
+        verbose_name_plural = 'Archived Order Timeline Events'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.order.order_number}: {self.description}"
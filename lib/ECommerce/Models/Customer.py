@@ -31,6 +31,7 @@ class Customer(models.Model):
     zip_code = models.CharField(max_length=20, blank=True, default='')
     country = models.CharField(max_length=100, default='USA')
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'customers'
@@ -74,8 +75,9 @@ class Customer(models.Model):
     def get_total_spent(self):
         """Get total amount spent by this customer."""
         from django.db.models import Sum
-        result = self.orders.exclude(status='cancelled').aggregate(total=Sum('total'))
-        return result['total'] or 0
+        from lib.ECommerce.Money import from_cents
+        result = self.orders.exclude(status='cancelled').aggregate(total=Sum('total_cents'))
+        return from_cents(result['total'])
 
     @classmethod
     def search_customers(cls, search_term):
@@ -4,11 +4,19 @@ Handles order processing and management.
 Equivalent to Perl ECommerce::Models::Order
 """
 
-from django.db import models, transaction
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
 from django.utils import timezone
 from django.conf import settings
 import random
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from lib.ECommerce.Database import immediate_transaction
+from lib.ECommerce.Models.Outbox import (
+    ORDER_CANCELLED, ORDER_CREATED, ORDER_PAYMENT_CAPTURED, ORDER_PAYMENT_FAILED, ORDER_STATUS_CHANGED, OutboxEvent,
+)
+from lib.ECommerce.Money import cents_property, from_cents, order_totals
+from lib.ECommerce.Tracing import span
 
 
 class Order(models.Model):
@@ -26,10 +34,25 @@ class Order(models.Model):
         ('refunded', 'Refunded'),
     ]
 
+    # Orders whose payment must no longer be captured
+    CLOSED_STATUSES = ['cancelled', 'refunded']
+
+    # Timeline text for admin status changes
+    STATUS_DESCRIPTIONS = {
+        'pending': 'Order is pending',
+        'processing': 'Order is being processed',
+        'shipped': 'Order has been shipped',
+        'delivered': 'Order has been delivered',
+        'cancelled': 'Order has been cancelled',
+    }
+
     PAYMENT_STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('processing', 'Processing'),  # claimed by capture_payments (Payments.py)
         ('paid', 'Paid'),
         ('failed', 'Failed'),
+        ('voided', 'Voided'),                  # order cancelled before the capture
+        ('refund_pending', 'Refund Pending'),  # captured, then cancelled: refund due
         ('refunded', 'Refunded'),
     ]
 
@@ -48,10 +71,10 @@ class Order(models.Model):
         related_name='orders'
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
-    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
-    tax = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    shipping = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    total = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal_cents = models.IntegerField()
+    tax_cents = models.IntegerField(default=0)
+    shipping_cents = models.IntegerField(default=0)
+    total_cents = models.IntegerField()
     payment_method = models.CharField(
         max_length=30,
         choices=PAYMENT_METHOD_CHOICES,
@@ -63,6 +86,9 @@ class Order(models.Model):
         choices=PAYMENT_STATUS_CHOICES,
         default='pending'
     )
+    payment_reference = models.CharField(max_length=100, blank=True, default='')
+    payment_attempts = models.PositiveSmallIntegerField(default=0)
+    payment_retry_at = models.DateTimeField(null=True, blank=True)
     shipping_address = models.TextField(blank=True, default='')
     billing_address = models.TextField(blank=True, default='')
     notes = models.TextField(blank=True, default='')
@@ -74,10 +100,22 @@ class Order(models.Model):
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['customer', 'updated_at']),  # order list version (conditional GET)
+            models.Index(fields=['created_at']),  # dashboard / report date ranges (Analytics.py)
+            models.Index(fields=['updated_at', 'id']),  # changefeed cursor (Changefeed.py)
+            models.Index(fields=['payment_status', 'id']),  # capture_payments queue (Payments.py)
+        ]
 
     def __str__(self):
         return self.order_number
 
+    # Decimal dollars over the cents columns (see Money.py)
+    subtotal = cents_property('subtotal_cents')
+    tax = cents_property('tax_cents')
+    shipping = cents_property('shipping_cents')
+    total = cents_property('total_cents')
+
     @staticmethod
     def generate_order_number():
         """Generate unique order number."""
@@ -86,75 +124,111 @@ class Order(models.Model):
         return f"ORD-{date_str}-{random_num}"
 
     @classmethod
-    def create_from_cart(cls, customer, cart_items, payment_method, shipping_address, billing_address=None, notes=''):
+    def create_from_cart(cls, customer, cart_items, payment_method, shipping_address, billing_address=None, notes='',
+                         idempotency_key=None):
         """
         Create order from shopping cart.
         cart_items should be list of dicts with product_id, quantity, price, name
+
+        With stock reservations, lines the customer holds skip the
+        availability check (other carts' holds can't take those units), and
+        the holds are consumed with the sale. Held lines still take stock
+        with the same conditional decrement as any sale, so two holders
+        converting at once can never push stock below zero.
+
+        With an idempotency_key, a key this customer already used returns
+        that request's result (plus 'replayed': True) without running again.
         """
-        from lib.ECommerce.Models.Product import Product
-        from lib.ECommerce.Config import APP_CONFIG
+        from lib.ECommerce.Models.Product import InsufficientStock, Product
+        from lib.ECommerce.Models.Reservation import StockReservation
+
+        if idempotency_key:
+            replay = IdempotencyKey.result_for(idempotency_key, customer_id=customer.id)
+            if replay:
+                return replay
 
         if not cart_items:
             return {'success': False, 'message': 'Cart is empty'}
 
-        subtotal = 0
+        subtotal_cents = 0
         order_items_data = []
+        reservations = settings.STOCK_RESERVATIONS_ENABLED and customer.user_id
+        held = StockReservation.held_by(customer.user_id) if reservations else {}
 
         # Validate cart and calculate totals
-        for item in cart_items:
-            try:
-                product = Product.objects.get(id=item['product_id'])
-            except Product.DoesNotExist:
-                return {'success': False, 'message': f"Product not found: {item.get('name', 'Unknown')}"}
-
-            if product.stock_quantity < item['quantity']:
-                return {'success': False, 'message': f"Insufficient stock for: {product.name}"}
-
-            item_subtotal = float(product.price) * item['quantity']
-            subtotal += item_subtotal
-
-            order_items_data.append({
-                'product': product,
-                'product_name': product.name,
-                'product_sku': product.sku,
-                'quantity': item['quantity'],
-                'unit_price': product.price,
-                'subtotal': item_subtotal,
-            })
+        with span('order.validate_products', item_count=len(cart_items)):
+            for item in cart_items:
+                try:
+                    product = Product.objects.get(id=item['product_id'])
+                except Product.DoesNotExist:
+                    return {'success': False, 'message': f"Product not found: {item.get('name', 'Unknown')}"}
+
+                if (held.get(product.id, 0) < item['quantity']
+                        and product.available_to_sell(exclude_user_id=customer.user_id) < item['quantity']):
+                    return {'success': False, 'message': f"Insufficient stock for: {product.name}"}
+
+                item_subtotal_cents = product.price_cents * item['quantity']
+                subtotal_cents += item_subtotal_cents
+
+                order_items_data.append({
+                    'product': product,
+                    'product_name': product.name,
+                    'product_sku': product.sku,
+                    'quantity': item['quantity'],
+                    'unit_price_cents': product.price_cents,
+                    'subtotal_cents': item_subtotal_cents,
+                })
 
         # Calculate tax and shipping
-        tax_rate = APP_CONFIG.get('tax_rate', 0.08)
-        shipping_rate = APP_CONFIG.get('shipping_rate', 5.00)
-        free_shipping_threshold = APP_CONFIG.get('free_shipping_threshold', 100.00)
-
-        tax = subtotal * tax_rate
-        shipping = 0 if subtotal >= free_shipping_threshold else shipping_rate
-        total = subtotal + tax + shipping
+        totals = order_totals(subtotal_cents)
 
         try:
-            with transaction.atomic():
+            with span('order.transaction'), immediate_transaction():
+                # Claim the key first: a concurrent duplicate fails on the unique index
+                if idempotency_key:
+                    claim = IdempotencyKey.objects.create(customer=customer, key=idempotency_key)
+
                 # Create order
-                order = cls.objects.create(
-                    order_number=cls.generate_order_number(),
-                    customer=customer,
-                    subtotal=subtotal,
-                    tax=tax,
-                    shipping=shipping,
-                    total=total,
-                    payment_method=payment_method,
-                    shipping_address=shipping_address,
-                    billing_address=billing_address or shipping_address,
-                    notes=notes
-                )
+                with span('order.insert'):
+                    order = cls.objects.create(
+                        order_number=cls.generate_order_number(),
+                        customer=customer,
+                        subtotal_cents=totals['subtotal_cents'],
+                        tax_cents=totals['tax_cents'],
+                        shipping_cents=totals['shipping_cents'],
+                        total_cents=totals['total_cents'],
+                        payment_method=payment_method,
+                        shipping_address=shipping_address,
+                        billing_address=billing_address or shipping_address,
+                        notes=notes
+                    )
+
+                # The checks above ran before the write lock: re-read the
+                # holds and products now that no other checkout can change them
+                if reservations:
+                    held = StockReservation.held_by(customer.user_id)
+                fresh = Product.objects.in_bulk([item['product'].id for item in order_items_data])
+                for item_data in order_items_data:
+                    product = fresh.get(item_data['product'].id)
+                    if product is None or (held.get(product.id, 0) < item_data['quantity']
+                                           and product.available_to_sell(exclude_user_id=customer.user_id)
+                                           < item_data['quantity']):
+                        raise InsufficientStock(f"Insufficient stock for: {item_data['product_name']}")
+                    item_data['product'] = product
 
                 # Create order items and update stock
+                event_items = [
+                    {'product_id': item['product'].id, 'sku': item['product_sku'], 'quantity': item['quantity']}
+                    for item in order_items_data
+                ]
                 for item_data in order_items_data:
                     product = item_data.pop('product')
-                    OrderItem.objects.create(
-                        order=order,
-                        product=product,
-                        **item_data
-                    )
+                    with span('order.insert_item', product_id=product.id):
+                        OrderItem.objects.create(
+                            order=order,
+                            product=product,
+                            **item_data
+                        )
 
                     # Update stock
                     product.update_stock(
@@ -164,30 +238,208 @@ class Order(models.Model):
                         notes=f"Order {order.order_number}"
                     )
 
-                return {
+                if reservations:
+                    StockReservation.release(customer.user_id)
+
+                OutboxEvent.publish(ORDER_CREATED, order.id, order.event_payload(items=event_items))
+
+                result = {
                     'success': True,
                     'order_id': order.id,
                     'order_number': order.order_number
                 }
+                if idempotency_key:
+                    claim.order = order
+                    claim.response = result
+                    claim.save(update_fields=['order', 'response'])
+                return result
 
+        except InsufficientStock as e:
+            return {'success': False, 'message': str(e)}
+        except IntegrityError as e:
+            replay = idempotency_key and IdempotencyKey.result_for(idempotency_key, customer_id=customer.id)
+            return replay or {'success': False, 'message': f"Failed to create order: {str(e)}"}
         except Exception as e:
             return {'success': False, 'message': f"Failed to create order: {str(e)}"}
 
-    def update_status(self, new_status):
-        """Update order status."""
-        self.status = new_status
-        self.save()
+    def update_status(self, new_status, user=None):
+        """
+        Update order status, with its timeline event and outbox event in the
+        same transaction.
+        """
+        if new_status == self.status:
+            return {'success': True}
+
+        old_status = self.status
+        with transaction.atomic():
+            self.status = new_status
+            # Only the status: the payment worker may have updated this order meanwhile
+            self.save(update_fields=['status', 'updated_at'])
+            if new_status == 'cancelled':
+                self.close_payment()
+            description = self.STATUS_DESCRIPTIONS.get(new_status, f'Status changed to {new_status}')
+            OrderTimeline.add_event(self, new_status, description, user)
+            OutboxEvent.publish(ORDER_STATUS_CHANGED, self.id, self.event_payload(previous_status=old_status))
         return {'success': True}
 
+    # -------------------------------------------------------------------------
+    # Payment capture (see Payments.py and `manage.py capture_payments`)
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def claim_payments(cls, limit):
+        """
+        Claim up to `limit` orders whose payment is due for capture (oldest
+        first) by moving them to payment_status 'processing'. Each claim is
+        a conditional UPDATE, so concurrent workers never capture the same
+        order twice.
+        """
+        now = timezone.now()
+        due = cls.objects.filter(
+            Q(payment_retry_at__isnull=True) | Q(payment_retry_at__lte=now),
+            payment_status='pending', status__in=['pending', 'processing'],
+        ).exclude(payment_method='cash_on_delivery')
+        claimed = [
+            order_id for order_id in due.order_by('id').values_list('id', flat=True)[:limit]
+            if cls.objects.filter(id=order_id, payment_status='pending').update(
+                payment_status='processing', updated_at=now
+            )
+        ]
+        return list(cls.objects.filter(id__in=claimed).order_by('id'))
+
+    @classmethod
+    def release_payment_claims(cls, older_than_seconds):
+        """Put claims left behind by a stopped worker back in the queue."""
+        now = timezone.now()
+        return cls.objects.filter(
+            payment_status='processing', updated_at__lt=now - timedelta(seconds=older_than_seconds)
+        ).update(payment_status='pending', updated_at=now)
+
+    def record_payment(self, result):
+        """
+        Store a capture result (Payments.CaptureResult): paid, failed, or
+        back to pending with a retry time for gateway errors. The timeline
+        and outbox get final outcomes only. If the order was cancelled while
+        the capture was in flight, the payment is voided instead, or marked
+        refund_pending when the gateway did take the money.
+        """
+        now = timezone.now()
+        self.payment_attempts += 1
+        if result.outcome == 'captured':
+            self.payment_status = 'paid'
+            self.payment_reference = result.reference
+            self.payment_retry_at = None
+        elif result.outcome == 'declined' or self.payment_attempts >= settings.PAYMENT_MAX_ATTEMPTS:
+            self.payment_status = 'failed'
+            self.payment_retry_at = None
+        else:
+            self.payment_status = 'pending'
+            self.payment_retry_at = now + timedelta(seconds=min(5 * 2 ** self.payment_attempts, 600))
+
+        with transaction.atomic():
+            # Only if still ours (a stale-claim release may have requeued it)
+            # and the order is still open
+            updated = Order.objects.filter(id=self.id, payment_status='processing').exclude(
+                status__in=self.CLOSED_STATUSES
+            ).update(
+                payment_status=self.payment_status,
+                payment_reference=self.payment_reference,
+                payment_attempts=self.payment_attempts,
+                payment_retry_at=self.payment_retry_at,
+                updated_at=now,
+            )
+            if not updated:
+                return self.record_cancelled_payment(result, now)
+            if self.payment_status == 'paid':
+                OrderTimeline.add_event(self, self.status, f'Payment captured ({result.reference})')
+                OutboxEvent.publish(ORDER_PAYMENT_CAPTURED, self.id, self.event_payload(reference=result.reference))
+            elif self.payment_status == 'failed':
+                OrderTimeline.add_event(self, self.status, f'Payment failed: {result.message}')
+                OutboxEvent.publish(ORDER_PAYMENT_FAILED, self.id, self.event_payload(reason=result.message))
+        return True
+
+    def record_cancelled_payment(self, result, now):
+        """Settle a capture that finished after the order was cancelled."""
+        self.payment_status = 'refund_pending' if result.outcome == 'captured' else 'voided'
+        self.payment_retry_at = None
+        settled = Order.objects.filter(
+            id=self.id, payment_status='processing', status__in=self.CLOSED_STATUSES
+        ).update(
+            payment_status=self.payment_status,
+            payment_reference=self.payment_reference,
+            payment_attempts=self.payment_attempts,
+            payment_retry_at=None,
+            updated_at=now,
+        )
+        if not settled:
+            return False
+        self.refresh_from_db(fields=['status'])
+        if self.payment_status == 'refund_pending':
+            OrderTimeline.add_event(
+                self, self.status, f'Payment captured after cancellation ({result.reference}); refund due'
+            )
+        return True
+
+    def close_payment(self):
+        """
+        Cancellation side of the payment (call inside the cancelling
+        transaction): a payment not captured yet is voided, a captured one
+        becomes refund_pending. A capture in flight is settled by
+        record_payment when it finishes.
+        """
+        Order.close_payments([self.id])
+        self.refresh_from_db(fields=['payment_status', 'payment_reference', 'payment_retry_at', 'updated_at'])
+
+    @classmethod
+    def close_payments(cls, order_ids, user=None):
+        """close_payment() for many cancelled orders at once (bulk status updates)."""
+        now = timezone.now()
+        cls.objects.filter(id__in=order_ids, payment_status='pending').update(
+            payment_status='voided', payment_retry_at=None, updated_at=now
+        )
+        refunds = list(cls.objects.filter(id__in=order_ids, payment_status='paid').only(
+            'id', 'status', 'payment_reference'
+        ))
+        cls.objects.filter(id__in=[order.id for order in refunds], payment_status='paid').update(
+            payment_status='refund_pending', updated_at=now
+        )
+        OrderTimeline.objects.bulk_create([
+            OrderTimeline(order=order, status=order.status, user=user,
+                          description=f'Refund due for payment {order.payment_reference}'.strip())
+            for order in refunds
+        ])
+
+    def event_payload(self, **extra):
+        """Outbox payload describing this order."""
+        return dict({
+            'order_id': self.id,
+            'order_number': self.order_number,
+            'customer_id': self.customer_id,
+            'status': self.status,
+            'payment_status': self.payment_status,
+            'total_cents': self.total_cents,
+        }, **extra)
+
     def cancel_order(self):
         """Cancel order and restore stock."""
         if self.status not in ['pending', 'processing']:
             return {'success': False, 'message': 'Cannot cancel order in current status'}
 
         try:
-            with transaction.atomic():
+            with immediate_transaction():
+                # Only one cancel wins: a concurrent one finds the status changed
+                cancelled = Order.objects.filter(id=self.id, status__in=['pending', 'processing']).update(
+                    status='cancelled', updated_at=timezone.now()
+                )
+                if not cancelled:
+                    self.refresh_from_db(fields=['status', 'updated_at'])
+                    return {'success': False, 'message': 'Cannot cancel order in current status'}
+                self.refresh_from_db(fields=['status', 'updated_at'])
+                self.close_payment()
+
                 # Restore stock for each item
-                for item in self.items.all():
+                items = list(self.items.all())
+                for item in items:
                     item.product.update_stock(
                         quantity_change=item.quantity,
                         transaction_type='cancellation',
@@ -195,8 +447,10 @@ class Order(models.Model):
                         notes=f"Order {self.order_number} cancelled"
                     )
 
-                self.status = 'cancelled'
-                self.save()
+                OutboxEvent.publish(ORDER_CANCELLED, self.id, self.event_payload(items=[
+                    {'product_id': item.product_id, 'sku': item.product_sku, 'quantity': item.quantity}
+                    for item in items
+                ]))
 
                 return {'success': True}
         except Exception as e:
@@ -212,6 +466,32 @@ class Order(models.Model):
         """Get most recent orders."""
         return cls.objects.select_related('customer').order_by('-created_at')[:limit]
 
+    @classmethod
+    def get_customer_orders_version(cls, customer_id):
+        """(latest updated_at, order count) of a customer's orders."""
+        from django.db.models import Count, Max
+        result = cls.objects.filter(customer_id=customer_id).aggregate(
+            last_modified=Max('updated_at'), count=Count('id')
+        )
+        return result['last_modified'], result['count']
+
+    @classmethod
+    def get_detail_version(cls, order_id):
+        """
+        (customer_id, last_modified) for an order's detail page, where
+        last_modified also covers its customer and the products of its items.
+        None if the order doesn't exist.
+        """
+        from django.db.models import Max
+        rows = cls.objects.filter(id=order_id).order_by().values(
+            'customer_id', 'updated_at', 'customer__updated_at'
+        ).annotate(products_updated_at=Max('items__product__updated_at'))
+        row = next(iter(rows), None)
+        if row is None:
+            return None
+        stamps = [row['updated_at'], row['customer__updated_at'], row['products_updated_at']]
+        return row['customer_id'], max(stamp for stamp in stamps if stamp is not None)
+
     @classmethod
     def get_order_stats(cls):
         """Get order statistics for reports."""
@@ -220,9 +500,9 @@ class Order(models.Model):
         all_orders = cls.objects.all()
 
         # Total revenue (exclude cancelled)
-        total_revenue = cls.objects.exclude(status='cancelled').aggregate(
-            total=Sum('total')
-        )['total'] or 0
+        total_revenue = from_cents(cls.objects.exclude(status='cancelled').aggregate(
+            total=Sum('total_cents')
+        )['total'])
 
         # Total orders (exclude delivered, cancelled, refunded for "active" count)
         total_orders = cls.objects.exclude(
@@ -230,18 +510,18 @@ class Order(models.Model):
         ).count()
 
         # Average order value
-        avg_order = cls.objects.exclude(status='cancelled').aggregate(
-            avg=Avg('total')
-        )['avg'] or 0
+        avg_order = from_cents(round(cls.objects.exclude(status='cancelled').aggregate(
+            avg=Avg('total_cents')
+        )['avg'] or 0))
 
         # Orders by status
         by_status = {}
         for status, _ in cls.STATUS_CHOICES:
             count = cls.objects.filter(status=status).count()
             if count > 0:
-                revenue = cls.objects.filter(status=status).aggregate(
-                    total=Sum('total')
-                )['total'] or 0
+                revenue = from_cents(cls.objects.filter(status=status).aggregate(
+                    total=Sum('total_cents')
+                )['total'])
                 by_status[status] = {'count': count, 'revenue': revenue}
 
         return {
@@ -271,8 +551,8 @@ class OrderItem(models.Model):
     product_name = models.CharField(max_length=255)
     product_sku = models.CharField(max_length=50)
     quantity = models.IntegerField()
-    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
-    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    unit_price_cents = models.IntegerField()
+    subtotal_cents = models.IntegerField()
 
     class Meta:
         db_table = 'order_items'
@@ -282,6 +562,10 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.product_name} x {self.quantity}"
 
+    # Decimal dollars over the cents columns (see Money.py)
+    unit_price = cents_property('unit_price_cents')
+    subtotal = cents_property('subtotal_cents')
+
 
 class InventoryTransaction(models.Model):
     """
@@ -313,6 +597,9 @@ class InventoryTransaction(models.Model):
         verbose_name = 'Inventory Transaction'
         verbose_name_plural = 'Inventory Transactions'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['reference_id']),  # ledger rows of an order (Purge.py)
+        ]
 
     def __str__(self):
         return f"{self.transaction_type}: {self.product.name} ({self.quantity_change:+d})"
@@ -356,3 +643,57 @@ class OrderTimeline(models.Model):
             description=description,
             user=user
         )
+
+
+class IdempotencyKey(models.Model):
+    """
+    Client-supplied key of an order-creating request and the result it got.
+
+    create_from_cart() claims the key in the same transaction that creates
+    the order, so a repeated key (double click, client retry) gets the stored
+    result back instead of a second order. Failed attempts store nothing and
+    may be retried with the same key.
+    """
+
+    MAX_LENGTH = 100
+
+    customer = models.ForeignKey(
+        'Customer',
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=MAX_LENGTH)
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    response = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'idempotency_keys'
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'key'], name='one_request_per_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.key} -> order {self.order_id}"
+
+    @classmethod
+    def result_for(cls, key, customer_id=None, user_id=None):
+        """The stored result for a customer's (or user's) key, or None."""
+        keys = cls.objects.filter(key=key)
+        if customer_id is not None:
+            keys = keys.filter(customer_id=customer_id)
+        if user_id is not None:
+            keys = keys.filter(customer__user_id=user_id)
+        response = keys.values_list('response', flat=True).first()
+        return dict(response, replayed=True) if response else None
@@ -0,0 +1,116 @@
+"""
+ShopPy - Outbox Event Model
+Transactional outbox for order and inventory events.
+
+Code that changes an order or stock calls OutboxEvent.publish() inside the
+same transaction, so the event row commits (or rolls back) with the change
+and the request pays for one INSERT. `manage.py dispatch_outbox` delivers
+pending events in id order to the configured sink (see lib/ECommerce/Outbox.py)
+and deletes them once delivered; failed batches are retried with backoff
+and end up 'dead' after OUTBOX_MAX_ATTEMPTS.
+
+Topics:
+- order.created         new order, with its items (stock taken)
+- order.status_changed  admin status change
+- order.cancelled       cancelled order, with its items (stock restored)
+- order.payment_captured / order.payment_failed
+                        final capture result (capture_payments)
+- inventory.stock_set   stock level set by an admin adjustment
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+ORDER_CREATED = 'order.created'
+ORDER_STATUS_CHANGED = 'order.status_changed'
+ORDER_CANCELLED = 'order.cancelled'
+ORDER_PAYMENT_CAPTURED = 'order.payment_captured'
+ORDER_PAYMENT_FAILED = 'order.payment_failed'
+INVENTORY_STOCK_SET = 'inventory.stock_set'
+
+
+class OutboxEvent(models.Model):
+    """One event waiting for delivery to other systems."""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('dead', 'Dead'),
+    ]
+
+    topic = models.CharField(max_length=50)
+    key = models.CharField(max_length=50)  # id of the order/product the event is about
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'outbox_events'
+        verbose_name = 'Outbox Event'
+        verbose_name_plural = 'Outbox Events'
+        indexes = [
+            models.Index(fields=['status', 'id']),  # dispatcher: pending events in order
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.key} ({self.status})"
+
+    @classmethod
+    def publish(cls, topic, key, payload):
+        """Queue an event; call inside the transaction that makes the change."""
+        if settings.OUTBOX_ENABLED:
+            cls.objects.create(topic=topic, key=str(key), payload=payload)
+
+    @classmethod
+    def publish_many(cls, events):
+        """Queue (topic, key, payload) events with one INSERT."""
+        if settings.OUTBOX_ENABLED and events:
+            cls.objects.bulk_create([cls(topic=topic, key=str(key), payload=payload) for topic, key, payload in events])
+
+    def as_message(self):
+        return {
+            'id': self.id,
+            'topic': self.topic,
+            'key': self.key,
+            'payload': self.payload,
+            'created_at': self.created_at.isoformat(),
+        }
+
+    @classmethod
+    def due(cls, batch_size):
+        """
+        The oldest pending events that may be sent now, in id order. A batch
+        waiting for its retry holds back newer events, so sinks see events
+        in the order they happened.
+        """
+        now = timezone.now()
+        events = list(cls.objects.filter(status='pending').order_by('id')[:batch_size])
+        due = []
+        for event in events:
+            if event.next_attempt_at and event.next_attempt_at > now:
+                break
+            due.append(event)
+        return due
+
+    @classmethod
+    def delivered(cls, events):
+        """Compact: delivered events are deleted."""
+        return cls.objects.filter(id__in=[event.id for event in events]).delete()[0]
+
+    @classmethod
+    def failed(cls, events, error):
+        """Schedule a retry with exponential backoff, or give up after OUTBOX_MAX_ATTEMPTS."""
+        now = timezone.now()
+        for event in events:
+            event.attempts += 1
+            event.last_error = str(error)[:1000]
+            if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                event.status = 'dead'
+            event.next_attempt_at = now + timedelta(seconds=min(2 ** event.attempts, 300))
+        cls.objects.bulk_update(events, ['attempts', 'last_error', 'status', 'next_attempt_at'])
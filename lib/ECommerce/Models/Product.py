@@ -2,11 +2,30 @@
 ShopPy - Product Model
 Handles product catalog management.
 Equivalent to Perl ECommerce::Models::Product
+
+Sharded stock (flash sales): a product with stock_shard_count > 0 keeps its
+available units in that many StockShard rows instead of products.stock_quantity.
+Each checkout decrements one shard, preferring its worker's own shard and
+skipping shards another transaction holds (PostgreSQL), so concurrent
+checkouts of one hot SKU stop queueing on the single products row lock.
+When no shard can cover a quantity, the shards are locked together and
+rebalanced. stock_quantity stays the product's total: it is recomputed from
+the shards in a short statement after each committed change. Enable it per
+product with `manage.py stock_shards`.
 """
 
-from django.db import models
+import os
+import threading
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from lib.ECommerce.Money import cents_property
+from lib.ECommerce.Tracing import span
+
 
 class Product(models.Model):
     """
@@ -31,9 +50,10 @@ class Product(models.Model):
     description = models.TextField(blank=True, default='')
     sku = models.CharField(max_length=50, unique=True)
     category = models.CharField(max_length=50, choices=CATEGORY_CHOICES)
-    price = models.DecimalField(max_digits=10, decimal_places=2)
-    cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    price_cents = models.IntegerField()
+    cost_cents = models.IntegerField(default=0)
     stock_quantity = models.IntegerField(default=0)
+    stock_shard_count = models.PositiveSmallIntegerField(default=0)  # 0 = unsharded
     reorder_level = models.IntegerField(default=10)
     image_url = models.URLField(max_length=500, blank=True, default='')
     is_active = models.BooleanField(default=True)
@@ -45,10 +65,17 @@ class Product(models.Model):
         verbose_name = 'Product'
         verbose_name_plural = 'Products'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['updated_at']),  # catalog version (conditional GET)
+        ]
 
     def __str__(self):
         return self.name
 
+    # Decimal dollars over the cents columns (see Money.py)
+    price = cents_property('price_cents')
+    cost = cents_property('cost_cents')
+
     @property
     def is_in_stock(self):
         """Check if product is in stock."""
@@ -79,23 +106,86 @@ class Product(models.Model):
         """
         Update product stock and record transaction.
         Positive quantity_change increases stock, negative decreases.
+
+        The change is applied in the database (stock_quantity + n), never by
+        saving this instance's possibly stale stock_quantity, and a decrease
+        only applies while enough stock is left: otherwise InsufficientStock
+        is raised, so the surrounding transaction rolls back instead of
+        overselling.
         """
         from lib.ECommerce.Models.Order import InventoryTransaction
 
-        self.stock_quantity += quantity_change
-        self.save()
+        with span('product.update_stock', product_id=self.id, quantity_change=quantity_change):
+            if self.stock_shard_count:
+                StockShard.apply(self, quantity_change)
+                self.stock_quantity += quantity_change
+            else:
+                rows = Product.objects.filter(id=self.id)
+                if quantity_change < 0:
+                    rows = rows.filter(stock_quantity__gte=-quantity_change)
+                if not rows.update(stock_quantity=F('stock_quantity') + quantity_change, updated_at=timezone.now()):
+                    raise InsufficientStock(f"Insufficient stock for: {self.name}")
+                self.refresh_from_db(fields=['stock_quantity', 'updated_at'])
 
-        # Record the transaction
-        InventoryTransaction.objects.create(
-            product=self,
-            quantity_change=quantity_change,
-            transaction_type=transaction_type,
-            reference_id=reference_id,
-            notes=notes
-        )
+            # Record the transaction
+            InventoryTransaction.objects.create(
+                product=self,
+                quantity_change=quantity_change,
+                transaction_type=transaction_type,
+                reference_id=reference_id,
+                notes=notes
+            )
 
         return True
 
+    def available_stock(self):
+        """Units available right now (summed over the shards for sharded products)."""
+        if self.stock_shard_count:
+            return StockShard.total(self.id)
+        return self.stock_quantity
+
+    def available_to_sell(self, exclude_user_id=None):
+        """Available stock minus active cart holds (other than the given user's)."""
+        from lib.ECommerce.Models.Reservation import StockReservation
+        if not settings.STOCK_RESERVATIONS_ENABLED:
+            return self.available_stock()
+        return self.available_stock() - StockReservation.held_quantity(self.id, exclude_user_id)
+
+    def set_stock(self, quantity):
+        """Set the total stock; sharded products spread it over their shards."""
+        from lib.ECommerce.Models.Outbox import INVENTORY_STOCK_SET, OutboxEvent
+
+        with transaction.atomic():
+            if self.stock_shard_count:
+                StockShard.rebalance(self, total=quantity)
+                StockShard.sync_product(self.id)
+            else:
+                self.stock_quantity = quantity
+                self.save()
+            OutboxEvent.publish(INVENTORY_STOCK_SET, self.id, {
+                'product_id': self.id, 'sku': self.sku, 'stock_quantity': quantity,
+            })
+        if self.stock_shard_count:
+            self.refresh_from_db(fields=['stock_quantity', 'updated_at'])
+
+    def shard_stock(self, shards):
+        """
+        Spread this product's stock over `shards` counter rows (0 turns
+        sharding off and folds the shards back into stock_quantity).
+        """
+        with transaction.atomic():
+            product = Product.objects.select_for_update().get(id=self.id)
+            total = product.available_stock()
+            StockShard.objects.filter(product=product).delete()
+            StockShard.objects.bulk_create([
+                StockShard(product=product, shard=shard, quantity=quantity)
+                for shard, quantity in enumerate(StockShard.split(total, shards))
+            ])
+            Product.objects.filter(id=self.id).update(
+                stock_quantity=total, stock_shard_count=shards, updated_at=timezone.now()
+            )
+        self.refresh_from_db(fields=['stock_quantity', 'stock_shard_count', 'updated_at'])
+
     @classmethod
     def get_active_products(cls):
         """Get all active products."""
@@ -130,7 +220,121 @@ class Product(models.Model):
             queryset = queryset.filter(is_active=True)
         return queryset.order_by('id')
 
+    @classmethod
+    def get_catalog_version(cls):
+        """(latest updated_at, product count); changes when any product is added, edited or deleted."""
+        from django.db.models import Count, Max
+        result = cls.objects.aggregate(last_modified=Max('updated_at'), count=Count('id'))
+        return result['last_modified'], result['count']
+
     @classmethod
     def get_categories(cls):
         """Get list of all category choices."""
         return [cat[0] for cat in cls.CATEGORY_CHOICES]
+
+
+class InsufficientStock(Exception):
+    """A product (or its shards) has fewer units left than a sale asked for."""
+
+
+class StockShard(models.Model):
+    """One of a sharded product's stock counters (see the module docstring)."""
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_shards'
+    )
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'product_stock_shards'
+        verbose_name = 'Stock Shard'
+        verbose_name_plural = 'Stock Shards'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'shard'], name='stock_shard_per_product'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}#{self.shard}: {self.quantity}"
+
+    @staticmethod
+    def split(total, shards):
+        """`total` units as `shards` near-equal parts."""
+        if not shards:
+            return []
+        base, extra = divmod(total, shards)
+        return [base + (1 if i < extra else 0) for i in range(shards)]
+
+    @staticmethod
+    def home_shard(shards):
+        """This worker's preferred shard, so each worker mostly touches its own row."""
+        return hash((os.getpid(), threading.get_ident())) % shards
+
+    @classmethod
+    def total(cls, product_id):
+        return cls.objects.filter(product_id=product_id).aggregate(total=Sum('quantity'))['total'] or 0
+
+    @classmethod
+    def apply(cls, product, quantity_change):
+        """
+        Add (restock) or remove (sale) units; raises InsufficientStock if the
+        shards together can't cover a sale. With row locks, stock_quantity
+        catches up once the surrounding transaction commits.
+        """
+        home = cls.home_shard(product.stock_shard_count)
+        with transaction.atomic(savepoint=False):
+            if quantity_change >= 0:
+                cls.objects.filter(product=product, shard=home).update(quantity=F('quantity') + quantity_change)
+            elif not cls.take(product, -quantity_change, home):
+                cls.rebalance(product, withdraw=-quantity_change)
+
+            if transaction.get_connection().features.has_select_for_update:
+                transaction.on_commit(lambda: cls.sync_product(product.id))
+            else:
+                # SQLite: one writer at a time anyway, so sync in the same transaction
+                cls.sync_product(product.id)
+
+    @classmethod
+    def take(cls, product, quantity, home):
+        """
+        Decrement one shard holding at least `quantity`, starting at `home`
+        and wrapping around, skipping shards locked by other checkouts.
+        False if none could cover it on its own.
+        """
+        candidates = cls.objects.select_for_update(skip_locked=True).filter(
+            product=product, quantity__gte=quantity
+        ).order_by('shard')
+        for shards in (candidates.filter(shard__gte=home), candidates.filter(shard__lt=home)):
+            shard = shards.values_list('id', flat=True).first()
+            # The quantity check repeats in the UPDATE for databases without row locks
+            if shard and cls.objects.filter(id=shard, quantity__gte=quantity).update(
+                    quantity=F('quantity') - quantity):
+                return True
+        return False
+
+    @classmethod
+    def rebalance(cls, product, withdraw=0, total=None):
+        """
+        Lock all of a product's shards, take `withdraw` units and spread the
+        rest evenly (or spread `total` instead of what they hold).
+        """
+        shards = list(cls.objects.select_for_update().filter(product=product).order_by('shard'))
+        available = sum(shard.quantity for shard in shards) if total is None else total
+        if available < withdraw:
+            raise InsufficientStock(f"Insufficient stock for: {product.name}")
+
+        for shard, quantity in zip(shards, cls.split(available - withdraw, len(shards))):
+            shard.quantity = quantity
+        cls.objects.bulk_update(shards, ['quantity'])
+
+    @classmethod
+    def sync_product(cls, product_id):
+        """Recompute products.stock_quantity from the shards in one statement."""
+        shard_total = cls.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id').annotate(
+            total=Sum('quantity')
+        ).values('total')
+        Product.objects.filter(id=product_id, stock_shard_count__gt=0).update(
+            stock_quantity=Coalesce(Subquery(shard_total), 0), updated_at=timezone.now()
+        )
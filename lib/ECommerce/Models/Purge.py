@@ -0,0 +1,108 @@
+"""
+ShopPy - Purge Job Model
+Queued deletes of customers and orders too large to run in a request.
+
+Deleting a customer with a long order history in one cascade loads every
+related row and holds the write lock for the whole delete. Instead,
+lib/ECommerce/Purge.py deletes the history a chunk at a time, each chunk
+in its own short transaction. Small targets are purged in the request;
+larger ones get a PurgeJob that `manage.py purge_jobs` works through,
+recording rows deleted per table in `progress` after every chunk.
+"""
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class PurgeJob(models.Model):
+    """One customer or order to delete in the background."""
+
+    TARGET_CHOICES = [
+        ('customer', 'Customer'),
+        ('order', 'Order'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    target_id = models.IntegerField()
+    label = models.CharField(max_length=255, blank=True, default='')  # what it was, for the log
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    progress = models.JSONField(default=dict)  # table -> rows deleted (or unlinked) so far
+    last_error = models.TextField(blank=True, default='')
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'purge_jobs'
+        verbose_name = 'Purge Job'
+        verbose_name_plural = 'Purge Jobs'
+        indexes = [
+            models.Index(fields=['status', 'id']),  # purge_jobs worker queue
+            models.Index(fields=['target', 'target_id']),
+        ]
+
+    def __str__(self):
+        return f"purge {self.target} {self.target_id} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, target, target_id, label='', user=None):
+        """Queue a purge, or return the unfinished job already queued for the target."""
+        job = cls.objects.filter(target=target, target_id=target_id, status__in=['pending', 'running']).first()
+        if job is None:
+            job = cls.objects.create(target=target, target_id=target_id, label=label[:255], requested_by=user)
+        return job
+
+    @classmethod
+    def claim_next(cls):
+        """Mark the oldest pending job running and return it, or None."""
+        for job in cls.objects.filter(status='pending').order_by('id')[:5]:
+            claimed = cls.objects.filter(id=job.id, status='pending').update(status='running', started_at=timezone.now())
+            if claimed:
+                job.status = 'running'
+                return job
+        return None
+
+    @classmethod
+    def requeue_running(cls):
+        """Put jobs left 'running' by a stopped worker back in the queue (purges can resume)."""
+        return cls.objects.filter(status='running').update(status='pending')
+
+    def record(self, table, count):
+        """Add `count` rows of `table` to the progress and save it."""
+        self.progress[table] = self.progress.get(table, 0) + count
+        PurgeJob.objects.filter(id=self.id).update(progress=self.progress)
+
+    def finish(self, error=None):
+        self.status = 'failed' if error else 'done'
+        self.last_error = str(error)[:1000] if error else ''
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'last_error', 'finished_at'])
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'target': self.target,
+            'target_id': self.target_id,
+            'label': self.label,
+            'status': self.status,
+            'progress': self.progress,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
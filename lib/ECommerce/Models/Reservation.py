@@ -0,0 +1,119 @@
+"""
+ShopPy - Stock Reservation Model
+Short-lived cart holds (STOCK_RESERVATIONS_ENABLED).
+
+Adding a product to the cart holds the cart's quantity for
+STOCK_RESERVATION_MINUTES, as long as the stock minus everyone else's active
+holds covers it; each cart change renews the hold. Checkout turns the
+customer's holds into sales in the same transaction that takes the stock,
+so a held line is never rejected for stock at checkout. A hold counts only
+until expires_at, so correctness never waits for cleanup; the
+release_reservations command deletes expired rows in bulk.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Sum
+from django.utils import timezone
+
+from lib.ECommerce.Database import immediate_transaction
+
+
+class StockReservation(models.Model):
+    """Units of one product held for one user's cart until expires_at."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='stock_reservations'
+    )
+    product = models.ForeignKey(
+        'Product',
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    quantity = models.IntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'stock_reservations'
+        verbose_name = 'Stock Reservation'
+        verbose_name_plural = 'Stock Reservations'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='one_reservation_per_cart_line'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'expires_at']),  # active holds per product
+            models.Index(fields=['expires_at']),  # release_reservations sweep
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for user {self.user_id}"
+
+    @classmethod
+    def active(cls):
+        return cls.objects.filter(expires_at__gt=timezone.now())
+
+    @classmethod
+    def held_quantity(cls, product_id, exclude_user_id=None):
+        """Units of a product held by active reservations (other than the given user's)."""
+        holds = cls.active().filter(product_id=product_id)
+        if exclude_user_id is not None:
+            holds = holds.exclude(user_id=exclude_user_id)
+        return holds.aggregate(total=Sum('quantity'))['total'] or 0
+
+    @classmethod
+    def held_by(cls, user_id):
+        """{product_id: quantity} of a user's active holds."""
+        return dict(cls.active().filter(user_id=user_id).values_list('product_id', 'quantity'))
+
+    @classmethod
+    def reserve(cls, user_id, product, quantity):
+        """
+        Check that `quantity` units (the whole cart line) are available to this
+        user and, with reservations enabled, hold them. Without reservations
+        this is the old advisory stock check.
+        """
+        if not settings.STOCK_RESERVATIONS_ENABLED:
+            if product.stock_quantity < quantity:
+                return {'success': False, 'message': 'Not enough stock available'}
+            return {'success': True}
+
+        # One holder at a time per database (SQLite) / product row (PostgreSQL)
+        with immediate_transaction():
+            product = type(product).objects.select_for_update().get(id=product.id)
+            if product.available_to_sell(exclude_user_id=user_id) < quantity:
+                return {'success': False, 'message': 'Not enough stock available'}
+
+            cls.objects.update_or_create(
+                user_id=user_id, product=product,
+                defaults={
+                    'quantity': quantity,
+                    'expires_at': timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES),
+                },
+            )
+        return {'success': True}
+
+    @classmethod
+    def release(cls, user_id, product_id=None):
+        """Drop a user's hold on one product, or all of them."""
+        if not settings.STOCK_RESERVATIONS_ENABLED:
+            return 0
+        holds = cls.objects.filter(user_id=user_id)
+        if product_id is not None:
+            holds = holds.filter(product_id=product_id)
+        return holds.delete()[0]
+
+    @classmethod
+    def release_expired(cls, batch_size=1000):
+        """Delete expired holds in batches of `batch_size`; returns how many."""
+        released = 0
+        now = timezone.now()
+        while True:
+            ids = list(cls.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return released
+            released += cls.objects.filter(id__in=ids).delete()[0]
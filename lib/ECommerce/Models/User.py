@@ -12,8 +12,8 @@ from django.utils import timezone
 class UserManager(BaseUserManager):
     """Custom user manager for ShopPy users."""
 
-    def create_user(self, username, email, password=None, role='customer', **extra_fields):
-        """Create and save a regular user."""
+    def create_user(self, username, email, password=None, role='customer', password_hash=None, **extra_fields):
+        """Create and save a regular user (pass password_hash to store an already encoded password)."""
         if not username:
             raise ValueError('Username is required')
         if not email:
@@ -26,7 +26,10 @@ class UserManager(BaseUserManager):
             role=role,
             **extra_fields
         )
-        user.set_password(password)
+        if password_hash:
+            user.password = password_hash
+        else:
+            user.set_password(password)
         user.save(using=self._db)
         return user
 
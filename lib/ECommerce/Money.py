@@ -0,0 +1,109 @@
+"""
+ShopPy - Money
+Amounts are integer cents everywhere: in the database (*_cents columns), in
+the session cart, in pricing and in JSON (*_cents keys). Totals are plain
+integer sums, so they are exact and need no Decimal work per row.
+
+Decimal only appears at the edges: models expose `price`, `total`, ... as
+Decimal dollars for templates and forms (cents_property), and from_cents()
+converts aggregates for display.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from lib.ECommerce.Config import APP_CONFIG
+
+
+def to_cents(amount):
+    """Dollars (Decimal, float, str or int) to integer cents, rounding half up."""
+    if amount in (None, ''):
+        return 0
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """Integer cents to Decimal dollars with two places."""
+    return Decimal(int(cents or 0)).scaleb(-2)
+
+
+def cents_to_float(cents):
+    """Integer cents to float dollars, for charts and legacy JSON keys."""
+    return round((cents or 0) / 100, 2)
+
+
+def percent_of(cents, rate):
+    """`rate` (e.g. 0.08) of an amount in cents, rounded half up to a cent."""
+    return int((Decimal(cents) * Decimal(str(rate))).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def cents_property(field_name):
+    """Decimal-dollar property over an integer cents field (also usable as a model kwarg)."""
+    def getter(self):
+        return from_cents(getattr(self, field_name))
+
+    def setter(self, value):
+        setattr(self, field_name, to_cents(value))
+
+    return property(getter, setter, doc=f'{field_name} in dollars')
+
+
+# =============================================================================
+# PRICING
+# =============================================================================
+
+def order_totals(subtotal_cents):
+    """Tax, shipping and total for a subtotal, all in cents."""
+    tax_rate = APP_CONFIG.get('tax_rate', 0.08)
+    free_shipping_threshold = to_cents(APP_CONFIG.get('free_shipping_threshold', 100.00))
+    free_shipping = subtotal_cents >= free_shipping_threshold
+
+    tax_cents = percent_of(subtotal_cents, tax_rate)
+    shipping_cents = 0 if free_shipping else to_cents(APP_CONFIG.get('shipping_rate', 5.00))
+    return {
+        'subtotal_cents': subtotal_cents,
+        'tax_cents': tax_cents,
+        'shipping_cents': shipping_cents,
+        'total_cents': subtotal_cents + tax_cents + shipping_cents,
+        'free_shipping': free_shipping,
+    }
+
+
+def item_price_cents(item):
+    """Unit price of a session cart line (carts saved before cents carry 'price')."""
+    if 'price_cents' in item:
+        return int(item['price_cents'])
+    return to_cents(item.get('price', 0))
+
+
+def cart_totals(cart):
+    """Totals of a session cart in cents."""
+    subtotal_cents = sum(item_price_cents(item) * int(item['quantity']) for item in cart)
+    return order_totals(subtotal_cents)
+
+
+def cart_json(cart):
+    """
+    Cart lines and totals for the cart APIs: *_cents keys plus the old float
+    keys, derived from the cents, for existing clients.
+    """
+    items = []
+    for item in cart:
+        price_cents = item_price_cents(item)
+        subtotal_cents = price_cents * int(item['quantity'])
+        items.append(dict(
+            item,
+            price_cents=price_cents,
+            subtotal_cents=subtotal_cents,
+            price=cents_to_float(price_cents),
+            subtotal=cents_to_float(subtotal_cents),
+        ))
+
+    totals = cart_totals(cart)
+    return {
+        'items': items,
+        **totals,
+        'subtotal': cents_to_float(totals['subtotal_cents']),
+        'tax': cents_to_float(totals['tax_cents']),
+        'shipping': cents_to_float(totals['shipping_cents']),
+        'total': cents_to_float(totals['total_cents']),
+    }
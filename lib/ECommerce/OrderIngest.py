@@ -0,0 +1,333 @@
+"""
+ShopPy - Batch Order Ingestion
+Creates many orders per call for marketplace and B2B connectors.
+
+Used by POST /api/orders/ingest/ (bearer token, see ORDER_INGEST_TOKENS) and
+`manage.py ingest_orders`. Each entry looks like:
+
+    {"customer_id": 12, "items": [{"sku": "ABC-1", "quantity": 2}],
+     "payment_method": "bank_transfer", "shipping_address": "...",
+     "billing_address": "...", "notes": "...", "idempotency_key": "mkt-981"}
+
+Items name a product by "sku" or "product_id". A batch costs a fixed number
+of queries rather than several per order line: one fetch each for the
+customers, the already-used idempotency keys and the products (locked,
+with the stock shards of sharded ones), then one transaction with bulk
+inserts of the orders, items, ledger rows, keys and order.created outbox
+events and one stock UPDATE per product. Entries are
+checked one by one in batch order against the stock left by the entries
+before them; an entry that fails (unknown customer or product, not enough
+stock, bad input) gets its own error result and the rest of the batch
+still goes through. Idempotency
+keys work as for checkout: a key the customer already used (in an earlier
+batch or earlier in this one) returns the original result.
+"""
+
+import random
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from lib.ECommerce.Database import immediate_transaction
+from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Order import IdempotencyKey, InventoryTransaction, Order, OrderItem
+from lib.ECommerce.Models.Outbox import ORDER_CREATED, OutboxEvent
+from lib.ECommerce.Models.Product import Product, StockShard
+from lib.ECommerce.Models.Reservation import StockReservation
+from lib.ECommerce.Money import order_totals
+from lib.ECommerce.Tracing import span
+
+
+PAYMENT_METHODS = {value for value, _ in Order.PAYMENT_METHOD_CHOICES}
+
+
+class InvalidEntry(ValueError):
+    """An ingest entry that can't become an order; the message is returned to the caller."""
+
+
+def parse_entry(entry):
+    """Normalize one ingest entry or raise InvalidEntry."""
+    if not isinstance(entry, dict):
+        raise InvalidEntry('Entry must be an object')
+
+    try:
+        customer_id = int(entry['customer_id'])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidEntry('customer_id is required')
+
+    items = entry.get('items')
+    if not isinstance(items, list) or not items:
+        raise InvalidEntry('items must be a non-empty list')
+
+    lines = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise InvalidEntry('Each item must be an object')
+        try:
+            quantity = int(item.get('quantity', 1))
+        except (TypeError, ValueError):
+            raise InvalidEntry('Item quantity must be a whole number')
+        if quantity < 1:
+            raise InvalidEntry('Item quantity must be at least 1')
+        if item.get('sku'):
+            lines.append(('sku', str(item['sku']), quantity))
+        elif item.get('product_id'):
+            try:
+                lines.append(('id', int(item['product_id']), quantity))
+            except (TypeError, ValueError):
+                raise InvalidEntry('product_id must be a number')
+        else:
+            raise InvalidEntry('Each item needs a sku or product_id')
+
+    payment_method = entry.get('payment_method') or ''
+    if payment_method and payment_method not in PAYMENT_METHODS:
+        raise InvalidEntry(f'Unknown payment_method: {payment_method}')
+
+    key = str(entry.get('idempotency_key') or '').strip()
+    if len(key) > IdempotencyKey.MAX_LENGTH:
+        raise InvalidEntry('Invalid idempotency key')
+
+    shipping_address = str(entry.get('shipping_address') or '')
+    return {
+        'customer_id': customer_id,
+        'lines': lines,
+        'payment_method': payment_method,
+        'shipping_address': shipping_address,
+        'billing_address': str(entry.get('billing_address') or shipping_address),
+        'notes': str(entry.get('notes') or ''),
+        'idempotency_key': key,
+    }
+
+
+def unique_order_numbers(count):
+    """`count` order numbers not used yet (Order.generate_order_number format)."""
+    date_str = datetime.now().strftime('%Y%m%d')
+    numbers = set()
+    while len(numbers) < count:
+        candidates = {f"ORD-{date_str}-{random.randint(10000, 99999)}" for _ in range(count - len(numbers))}
+        taken = set(Order.objects.filter(order_number__in=candidates).values_list('order_number', flat=True))
+        numbers |= candidates - taken
+    return list(numbers)
+
+
+def ingest_batch(entries):
+    """
+    Create orders for a list of ingest entries.
+    Returns {'success', 'created', 'failed', 'replayed', 'elapsed_ms',
+    'orders_per_second', 'results'}, with one result per entry in order.
+    """
+    started = time.perf_counter()
+    results = [None] * len(entries)
+    parsed = {}
+
+    for index, entry in enumerate(entries):
+        try:
+            parsed[index] = parse_entry(entry)
+        except InvalidEntry as e:
+            results[index] = {'success': False, 'message': str(e)}
+
+    # A concurrent batch (or checkout) may claim one of our keys first;
+    # the retry then answers that entry from the stored result.
+    for attempt in range(2):
+        try:
+            with span('ingest.batch', size=len(parsed)):
+                created = _create_orders(parsed, results)
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+
+    for index, result in enumerate(results):
+        results[index] = dict(result, index=index)
+
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for result in results if not result['success'])
+    return {
+        'success': True,
+        'created': created,
+        'failed': failed,
+        'replayed': sum(1 for result in results if result.get('replayed')),
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'orders_per_second': round(created / elapsed, 1) if elapsed else 0,
+        'results': results,
+    }
+
+
+def _create_orders(parsed, results):
+    """Fill `results` for the parsed entries; returns the number of orders created."""
+    customer_ids = {entry['customer_id'] for entry in parsed.values()}
+    customers = set(Customer.objects.filter(id__in=customer_ids).values_list('id', flat=True))
+
+    keys = {entry['idempotency_key'] for entry in parsed.values() if entry['idempotency_key']}
+    used = {
+        (customer_id, key): dict(response, replayed=True)
+        for customer_id, key, response in IdempotencyKey.objects.filter(
+            customer_id__in=customer_ids, key__in=keys
+        ).values_list('customer_id', 'key', 'response')
+    } if keys else {}
+
+    skus = {value for entry in parsed.values() for kind, value, _ in entry['lines'] if kind == 'sku'}
+    ids = {value for entry in parsed.values() for kind, value, _ in entry['lines'] if kind == 'id'}
+
+    with immediate_transaction():
+        products = list(Product.objects.select_for_update().filter(Q(sku__in=skus) | Q(id__in=ids)))
+        by_sku = {product.sku: product for product in products}
+        by_id = {product.id: product for product in products}
+
+        # Checkout decrements shards without touching the product row, so lock
+        # the shards too: what they hold now is what the batch can sell
+        sharded = [product.id for product in products if product.stock_shard_count]
+        if sharded:
+            list(StockShard.objects.select_for_update().filter(product_id__in=sharded).order_by(
+                'product_id', 'shard').values_list('id', flat=True))
+
+        # Units each product can still sell in this batch
+        remaining = {}
+        for product in products:
+            remaining[product.id] = product.available_stock()
+        if settings.STOCK_RESERVATIONS_ENABLED and products:
+            for product_id, held in StockReservation.active().filter(product_id__in=by_id).values(
+                    'product_id').annotate(held=Sum('quantity')).values_list('product_id', 'held'):
+                remaining[product_id] -= held
+
+        accepted = []  # (index, entry, [(product, quantity)], totals)
+        in_batch = {}  # (customer_id, key) -> index of the entry that claims it
+        for index, entry in parsed.items():
+            claim = (entry['customer_id'], entry['idempotency_key'])
+            if entry['idempotency_key'] and claim in used:
+                results[index] = used[claim]
+                continue
+            if entry['idempotency_key'] and claim in in_batch:
+                results[index] = in_batch[claim]  # an index, resolved below
+                continue
+            if entry['customer_id'] not in customers:
+                results[index] = {'success': False, 'message': f"Customer not found: {entry['customer_id']}"}
+                continue
+
+            try:
+                lines = _resolve_lines(entry['lines'], by_sku, by_id, remaining)
+            except InvalidEntry as e:
+                results[index] = {'success': False, 'message': str(e)}
+                continue
+
+            for product, quantity in lines:
+                remaining[product.id] -= quantity
+            subtotal_cents = sum(product.price_cents * quantity for product, quantity in lines)
+            accepted.append((index, entry, lines, order_totals(subtotal_cents)))
+            if entry['idempotency_key']:
+                in_batch[claim] = index
+
+        if accepted:
+            _insert_orders(accepted, results)
+
+    for index, result in enumerate(results):
+        if isinstance(result, int):
+            results[index] = dict(results[result], replayed=True)
+    return len(accepted)
+
+
+def _resolve_lines(lines, by_sku, by_id, remaining):
+    """[(product, quantity)] for an entry's lines, or InvalidEntry."""
+    resolved = []
+    for kind, value, quantity in lines:
+        product = by_sku.get(value) if kind == 'sku' else by_id.get(value)
+        if product is None or not product.is_active:
+            raise InvalidEntry(f"Product not found: {value}")
+        resolved.append((product, quantity))
+
+    wanted = Counter()
+    for product, quantity in resolved:
+        wanted[product.id] += quantity
+    for product, quantity in resolved:
+        if wanted[product.id] > remaining[product.id]:
+            raise InvalidEntry(f"Insufficient stock for: {product.name}")
+    return resolved
+
+
+def _insert_orders(accepted, results):
+    """Bulk-insert the accepted orders with their items, ledger rows, stock changes and keys."""
+    now = timezone.now()
+    numbers = unique_order_numbers(len(accepted))
+    orders = [
+        Order(
+            order_number=number,
+            customer_id=entry['customer_id'],
+            subtotal_cents=totals['subtotal_cents'],
+            tax_cents=totals['tax_cents'],
+            shipping_cents=totals['shipping_cents'],
+            total_cents=totals['total_cents'],
+            payment_method=entry['payment_method'],
+            shipping_address=entry['shipping_address'],
+            billing_address=entry['billing_address'],
+            notes=entry['notes'],
+            created_at=now,
+        )
+        for number, (_, entry, _, totals) in zip(numbers, accepted)
+    ]
+
+    with span('ingest.insert_orders', count=len(orders)):
+        if transaction.get_connection().features.can_return_rows_from_bulk_insert:
+            Order.objects.bulk_create(orders)
+        else:
+            for order in orders:
+                order.save(force_insert=True)
+
+    items = []
+    ledger = []
+    sold = Counter()
+    keys = []
+    for order, (index, entry, lines, _) in zip(orders, accepted):
+        for product, quantity in lines:
+            items.append(OrderItem(
+                order=order,
+                product=product,
+                product_name=product.name,
+                product_sku=product.sku,
+                quantity=quantity,
+                unit_price_cents=product.price_cents,
+                subtotal_cents=product.price_cents * quantity,
+            ))
+            ledger.append(InventoryTransaction(
+                product=product,
+                quantity_change=-quantity,
+                transaction_type='sale',
+                reference_id=order.id,
+                notes=f"Order {order.order_number}",
+                created_at=now,
+            ))
+            sold[product.id] += quantity
+
+        results[index] = {'success': True, 'order_id': order.id, 'order_number': order.order_number}
+        if entry['idempotency_key']:
+            keys.append(IdempotencyKey(
+                customer_id=entry['customer_id'], key=entry['idempotency_key'],
+                order=order, response=results[index], created_at=now,
+            ))
+
+    with span('ingest.insert_items', count=len(items)):
+        OrderItem.objects.bulk_create(items)
+        InventoryTransaction.objects.bulk_create(ledger)
+        IdempotencyKey.objects.bulk_create(keys)
+        OutboxEvent.publish_many([
+            (ORDER_CREATED, order.id, order.event_payload(items=[
+                {'product_id': product.id, 'sku': product.sku, 'quantity': quantity} for product, quantity in lines
+            ]))
+            for order, (_, _, lines, _) in zip(orders, accepted)
+        ])
+
+    products = {product.id: product for _, _, lines, _ in accepted for product, _ in lines}
+    with span('ingest.update_stock', products=len(sold)):
+        for product_id, quantity in sold.items():
+            product = products[product_id]
+            if product.stock_shard_count:
+                StockShard.apply(product, -quantity)
+            else:
+                # update() skips auto_now; updated_at feeds the catalog ETags
+                Product.objects.filter(id=product_id).update(
+                    stock_quantity=F('stock_quantity') - quantity, updated_at=now
+                )
@@ -0,0 +1,106 @@
+"""
+ShopPy - Outbox Delivery
+Sinks for `manage.py dispatch_outbox` (see Models/Outbox.py).
+
+OUTBOX_SINK picks where events go:
+
+- stub                    keep them in memory and log a line per batch (local
+                          development, tests)
+- file:data/events.jsonl  append one JSON line per event; a path ending in
+                          .gz is written gzip-compressed
+- http(s)://host/path     POST each batch as gzip-compressed JSON
+                          {"events": [...]}, with OUTBOX_HTTP_TOKEN as a
+                          bearer token if set. Any 2xx is delivered.
+
+A sink gets a whole batch and either returns or raises; the dispatcher
+then deletes the batch or schedules a retry. Delivery is at least once, so
+receivers should skip event ids they've already seen.
+"""
+
+import gzip
+import json
+import logging
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+
+
+logger = logging.getLogger('shoppy.outbox')
+
+
+class DeliveryError(Exception):
+    """A sink couldn't deliver a batch."""
+
+
+class StubSink:
+    def __init__(self):
+        self.delivered = []
+
+    def send(self, messages):
+        self.delivered.extend(messages)
+        logger.info('Outbox stub: %d event(s), last %s', len(messages), messages[-1]['topic'])
+
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, messages):
+        lines = ''.join(json.dumps(message, separators=(',', ':')) + '\n' for message in messages)
+        opener = gzip.open if self.path.endswith('.gz') else open
+        try:
+            with opener(self.path, 'at', encoding='utf-8') as sink:
+                sink.write(lines)
+        except OSError as e:
+            raise DeliveryError(f"Can't write {self.path}: {e}")
+
+
+class HttpSink:
+    def __init__(self, url):
+        self.url = url
+
+    def send(self, messages):
+        body = gzip.compress(json.dumps({'events': messages}, separators=(',', ':')).encode())
+        request = urllib.request.Request(self.url, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+        })
+        if settings.OUTBOX_HTTP_TOKEN:
+            request.add_header('Authorization', f'Bearer {settings.OUTBOX_HTTP_TOKEN}')
+        try:
+            with urllib.request.urlopen(request, timeout=settings.OUTBOX_HTTP_TIMEOUT_S) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            raise DeliveryError(f'{self.url} answered {e.code}')
+        except (urllib.error.URLError, OSError) as e:
+            raise DeliveryError(f"Can't reach {self.url}: {e}")
+
+
+def get_sink(spec=None):
+    """Sink for an OUTBOX_SINK value."""
+    spec = spec or settings.OUTBOX_SINK
+    if spec == 'stub':
+        return StubSink()
+    if spec.startswith('file:'):
+        return FileSink(spec[len('file:'):])
+    if spec.startswith(('http://', 'https://')):
+        return HttpSink(spec)
+    raise ValueError(f'Unknown OUTBOX_SINK: {spec}')
+
+
+def dispatch_once(sink, batch_size):
+    """Deliver one batch of due events; returns (delivered, failed)."""
+    from lib.ECommerce.Models.Outbox import OutboxEvent
+
+    events = OutboxEvent.due(batch_size)
+    if not events:
+        return 0, 0
+    try:
+        sink.send([event.as_message() for event in events])
+    except Exception as e:
+        logger.warning('Outbox delivery of %d event(s) failed: %s', len(events), e)
+        OutboxEvent.failed(events, e)
+        return 0, len(events)
+    OutboxEvent.delivered(events)
+    return len(events), 0
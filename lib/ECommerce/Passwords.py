@@ -0,0 +1,230 @@
+"""
+ShopPy - Password Hashing
+Keeps password hashing off the request threads and rations login attempts.
+
+- Hashing and verification run in a small process pool
+  (PASSWORD_HASH_WORKERS processes per web worker), so a login burst burns
+  those processes' CPU instead of stalling checkout threads. At most
+  PASSWORD_HASH_QUEUE_SIZE jobs may be queued per web worker; past that,
+  callers get PasswordHashBusy straight away instead of waiting in line,
+  and so do jobs still unfinished after PASSWORD_HASH_TIMEOUT_S.
+- PASSWORD_HASHER picks the hasher ('pbkdf2' or 'bcrypt') and its cost
+  (PASSWORD_PBKDF2_ITERATIONS / PASSWORD_BCRYPT_ROUNDS). Stored hashes made
+  with another hasher or cost are re-hashed on the user's next login.
+- throttle_login() is a token bucket per client IP and per username, checked
+  before any hashing so credential stuffing can't exhaust worker CPU.
+
+This module is imported by the pool processes, so it must not import models.
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.cache import cache
+
+
+logger = logging.getLogger('shoppy.passwords')
+
+THROTTLE_KEY_PREFIX = 'login-throttle'
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_broken = False
+_pending = None
+
+
+class PasswordHashBusy(Exception):
+    """The hashing queue is full; the caller should answer 503 / try later."""
+
+
+# =============================================================================
+# HASHERS
+# =============================================================================
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with PASSWORD_PBKDF2_ITERATIONS."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    """bcrypt (SHA-256 prehash) with PASSWORD_BCRYPT_ROUNDS."""
+
+    @property
+    def rounds(self):
+        return settings.PASSWORD_BCRYPT_ROUNDS
+
+
+# =============================================================================
+# POOL JOBS (run in the pool processes)
+# =============================================================================
+
+def _encode(password):
+    return hashers.make_password(password)
+
+
+def _verify(password, encoded):
+    """Returns (valid, new_encoded); new_encoded is set when the hash needs upgrading."""
+    if not encoded or not hashers.is_password_usable(encoded):
+        return False, None
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False, None
+
+    if not hasher.verify(password, encoded):
+        return False, None
+    preferred = hashers.get_hasher('default')
+    if hasher.algorithm != preferred.algorithm or preferred.must_update(encoded):
+        return True, preferred.encode(password, preferred.salt())
+    return True, None
+
+
+# =============================================================================
+# POOL
+# =============================================================================
+
+def _reset_after_fork():
+    # A forked gunicorn worker must not share its parent's pool
+    global _pool, _pool_broken, _pending
+    _pool = None
+    _pool_broken = False
+    _pending = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _get_pool():
+    global _pool, _pending
+    with _pool_lock:
+        if _pending is None:
+            _pending = threading.BoundedSemaphore(max(settings.PASSWORD_HASH_QUEUE_SIZE, 1))
+        if _pool is None and not _pool_broken and settings.PASSWORD_HASH_WORKERS > 0:
+            # spawn: never fork a multi-threaded web worker
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool, _pending
+
+
+def _discard_pool(pool, broken=False):
+    global _pool, _pool_broken
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            _pool_broken = _pool_broken or broken
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(func, *args):
+    """Run a hashing job in the pool (inline with PASSWORD_HASH_WORKERS=0)."""
+    from lib.ECommerce.Tracing import span
+
+    pool, pending = _get_pool()
+    if not pending.acquire(blocking=False):
+        raise PasswordHashBusy('Too many password checks in progress')
+    try:
+        with span('auth.password', job=func.__name__.strip('_')):
+            if pool is None:
+                return func(*args)
+            try:
+                future = pool.submit(func, *args)
+                return future.result(timeout=settings.PASSWORD_HASH_TIMEOUT_S)
+            except FutureTimeoutError:
+                # Queued behind slower jobs; give up rather than hold the request
+                future.cancel()
+                raise PasswordHashBusy('Password check timed out')
+            except BrokenProcessPool:
+                # e.g. a script without an `if __name__ == '__main__'` guard,
+                # which spawned processes can't import
+                logger.warning('Password hashing pool failed; hashing inline in this process')
+                _discard_pool(pool, broken=True)
+                return func(*args)
+    finally:
+        pending.release()
+
+
+def hash_password(password):
+    """Encoded hash of `password` with the preferred hasher."""
+    return _run(_encode, password)
+
+
+def verify_password(user, password):
+    """
+    Check `password` against user.password, saving an upgraded hash when the
+    preferred hasher or its cost has changed.
+    """
+    valid, upgraded = _run(_verify, password, user.password)
+    if upgraded:
+        user.password = upgraded
+        user.save(update_fields=['password'])
+    return valid
+
+
+def shutdown():
+    """Stop the pool processes (management commands, tests)."""
+    with _pool_lock:
+        pool = _pool
+    if pool is not None:
+        _discard_pool(pool)
+
+
+# =============================================================================
+# THROTTLE
+# =============================================================================
+
+def client_ip(request):
+    """Client address; behind the proxy, the X-Forwarded-For hop it appended (clients can forge the rest)."""
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    if forwarded:
+        return forwarded.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def take_token(key, burst, per_minute):
+    """
+    Take one token from the bucket stored under `key`. Returns 0 when allowed,
+    otherwise the seconds until a token is available. Buckets live in the
+    default cache, so they are shared across workers when that cache is.
+    """
+    now = time.time()
+    tokens, updated = cache.get(key, (burst, now))
+    tokens = min(burst, tokens + (now - updated) * per_minute / 60)
+
+    if tokens < 1:
+        cache.set(key, (tokens, now), timeout=math.ceil(burst * 60 / per_minute))
+        return math.ceil((1 - tokens) * 60 / per_minute)
+    cache.set(key, (tokens - 1, now), timeout=math.ceil(burst * 60 / per_minute))
+    return 0
+
+
+def throttle_login(request, username=None):
+    """
+    Charge one attempt to the client IP's and the username's buckets.
+    Returns 0 when allowed, else seconds to wait.
+    """
+    if not settings.LOGIN_THROTTLE_ENABLED:
+        return 0
+    retry_after = take_token(
+        f'{THROTTLE_KEY_PREFIX}:ip:{client_ip(request)}',
+        settings.LOGIN_THROTTLE_IP_BURST, settings.LOGIN_THROTTLE_IP_PER_MINUTE,
+    )
+    if username:
+        retry_after = max(retry_after, take_token(
+            f'{THROTTLE_KEY_PREFIX}:user:{username.lower()}',
+            settings.LOGIN_THROTTLE_USER_BURST, settings.LOGIN_THROTTLE_USER_PER_MINUTE,
+        ))
+    return retry_after
@@ -0,0 +1,175 @@
+"""
+ShopPy - Payment Capture
+Captures order payments off the request path.
+
+Checkout only creates the order with payment_status 'pending'.
+`manage.py capture_payments` claims pending orders (payment_status
+'processing'), captures them through the PAYMENT_GATEWAY adapter on
+PAYMENT_CONCURRENCY threads and records each result on the order
+(Order.record_payment: payment_status, reference, timeline and outbox
+events). Declines fail the payment; gateway errors are retried with backoff
+up to PAYMENT_MAX_ATTEMPTS. Cash on delivery orders are not captured.
+
+Cancelled orders are never charged: cancelling voids a pending payment and
+marks a paid one refund_pending (Order.close_payment), and a capture that
+finishes after the cancel is recorded as voided, or as refund_pending if the
+gateway took the money.
+
+Adapters implement capture(order) and return a CaptureResult:
+
+- stub  local fake gateway that sleeps PAYMENT_STUB_LATENCY_MS (with
+        jitter) and declines PAYMENT_STUB_DECLINE_RATE / errors
+        PAYMENT_STUB_ERROR_RATE of captures, for load and failure testing
+- http  JSON gateway at PAYMENT_GATEWAY_URL: POST /captures with the amount
+        and the order number as idempotency key, over a pool of keep-alive
+        connections (one per capture thread)
+
+The order number is sent as the idempotency key so a capture retried after
+a crash can't charge twice at a gateway that honours it.
+"""
+
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+
+class CaptureResult:
+    """Outcome of one capture attempt."""
+
+    CAPTURED = 'captured'
+    DECLINED = 'declined'  # final: the payment failed
+    ERROR = 'error'        # transient: try again later
+
+    def __init__(self, outcome, reference='', message=''):
+        self.outcome = outcome
+        self.reference = reference
+        self.message = message
+
+    def __repr__(self):
+        return f'CaptureResult({self.outcome!r}, {self.reference!r}, {self.message!r})'
+
+
+class PaymentGateway:
+    """Adapter interface: capture the order's total, never raise for gateway problems."""
+
+    name = 'base'
+
+    def capture(self, order):
+        raise NotImplementedError
+
+
+class StubGateway(PaymentGateway):
+    """Fake gateway with configurable latency and failure rates."""
+
+    name = 'stub'
+
+    def __init__(self, latency_ms=None, decline_rate=None, error_rate=None):
+        self.latency_ms = settings.PAYMENT_STUB_LATENCY_MS if latency_ms is None else latency_ms
+        self.decline_rate = settings.PAYMENT_STUB_DECLINE_RATE if decline_rate is None else decline_rate
+        self.error_rate = settings.PAYMENT_STUB_ERROR_RATE if error_rate is None else error_rate
+        self.captured = {}  # idempotency key -> reference
+        self.lock = threading.Lock()
+
+    def capture(self, order):
+        time.sleep(random.uniform(0.5, 1.5) * self.latency_ms / 1000)
+        with self.lock:
+            if order.order_number in self.captured:
+                return CaptureResult(CaptureResult.CAPTURED, self.captured[order.order_number])
+
+        roll = random.random()
+        if roll < self.error_rate:
+            return CaptureResult(CaptureResult.ERROR, message='Stub gateway timeout')
+        if roll < self.error_rate + self.decline_rate:
+            return CaptureResult(CaptureResult.DECLINED, message='Card declined (stub)')
+
+        reference = f'stub_{order.order_number}_{random.randrange(16 ** 8):08x}'
+        with self.lock:
+            self.captured[order.order_number] = reference
+        return CaptureResult(CaptureResult.CAPTURED, reference)
+
+
+class ConnectionPool:
+    """Up to `size` keep-alive connections to one host, shared by the capture threads."""
+
+    def __init__(self, url, size, timeout):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize=size)
+
+    def get(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return self.connection_class(self.host, self.port, timeout=self.timeout)
+
+    def put(self, connection):
+        try:
+            self.idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+
+class HttpGateway(PaymentGateway):
+    """JSON payment gateway: POST {url}/captures."""
+
+    name = 'http'
+
+    def __init__(self, url=None, token=None, pool_size=None):
+        self.url = (url or settings.PAYMENT_GATEWAY_URL).rstrip('/')
+        self.path = urlsplit(self.url).path + '/captures'
+        self.token = settings.PAYMENT_GATEWAY_TOKEN if token is None else token
+        self.pool = ConnectionPool(self.url, pool_size or settings.PAYMENT_CONCURRENCY,
+                                   settings.PAYMENT_GATEWAY_TIMEOUT_S)
+
+    def capture(self, order):
+        body = json.dumps({
+            'amount_cents': order.total_cents,
+            'currency': settings.PAYMENT_CURRENCY,
+            'payment_method': order.payment_method,
+            'order_number': order.order_number,
+        })
+        headers = {'Content-Type': 'application/json', 'Idempotency-Key': order.order_number}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+
+        connection = self.pool.get()
+        try:
+            connection.request('POST', self.path, body=body, headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+        except (http.client.HTTPException, OSError) as e:
+            connection.close()
+            return CaptureResult(CaptureResult.ERROR, message=f'Gateway unreachable: {e}')
+        self.pool.put(connection)
+
+        try:
+            data = json.loads(payload or b'{}')
+        except ValueError:
+            data = {}
+        if 200 <= response.status < 300 and data.get('status') == 'captured':
+            return CaptureResult(CaptureResult.CAPTURED, str(data.get('reference', '')))
+        if response.status in (402, 422) or data.get('status') == 'declined':
+            return CaptureResult(CaptureResult.DECLINED, message=data.get('message', 'Payment declined'))
+        return CaptureResult(CaptureResult.ERROR, message=data.get('message', f'Gateway answered {response.status}'))
+
+
+GATEWAYS = {
+    'stub': StubGateway,
+    'http': HttpGateway,
+}
+
+
+def get_gateway(name=None):
+    name = name or settings.PAYMENT_GATEWAY
+    if name not in GATEWAYS:
+        raise ValueError(f'Unknown PAYMENT_GATEWAY: {name}')
+    return GATEWAYS[name]()
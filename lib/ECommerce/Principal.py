@@ -0,0 +1,133 @@
+"""
+ShopPy - Cached Principal
+Replaces Django's AuthenticationMiddleware so authenticated requests don't
+load the User (and Customer) rows on every request.
+
+After the first full lookup the principal - user id, username, email, role,
+flags and customer id - is kept in the session. Later requests rebuild
+request.user from it as a User instance with the remaining fields deferred
+(they load on first access, and save() still works). The copy is trusted
+while:
+
+- its version matches the user's version in the default cache. Saving or
+  deleting a User or its Customer profile bumps that version (signals below),
+  so updates, deactivation and deletion take effect on the next request.
+- it is younger than PRINCIPAL_CACHE_TTL seconds.
+
+A bump in a per-process cache is only seen by the worker that made it, so a
+deactivated user would stay logged in everywhere else; Config therefore sets
+PRINCIPAL_CACHE_TTL to 0 unless CACHE_BACKEND is shared, and with 0 no
+principal is kept at all.
+
+Otherwise the user goes through django.contrib.auth.get_user() again, with
+the usual session hash and is_active checks.
+"""
+
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject
+
+from lib.ECommerce.Models.User import User
+from lib.ECommerce.Models.Customer import Customer
+
+
+PRINCIPAL_SESSION_KEY = '_principal'
+VERSION_KEY_PREFIX = 'principal-version'
+PRINCIPAL_FIELDS = ('id', 'username', 'email', 'role', 'is_active', 'is_staff', 'is_superuser')
+
+
+def version_key(user_id):
+    return f'{VERSION_KEY_PREFIX}:{user_id}'
+
+
+def bump_version(user_id):
+    """Invalidate every cached principal of this user."""
+    cache.set(version_key(user_id), uuid.uuid4().hex, timeout=None)
+
+
+def current_version(user_id):
+    """Current version token, or None if never bumped (or evicted)."""
+    return cache.get(version_key(user_id))
+
+
+# =============================================================================
+# PRINCIPAL
+# =============================================================================
+
+def build_principal(user):
+    """Session-storable principal for an authenticated user."""
+    customer = Customer.get_customer_by_user_id(user.id) if user.role == 'customer' else None
+    return {
+        'fields': [getattr(user, field) for field in PRINCIPAL_FIELDS],
+        'customer_id': customer.id if customer else None,
+        'version': current_version(user.id),
+        'expires': time.time() + settings.PRINCIPAL_CACHE_TTL,
+    }
+
+
+def user_from_principal(principal):
+    """User instance with the principal's fields loaded and the rest deferred."""
+    # from_db() takes the loaded values in model field order
+    values = dict(zip(PRINCIPAL_FIELDS, principal['fields']))
+    field_names = [f.attname for f in User._meta.concrete_fields if f.attname in values]
+    user = User.from_db('default', field_names, [values[name] for name in field_names])
+    user.principal_customer_id = principal['customer_id']
+    return user
+
+
+def get_principal(request):
+    """request.user, from the session's principal when it is still valid."""
+    session = request.session
+    if settings.PRINCIPAL_CACHE_TTL <= 0:
+        if PRINCIPAL_SESSION_KEY in session:
+            del session[PRINCIPAL_SESSION_KEY]
+        return auth.get_user(request)
+
+    principal = session.get(PRINCIPAL_SESSION_KEY)
+    user_id = session.get(auth.SESSION_KEY)
+
+    if (principal and user_id is not None
+            and str(principal['fields'][0]) == str(user_id)
+            and principal['expires'] > time.time()
+            and principal['version'] == current_version(user_id)):
+        return user_from_principal(principal)
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        principal = build_principal(user)
+        session[PRINCIPAL_SESSION_KEY] = principal
+        user.principal_customer_id = principal['customer_id']
+    elif PRINCIPAL_SESSION_KEY in session:
+        del session[PRINCIPAL_SESSION_KEY]
+    return user
+
+
+class PrincipalMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware whose lazy request.user comes from the cached principal."""
+
+    def process_request(self, request):
+        request.user = SimpleLazyObject(lambda: get_principal(request))
+
+
+# =============================================================================
+# INVALIDATION (connected by importing this module, see apps.py)
+# =============================================================================
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    bump_version(instance.pk)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def customer_changed(sender, instance, **kwargs):
+    if instance.user_id:
+        bump_version(instance.user_id)
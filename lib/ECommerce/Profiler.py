@@ -0,0 +1,198 @@
+"""
+ShopPy - Request Profiler
+Opt-in profiling of a single request, triggered by an admin or staff user.
+
+Add ?_profile=1 to any URL (or send an `X-Profile: 1` header) while logged in
+as admin/staff. That request runs under cProfile with every SQL statement
+captured together with the application frames that issued it. The result is
+stored as a pstats file plus a JSON SQL report, downloadable from
+/profiles/<id>/pstats/ and /profiles/<id>/sql/ (see the X-Profile-Url header).
+Requests without the flag only pay for one dictionary lookup.
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import re
+import secrets
+import threading
+import time
+import traceback
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+from lib.ECommerce.AsyncSupport import HybridMiddleware
+from django.urls import reverse
+from django.utils import timezone
+
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+PROFILE_FILES = {
+    'pstats': '.prof',
+    'sql': '.json',
+}
+
+# Only one profiled request per process at a time: cProfile is per-thread, but
+# keeping it exclusive stops a burst of profiled requests from piling up CPU.
+_profile_lock = threading.Lock()
+
+
+def get_profile_dir():
+    """Directory where profiles are stored."""
+    return Path(settings.PROFILER_DIR)
+
+
+def get_profile_path(profile_id, kind):
+    """Path of a stored profile file, or None if the id/kind is invalid."""
+    if not PROFILE_ID_PATTERN.match(profile_id or '') or kind not in PROFILE_FILES:
+        return None
+    return get_profile_dir() / f'{profile_id}{PROFILE_FILES[kind]}'
+
+
+def app_frames(skip=(__file__,)):
+    """
+    Call stack as 'path:line in function' strings, innermost last, keeping
+    only project frames (no Django/site-packages internals).
+    """
+    project_root = str(Path(settings.BASE_DIR).resolve())
+    frames = []
+    for frame in traceback.extract_stack()[:-1]:
+        filename = frame.filename
+        if not filename.startswith(project_root) or 'site-packages' in filename or filename in skip:
+            continue
+        frames.append(f'{Path(filename).relative_to(project_root)}:{frame.lineno} in {frame.name}')
+    return frames
+
+
+def is_profiler_user(user):
+    """Same rule as admin_required: admin or staff role."""
+    return user.is_authenticated and user.role in ['admin', 'staff']
+
+
+class SqlCapture:
+    """
+    connection.execute_wrapper hook that records each statement, its timing
+    and the application frames (not Django internals) that issued it.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': self.alias,
+                'sql': sql,
+                'params': repr(params)[:500],
+                'many': many,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+                'stack': app_frames(),
+            })
+
+
+def is_profile_requested(request):
+    return settings.PROFILER_ENABLED and bool(request.GET.get(PROFILE_PARAM) or request.META.get(PROFILE_HEADER))
+
+
+class ProfilerMiddleware(HybridMiddleware):
+    """Runs a request under cProfile when an admin/staff user asks for it."""
+
+    async def acall(self, request):
+        response = await self.get_response(request)
+        if is_profile_requested(request):
+            # cProfile is per thread; an async request hops between threads
+            response['X-Profile-Skipped'] = 'profiling is only available on the WSGI server'
+        return response
+
+    def call(self, request):
+        if not is_profile_requested(request) or not is_profiler_user(request.user):
+            return self.get_response(request)
+
+        if not _profile_lock.acquire(blocking=False):
+            response = self.get_response(request)
+            response['X-Profile-Skipped'] = 'another profile is in progress'
+            return response
+        try:
+            return self.profile(request)
+        finally:
+            _profile_lock.release()
+
+    def profile(self, request):
+        captures = [SqlCapture(alias) for alias in connections]
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+
+        with ExitStack() as stack:
+            for capture in captures:
+                stack.enter_context(connections[capture.alias].execute_wrapper(capture))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        queries = [query for capture in captures for query in capture.queries]
+        profile_id = self.save(request, response, profiler, queries, elapsed_ms)
+
+        response['X-Profile-Id'] = profile_id
+        response['X-Profile-Url'] = reverse('profile_download', args=[profile_id, 'pstats'])
+        return response
+
+    def save(self, request, response, profiler, queries, elapsed_ms):
+        """Write <id>.prof (pstats) and <id>.json (SQL report), then prune old profiles."""
+        profile_dir = get_profile_dir()
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        profile_id = f"{timezone.now().strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(4)}"
+
+        profiler.dump_stats(str(profile_dir / f'{profile_id}.prof'))
+
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(30)
+
+        by_statement = {}
+        for query in queries:
+            entry = by_statement.setdefault(query['sql'], {'sql': query['sql'], 'count': 0, 'total_ms': 0.0})
+            entry['count'] += 1
+            entry['total_ms'] = round(entry['total_ms'] + query['duration_ms'], 3)
+
+        report = {
+            'id': profile_id,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'user': request.user.username,
+            'status_code': response.status_code,
+            'elapsed_ms': round(elapsed_ms, 3),
+            'query_count': len(queries),
+            'query_time_ms': round(sum(q['duration_ms'] for q in queries), 3),
+            'queries': queries,
+            'repeated_statements': sorted(
+                (s for s in by_statement.values() if s['count'] > 1),
+                key=lambda s: s['total_ms'], reverse=True,
+            ),
+            'top_functions': summary.getvalue(),
+        }
+        with open(profile_dir / f'{profile_id}.json', 'w') as fh:
+            json.dump(report, fh, indent=2)
+
+        self.prune(profile_dir)
+        return profile_id
+
+    def prune(self, profile_dir):
+        """Keep only the newest PROFILER_MAX_PROFILES profiles."""
+        reports = sorted(profile_dir.glob('*.json'))
+        excess = len(reports) - settings.PROFILER_MAX_PROFILES
+        for old in reports[:max(excess, 0)]:
+            for suffix in PROFILE_FILES.values():
+                old.with_suffix(suffix).unlink(missing_ok=True)
@@ -0,0 +1,170 @@
+"""
+ShopPy - Purge
+Deletes customers and orders with their history in short chunks.
+
+A cascade delete loads every related row and deletes them all in one
+transaction, holding SQLite's write lock (and the memory) for as long as
+the history is big. Purger deletes child rows first, PURGE_CHUNK_SIZE at
+a time, each chunk one DELETE (or UPDATE) by primary key in its own
+transaction, so checkout and other writers get the lock between chunks:
+
+1. idempotency keys of the customer
+2. per order table pair (live, then archived): items, timeline, the
+   order's inventory ledger references, then the orders themselves
+3. the customer and its user, which have nothing left to cascade to
+
+Inventory ledger rows are stock history, so they are kept; sale and
+cancellation rows of a purged order only lose their reference_id.
+Every step deletes "whatever is left", so a purge that stops halfway
+simply continues when run again.
+
+delete_customer() purges a customer in the request when the history has
+at most PURGE_INLINE_MAX_ORDERS orders; otherwise it deactivates the
+login and queues a PurgeJob for `manage.py purge_jobs`, which records
+progress on the job after every chunk.
+"""
+
+import time
+
+from django.conf import settings
+
+from lib.ECommerce.Database import immediate_transaction
+from lib.ECommerce.Models.Archive import ArchivedOrder, ArchivedOrderItem, ArchivedOrderTimeline
+from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Order import IdempotencyKey, InventoryTransaction, Order, OrderItem, OrderTimeline
+from lib.ECommerce.Models.Purge import PurgeJob
+from lib.ECommerce.Models.User import User
+
+
+ORDER_TABLES = [
+    (Order, OrderItem, OrderTimeline),
+    (ArchivedOrder, ArchivedOrderItem, ArchivedOrderTimeline),
+]
+
+# Ledger rows whose reference_id is an order id
+ORDER_LEDGER_TYPES = ['sale', 'cancellation']
+
+
+class Purger:
+    """Chunked deletes; progress(table, rows) is called after every chunk."""
+
+    def __init__(self, chunk_size=None, pause_ms=0, progress=None):
+        self.chunk_size = chunk_size or settings.PURGE_CHUNK_SIZE
+        self.pause = pause_ms / 1000
+        self.progress = progress or (lambda table, rows: None)
+
+    def customer(self, customer_id):
+        """Delete a customer, its user and its whole order history."""
+        self.delete(IdempotencyKey.objects.filter(customer_id=customer_id))
+        for tables in ORDER_TABLES:
+            self.orders(tables, tables[0].objects.filter(customer_id=customer_id))
+
+        with immediate_transaction():
+            customer = Customer.objects.filter(id=customer_id).first()
+            if customer is None:
+                return
+            user_id = customer.user_id
+            customer.delete()
+            if user_id:
+                User.objects.filter(id=user_id).delete()
+        self.progress(Customer._meta.db_table, 1)
+
+    def order(self, order_id):
+        """Delete one order (live or archived) with its items and timeline."""
+        for tables in ORDER_TABLES:
+            self.orders(tables, tables[0].objects.filter(id=order_id))
+
+    def orders(self, tables, orders):
+        """Delete the `orders` queryset of one table pair, children first."""
+        order_model, item_model, timeline_model = tables
+        order_ids = orders.values('id')
+        self.delete(item_model.objects.filter(order__in=order_ids))
+        self.delete(timeline_model.objects.filter(order__in=order_ids))
+        self.unlink(InventoryTransaction.objects.filter(
+            transaction_type__in=ORDER_LEDGER_TYPES, reference_id__in=order_ids
+        ), 'reference_id')
+        self.delete(orders)
+
+    def delete(self, queryset):
+        """Delete the queryset's rows a chunk at a time."""
+        model = queryset.model
+        while True:
+            with immediate_transaction():
+                ids = list(queryset.values_list('pk', flat=True)[:self.chunk_size])
+                if not ids:
+                    return
+                deleted = model.objects.filter(pk__in=ids).delete()[1].get(model._meta.label, 0)
+            self.progress(model._meta.db_table, deleted)
+            self.rest()
+
+    def unlink(self, queryset, field):
+        """Set `field` to NULL on the queryset's rows a chunk at a time."""
+        model = queryset.model
+        while True:
+            with immediate_transaction():
+                ids = list(queryset.values_list('pk', flat=True)[:self.chunk_size])
+                if not ids:
+                    return
+                updated = model.objects.filter(pk__in=ids).update(**{field: None})
+            self.progress(f'{model._meta.db_table}.{field}', updated)
+            self.rest()
+
+    def rest(self):
+        # Let waiting writers take the lock before the next chunk
+        if self.pause:
+            time.sleep(self.pause)
+
+
+def history_size(customer_id):
+    """Live plus archived orders of a customer."""
+    return (Order.objects.filter(customer_id=customer_id).count()
+            + ArchivedOrder.objects.filter(customer_id=customer_id).count())
+
+
+def deactivate_user(user_id):
+    """Disable a login through save(), so cached principals are dropped too."""
+    user = User.objects.filter(id=user_id).first() if user_id else None
+    if user is not None and user.is_active:
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+
+
+def delete_customer(customer, requested_by=None):
+    """
+    Delete a customer now, or queue the purge when the history is large.
+    Returns {'success', 'message', 'queued'} plus 'job_id' when queued.
+    """
+    orders = history_size(customer.id)
+    if orders <= settings.PURGE_INLINE_MAX_ORDERS:
+        Purger().customer(customer.id)
+        return {'success': True, 'message': 'Customer deleted successfully!', 'queued': False}
+
+    # The login goes now; the rows follow in the background
+    deactivate_user(customer.user_id)
+    name = f"{customer.first_name} {customer.last_name}".strip()
+    job = PurgeJob.enqueue('customer', customer.id, label=name, user=requested_by)
+    return {
+        'success': True,
+        'message': f'Deleting {name} and {orders} orders in the background (purge job {job.id}).',
+        'queued': True,
+        'job_id': job.id,
+    }
+
+
+def run_job(job, chunk_size=None, pause_ms=None):
+    """Carry out a claimed PurgeJob, recording progress; returns the job."""
+    purger = Purger(
+        chunk_size=chunk_size,
+        pause_ms=settings.PURGE_CHUNK_PAUSE_MS if pause_ms is None else pause_ms,
+        progress=job.record,
+    )
+    try:
+        if job.target == 'customer':
+            purger.customer(job.target_id)
+        else:
+            purger.order(job.target_id)
+    except Exception as e:
+        job.finish(error=f'{type(e).__name__}: {e}')
+    else:
+        job.finish()
+    return job
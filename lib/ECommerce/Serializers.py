@@ -0,0 +1,192 @@
+"""
+ShopPy - JSON Serializers
+Lean payloads for the JSON endpoints.
+
+A Projection maps each output key of an endpoint to a column or a database
+expression, plus an optional converter. serialize() selects just the
+columns the requested keys need with .values(), so no model instances are
+built and unneeded columns (cost, timestamps, full descriptions) never leave
+the database. The plan for each set of keys is compiled once and reused.
+
+Clients may ask for a subset of keys with ?fields=id,name,price_cents
+(sparse fieldsets); requested_fields() validates the parameter.
+"""
+
+from functools import lru_cache
+
+from django.db.models.functions import Substr
+
+from lib.ECommerce.Money import cents_to_float
+
+
+class InvalidFields(ValueError):
+    """?fields= named keys the endpoint doesn't have."""
+
+
+class Field:
+    """One output key: a column (`source`) or a database `expression`, optionally converted."""
+
+    __slots__ = ('source', 'expression', 'convert')
+
+    def __init__(self, source=None, expression=None, convert=None):
+        self.source = source
+        self.expression = expression
+        self.convert = convert
+
+
+def truncated(field_name, length):
+    """
+    Field for `field_name` cut to `length` characters plus '...'. The database
+    returns at most length + 1 characters, enough to tell whether it was cut.
+    """
+    def convert(text):
+        if text is None or len(text) <= length:
+            return text
+        return text[:length] + '...'
+    return Field(expression=Substr(field_name, 1, length + 1), convert=convert)
+
+
+class Projection:
+    """Output keys of one endpoint and where each comes from."""
+
+    def __init__(self, **fields):
+        self.fields = {}
+        for key, spec in fields.items():
+            if not isinstance(spec, Field):
+                spec = Field(source=spec)
+            if spec.source is None and spec.expression is None:
+                spec.source = key
+            self.fields[key] = spec
+        self.keys = tuple(self.fields)
+        self.plan = lru_cache(maxsize=32)(self._compile)
+
+    def _compile(self, keys):
+        """(columns, annotations, [(key, column, convert)]) for a tuple of keys."""
+        columns, annotations, steps = [], {}, []
+        for key in keys:
+            spec = self.fields[key]
+            if spec.expression is not None:
+                column = f'_{key}'
+                annotations[column] = spec.expression
+            else:
+                column = spec.source
+            if column not in columns:
+                columns.append(column)
+            steps.append((key, column, spec.convert))
+        return columns, annotations, steps
+
+    def rows(self, queryset, keys=None):
+        """values() queryset for `keys` (default: all); slice it, then pass it to build()."""
+        columns, annotations, _ = self.plan(tuple(keys or self.keys))
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        return queryset.values(*columns)
+
+    def build(self, rows, keys=None):
+        """Payload dicts from rows()."""
+        _, _, steps = self.plan(tuple(keys or self.keys))
+        return [
+            {key: row[column] if convert is None else convert(row[column]) for key, column, convert in steps}
+            for row in rows
+        ]
+
+    def serialize(self, queryset, keys=None):
+        return self.build(self.rows(queryset, keys), keys)
+
+
+def requested_fields(request, projection):
+    """Keys asked for with ?fields=a,b (all keys without it); raises InvalidFields."""
+    raw = request.GET.get('fields', '')
+    if not raw:
+        return projection.keys
+    keys = [key.strip() for key in raw.split(',') if key.strip()]
+    unknown = [key for key in keys if key not in projection.fields]
+    if unknown or not keys:
+        raise InvalidFields(f"Unknown field(s): {', '.join(unknown) or raw}")
+    # Stable order so equal requests share a compiled plan
+    return tuple(key for key in projection.keys if key in keys)
+
+
+# =============================================================================
+# ENDPOINT PROJECTIONS
+# =============================================================================
+
+# /api/products/
+PRODUCT_API = Projection(
+    id='id',
+    name='name',
+    description='description',
+    sku='sku',
+    category='category',
+    price_cents='price_cents',
+    price=Field('price_cents', convert=cents_to_float),
+    stock_quantity='stock_quantity',
+    reorder_level='reorder_level',
+    image_url='image_url',
+)
+
+# /products/?ajax=1 (customer infinite scroll cards)
+PRODUCT_CARD = Projection(
+    id='id',
+    name='name',
+    description=truncated('description', 100),
+    category='category',
+    price_cents='price_cents',
+    price=Field('price_cents', convert=cents_to_float),
+    stock='stock_quantity',
+    image_url=Field('image_url', convert=lambda url: url or ''),
+)
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+# /api/orders/changes/ (changefeed channels, see Changefeed.py)
+ORDER_FEED = Projection(
+    id='id',
+    order_number='order_number',
+    customer_id='customer_id',
+    status='status',
+    payment_status='payment_status',
+    payment_method='payment_method',
+    subtotal_cents='subtotal_cents',
+    tax_cents='tax_cents',
+    shipping_cents='shipping_cents',
+    total_cents='total_cents',
+    shipping_address='shipping_address',
+    billing_address='billing_address',
+    notes='notes',
+    created_at=Field('created_at', convert=isoformat),
+    updated_at=Field('updated_at', convert=isoformat),
+)
+
+ORDER_ITEM_FEED = Projection(
+    id='id',
+    order_id='order_id',
+    product_id='product_id',
+    product_name='product_name',
+    product_sku='product_sku',
+    quantity='quantity',
+    unit_price_cents='unit_price_cents',
+    subtotal_cents='subtotal_cents',
+)
+
+TIMELINE_FEED = Projection(
+    id='id',
+    order_id='order_id',
+    status='status',
+    description='description',
+    user_id='user_id',
+    created_at=Field('created_at', convert=isoformat),
+)
+
+INVENTORY_FEED = Projection(
+    id='id',
+    product_id='product_id',
+    quantity_change='quantity_change',
+    transaction_type='transaction_type',
+    reference_id='reference_id',
+    notes='notes',
+    created_at=Field('created_at', convert=isoformat),
+)
@@ -0,0 +1,24 @@
+"""
+ShopPy - Session Engine
+Database-backed sessions with tracing spans around load and save.
+
+Selected with SESSION_ENGINE = 'lib.ECommerce.Sessions'. Behaves exactly like
+django.contrib.sessions.backends.db; the spans show how much of a sampled
+request goes into reading and writing the session row (the cart lives there).
+"""
+
+from django.contrib.sessions.backends.db import SessionStore as DatabaseSessionStore
+
+from lib.ECommerce.Tracing import span
+
+
+class SessionStore(DatabaseSessionStore):
+    """Database session store that reports load/save as trace spans."""
+
+    def load(self):
+        with span('session.load'):
+            return super().load()
+
+    def save(self, must_create=False):
+        with span('session.save', must_create=must_create):
+            return super().save(must_create=must_create)
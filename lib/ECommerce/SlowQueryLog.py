@@ -0,0 +1,175 @@
+"""
+ShopPy - Slow Query Log
+Records SQL statements slower than SLOW_QUERY_THRESHOLD_MS.
+
+SlowQueryMiddleware installs a recorder on every database connection through
+connection.execute_wrapper for the duration of each request. A slow statement
+is appended as one JSON line to SLOW_QUERY_LOG with its normalized
+fingerprint and the view and source line that issued it. `manage.py
+slow_queries` aggregates the log by fingerprint, ranks the worst offenders
+and, with --explain (or SLOW_QUERY_EXPLAIN), runs EXPLAIN on the slowest
+statement of each. Nothing extra runs inside the slow request itself, and
+no parameter values are logged: the plan is made with NULLs bound instead.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from lib.ECommerce.AsyncSupport import HybridMiddleware
+from lib.ECommerce.Profiler import app_frames
+
+
+logger = logging.getLogger('shoppy.slow_queries')
+
+_write_lock = threading.Lock()
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'\bVALUES\s*(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\1)*', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """
+    Replace literals and placeholders with '?' and collapse IN/VALUES lists,
+    so statements that differ only in their values share one fingerprint.
+    """
+    normalized = _STRING_LITERAL.sub('?', sql)
+    normalized = _NUMBER.sub('?', normalized)
+    normalized = _PLACEHOLDER.sub('?', normalized)
+    normalized = _IN_LIST.sub('IN (...)', normalized)
+    normalized = _VALUES_LIST.sub(r'VALUES \1, ...', normalized)
+    return _WHITESPACE.sub(' ', normalized).strip()
+
+
+def fingerprint(sql):
+    """Short stable id of the normalized statement."""
+    return hashlib.md5(normalize_sql(sql).encode('utf-8')).hexdigest()[:12]
+
+
+def explain(entry):
+    """
+    EXPLAIN plan of a logged SELECT as a list of text lines, or None if it
+    isn't one. Run at report time, with NULL for every parameter.
+    """
+    sql = entry.get('sql') or ''
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    connection = connections[entry.get('alias') or 'default']
+    params = [None] * entry.get('param_count', 0)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return [' '.join(str(col) for col in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+
+
+def write_entry(entry):
+    """Append one JSON line to the slow query log."""
+    path = Path(settings.SLOW_QUERY_LOG)
+    line = json.dumps(entry, default=str)
+    with _write_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a') as fh:
+            fh.write(line + '\n')
+
+
+def read_entries(since=None, path=None):
+    """Yield entries from the slow query log, optionally only those after `since`."""
+    path = Path(path or settings.SLOW_QUERY_LOG)
+    if not path.exists():
+        return
+    cutoff = since.isoformat() if since else None
+    with open(path) as fh:
+        for line in fh:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if cutoff and entry.get('timestamp', '') < cutoff:
+                continue
+            yield entry
+
+
+class SlowQueryRecorder:
+    """execute_wrapper hook that logs statements over the threshold."""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.threshold_ms = settings.SLOW_QUERY_THRESHOLD_MS
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms >= self.threshold_ms:
+            try:
+                self.record(sql, params, many, context['connection'], elapsed_ms)
+            except Exception:
+                logger.exception('Failed to record slow query')
+        return result
+
+    def record(self, sql, params, many, connection, elapsed_ms):
+        frames = app_frames(skip=(__file__, app_frames.__code__.co_filename))
+        match = getattr(self.request, 'resolver_match', None)
+        entry = {
+            'timestamp': timezone.now().isoformat(),
+            'fingerprint': fingerprint(sql),
+            'normalized': normalize_sql(sql),
+            'duration_ms': round(elapsed_ms, 3),
+            'alias': connection.alias,
+            'view': match.view_name if match else None,
+            'path': self.request.path if self.request else None,
+            'call_site': frames[-1] if frames else None,
+            'stack': frames,
+            'sql': sql,
+            'param_count': 0 if many or params is None else len(params),
+        }
+        write_entry(entry)
+        logger.warning('Slow query %.1fms [%s] %s at %s',
+                       elapsed_ms, entry['fingerprint'], entry['view'], entry['call_site'])
+
+
+def install_recorder(stack, recorder):
+    """Attach the recorder to every connection of the current thread."""
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(recorder))
+
+
+class SlowQueryMiddleware(HybridMiddleware):
+    """Wraps every request's database access with a SlowQueryRecorder."""
+
+    def call(self, request):
+        if not settings.SLOW_QUERY_ENABLED:
+            return self.get_response(request)
+
+        with ExitStack() as stack:
+            install_recorder(stack, SlowQueryRecorder(request))
+            return self.get_response(request)
+
+    async def acall(self, request):
+        if not settings.SLOW_QUERY_ENABLED:
+            return await self.get_response(request)
+
+        # Async views reach the ORM through sync_to_async, which runs on this
+        # request's dedicated sync thread, so install the recorder there.
+        stack = ExitStack()
+        await sync_to_async(install_recorder)(stack, SlowQueryRecorder(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
@@ -0,0 +1,214 @@
+"""
+ShopPy - Request Tracing
+Lightweight timing spans for the checkout and cart paths.
+
+TracingMiddleware samples TRACE_SAMPLE_RATE of requests. For a sampled
+request every `with span('name'):` block inside it is timed, and the finished
+trace is appended to TRACE_EXPORT_PATH as one OTLP/JSON
+ExportTraceServiceRequest per line (the OpenTelemetry file exporter format).
+Outside a sampled request span() is a no-op costing one context lookup.
+`manage.py trace_report` prints per-phase latency and merges the file into a
+single OTLP JSON document.
+"""
+
+import json
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+from lib.ECommerce.AsyncSupport import HybridMiddleware
+
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_trace = ContextVar('shoppy_trace', default=None)
+_current_span = ContextVar('shoppy_span', default=None)
+_write_lock = threading.Lock()
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = ('name', 'span_id', 'parent_id', 'kind', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name, parent_id=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def finish(self):
+        self.end_ns = time.time_ns()
+
+    def to_otlp(self, trace_id):
+        data = {
+            'traceId': trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or self.start_ns),
+            'attributes': [otlp_attribute(k, v) for k, v in self.attributes.items()],
+            'status': {'code': STATUS_ERROR, 'message': self.error} if self.error else {'code': STATUS_OK},
+        }
+        if self.parent_id:
+            data['parentSpanId'] = self.parent_id
+        return data
+
+
+class Trace:
+    """All spans recorded for one sampled request."""
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+
+    def start_span(self, name, parent, kind=SPAN_KIND_INTERNAL, attributes=None):
+        span_obj = Span(name, parent.span_id if parent else None, kind, attributes)
+        self.spans.append(span_obj)
+        return span_obj
+
+    def to_otlp(self):
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [otlp_attribute('service.name', settings.TRACE_SERVICE_NAME)]},
+                'scopeSpans': [{
+                    'scope': {'name': __name__},
+                    'spans': [s.to_otlp(self.trace_id) for s in self.spans],
+                }],
+            }],
+        }
+
+
+def otlp_attribute(key, value):
+    """Encode a key/value pair as an OTLP AnyValue attribute."""
+    if isinstance(value, bool):
+        encoded = {'boolValue': value}
+    elif isinstance(value, int):
+        encoded = {'intValue': str(value)}
+    elif isinstance(value, float):
+        encoded = {'doubleValue': value}
+    else:
+        encoded = {'stringValue': str(value)}
+    return {'key': key, 'value': encoded}
+
+
+def is_recording():
+    """True inside a sampled request."""
+    return _current_trace.get() is not None
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the enclosed block as a child of the current span (no-op when not sampled)."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    span_obj = trace.start_span(name, _current_span.get(), attributes=attributes)
+    token = _current_span.set(span_obj)
+    try:
+        yield span_obj
+    except Exception as e:
+        span_obj.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        span_obj.finish()
+        _current_span.reset(token)
+
+
+def set_attribute(key, value):
+    """Attach an attribute to the current span, if any."""
+    span_obj = _current_span.get()
+    if span_obj is not None:
+        span_obj.attributes[key] = value
+
+
+def export(trace):
+    """Append a finished trace to TRACE_EXPORT_PATH as one OTLP/JSON line."""
+    path = Path(settings.TRACE_EXPORT_PATH)
+    line = json.dumps(trace.to_otlp(), separators=(',', ':'))
+    with _write_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a') as fh:
+            fh.write(line + '\n')
+
+
+def read_traces(path=None):
+    """Yield OTLP/JSON documents from the trace export file."""
+    path = Path(path or settings.TRACE_EXPORT_PATH)
+    if not path.exists():
+        return
+    with open(path) as fh:
+        for line in fh:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class TracingMiddleware(HybridMiddleware):
+    """Samples requests and records a root server span around each sampled one."""
+
+    def sampled(self):
+        return settings.TRACING_ENABLED and random.random() < settings.TRACE_SAMPLE_RATE
+
+    def start(self, request):
+        trace = Trace()
+        root = trace.start_span(f'{request.method} {request.path}', None, SPAN_KIND_SERVER, {
+            'http.method': request.method,
+            'http.target': request.path,
+        })
+        return trace, root, (_current_trace.set(trace), _current_span.set(root))
+
+    def finish(self, request, response, trace, root, tokens):
+        if response is not None:
+            root.attributes['http.status_code'] = response.status_code
+            if response.status_code >= 500:
+                root.error = f'HTTP {response.status_code}'
+        match = getattr(request, 'resolver_match', None)
+        if match:
+            root.attributes['http.route'] = match.route
+            root.name = f'{request.method} {match.view_name}'
+        root.finish()
+        _current_span.reset(tokens[1])
+        _current_trace.reset(tokens[0])
+        export(trace)
+
+    def call(self, request):
+        if not self.sampled():
+            return self.get_response(request)
+
+        trace, root, tokens = self.start(request)
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            self.finish(request, response, trace, root, tokens)
+
+    async def acall(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        trace, root, tokens = self.start(request)
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            self.finish(request, response, trace, root, tokens)
@@ -0,0 +1,163 @@
+"""
+ShopPy - Workload Isolation
+Keeps long reports and exports from starving checkout.
+
+Views declare a workload class with @workload('checkout') or
+@workload('analytics'); everything else is 'default'. Per worker process:
+
+- checkout  requests (checkout and cart APIs) are always admitted.
+- default   requests share WEB_THREADS - WORKLOAD_CHECKOUT_RESERVED slots,
+            so that many threads (and their DB connections) are always
+            left for checkout. Async views (asgi.py) hold no thread while
+            they wait, so they skip this pool.
+- analytics requests also need one of WORKLOAD_ANALYTICS_CONCURRENCY slots,
+            read from the 'analytics' alias whose statements are cut off after
+            ANALYTICS_STATEMENT_TIMEOUT_MS.
+
+A request that can't get a slot within its wait budget, or whose analytics
+query hits the statement timeout, gets a 503 with a clear message instead of
+holding a worker thread.
+"""
+
+import logging
+import threading
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db.utils import OperationalError
+from django.http import JsonResponse
+from django.shortcuts import render
+
+from lib.ECommerce.AsyncSupport import HybridMiddleware
+from lib.ECommerce.DatabaseRouter import use_replica
+
+
+logger = logging.getLogger('shoppy.workloads')
+
+CHECKOUT = 'checkout'
+ANALYTICS = 'analytics'
+DEFAULT = 'default'
+
+# SQLite's interrupt message / PostgreSQL's statement_timeout message
+TIMEOUT_MARKERS = ('interrupted', 'canceling statement due to statement timeout')
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def workload(name):
+    """Tag a view with its workload class (read by WorkloadMiddleware)."""
+    def decorator(view_func):
+        # functools.wraps in the outer decorators copies this attribute up
+        view_func.workload_class = name
+        return view_func
+    return decorator
+
+
+def get_semaphore(name):
+    """Per-process semaphore for the 'default' or 'analytics' pool."""
+    with _semaphores_lock:
+        if name not in _semaphores:
+            if name == ANALYTICS:
+                size = settings.WORKLOAD_ANALYTICS_CONCURRENCY
+            else:
+                size = settings.WEB_THREADS - settings.WORKLOAD_CHECKOUT_RESERVED
+            _semaphores[name] = threading.BoundedSemaphore(max(size, 1))
+        return _semaphores[name]
+
+
+def is_statement_timeout(exception):
+    """True if a database error means the statement timeout fired."""
+    return isinstance(exception, OperationalError) and any(
+        marker in str(exception).lower() for marker in TIMEOUT_MARKERS
+    )
+
+
+def busy_response(request, message, retry_after):
+    """503 as JSON for API/AJAX callers, as a page otherwise."""
+    wants_json = (request.path.startswith('/api/')
+                  or request.headers.get('X-Requested-With') == 'XMLHttpRequest')
+    if wants_json:
+        response = JsonResponse({'success': False, 'message': message}, status=503)
+    else:
+        response = render(request, 'busy.html', {
+            'message': message,
+            'back_url': request.META.get('HTTP_REFERER') or '/dashboard/',
+        }, status=503)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def admit(request, workload_class):
+    """
+    Take the slots a `workload_class` request needs that it doesn't hold yet.
+    Returns None once admitted, else the 503 to send. WorkloadMiddleware
+    calls this with the view's class; a view that only knows its class after
+    looking at the request (the role-based dashboard) calls it again itself.
+    """
+    request.workload_class = workload_class
+    if not settings.WORKLOAD_ISOLATION or workload_class == CHECKOUT:
+        return None
+
+    wait = settings.WORKLOAD_QUEUE_TIMEOUT_MS / 1000
+    general = get_semaphore(DEFAULT)
+    if general not in request.workload_slots:
+        if not general.acquire(timeout=wait):
+            logger.warning('Shed %s request to %s: no free worker slot', workload_class, request.path)
+            return busy_response(request, 'The store is very busy right now. Please try again in a moment.', 2)
+        request.workload_slots.append(general)
+
+    if workload_class == ANALYTICS:
+        analytics = get_semaphore(ANALYTICS)
+        if analytics not in request.workload_slots:
+            if not analytics.acquire(timeout=wait):
+                logger.warning('Shed analytics request to %s: report capacity in use', request.path)
+                return busy_response(
+                    request,
+                    'Other reports are being generated right now. Please try again in a few seconds.',
+                    5,
+                )
+            request.workload_slots.append(analytics)
+        use_replica()
+    return None
+
+
+class WorkloadMiddleware(HybridMiddleware):
+    """Admits each request according to its view's workload class."""
+
+    def release(self, request):
+        for semaphore in request.workload_slots:
+            semaphore.release()
+
+    def call(self, request):
+        request.workload_slots = []
+        try:
+            return self.get_response(request)
+        finally:
+            self.release(request)
+
+    async def acall(self, request):
+        request.workload_slots = []
+        try:
+            return await self.get_response(request)
+        finally:
+            self.release(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        workload_class = getattr(view_func, 'workload_class', DEFAULT)
+        if workload_class == DEFAULT and iscoroutinefunction(view_func):
+            request.workload_class = workload_class
+            return None
+        return admit(request, workload_class)
+
+    def process_exception(self, request, exception):
+        # Only the analytics alias has a statement timeout
+        if not is_statement_timeout(exception):
+            return None
+        logger.warning('Analytics statement timeout on %s', request.path)
+        return busy_response(
+            request,
+            f'This report took longer than {settings.ANALYTICS_STATEMENT_TIMEOUT_MS / 1000:g} seconds '
+            'and was stopped. Please choose a shorter date range.',
+            30,
+        )
@@ -13,4 +13,5 @@ class ECommerceConfig(AppConfig):
 
     def ready(self):
         """Initialize the app when Django starts."""
-        pass
+        # Principal cache invalidation signals
+        from lib.ECommerce import Principal  # noqa: F401
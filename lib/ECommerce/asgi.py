@@ -0,0 +1,12 @@
+"""
+ShopPy - ASGI Configuration
+Serves the async JSON endpoints (see Procfile.asgi).
+"""
+
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lib.ECommerce.Config')
+os.environ.setdefault('ASYNC_API', 'True')
+
+application = get_asgi_application()
@@ -0,0 +1,3 @@
+"""
+ShopPy - Database Backends
+"""
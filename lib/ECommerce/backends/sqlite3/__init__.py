@@ -0,0 +1,3 @@
+"""
+ShopPy - Tuned SQLite Backend
+"""
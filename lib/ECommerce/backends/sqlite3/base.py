@@ -0,0 +1,93 @@
+"""
+ShopPy - Tuned SQLite Backend
+Django's sqlite3 backend with a production PRAGMA profile.
+
+Every new connection switches the database to WAL (readers no longer block
+on the writer), relaxes fsync to synchronous=NORMAL (safe under WAL) and sets
+a busy timeout, page cache, mmap window and in-memory temp store. OPTIONS:
+
+    'pragmas':           dict merged over DEFAULT_PRAGMAS
+    'transaction_mode':  'DEFERRED' (default), 'IMMEDIATE' or 'EXCLUSIVE'
+    'statement_timeout': ms; a statement running longer is interrupted with
+                         OperationalError('interrupted') (0 = no limit)
+
+Write paths that read before they write (checkout) should use
+Database.immediate_transaction(), which opens the outermost atomic block with
+BEGIN IMMEDIATE so the write lock is taken up front. Otherwise two deferred
+transactions can both read and then deadlock upgrading to a write lock,
+which SQLite reports as an immediate `database is locked`.
+"""
+
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+# SQLite VM instructions between statement timeout checks
+PROGRESS_HANDLER_STEPS = 10000
+
+# Applied in order: busy_timeout first so the journal_mode switch can wait
+# for a lock instead of failing.
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,        # ms
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,        # negative = KiB, i.e. 64 MiB per connection
+    'mmap_size': 268435456,      # 256 MiB
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """sqlite3 DatabaseWrapper that applies PRAGMAs and a configurable BEGIN mode."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        self.transaction_mode = (options.get('transaction_mode') or 'DEFERRED').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode must be one of {', '.join(TRANSACTION_MODES)}"
+            )
+        # One-shot override for the next outermost transaction
+        # (set by Database.immediate_transaction)
+        self.next_transaction_mode = None
+
+        self.statement_timeout = int(options.get('statement_timeout') or 0) / 1000
+        self.statement_started = None
+        if self.statement_timeout:
+            self.execute_wrappers.append(self._start_statement_clock)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        params.pop('statement_timeout', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        if self.statement_timeout:
+            conn.set_progress_handler(self._check_statement_timeout, PROGRESS_HANDLER_STEPS)
+        return conn
+
+    def _start_statement_clock(self, execute, sql, params, many, context):
+        # The clock keeps running while rows are fetched after execute() returns
+        self.statement_started = time.monotonic()
+        return execute(sql, params, many, context)
+
+    def _check_statement_timeout(self):
+        """Progress handler: a non-zero return makes SQLite abort the statement."""
+        started = self.statement_started
+        return int(started is not None and time.monotonic() - started > self.statement_timeout)
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.next_transaction_mode or self.transaction_mode
+        self.next_transaction_mode = None
+        self.cursor().execute(f'BEGIN {mode}')
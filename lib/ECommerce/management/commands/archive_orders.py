@@ -0,0 +1,65 @@
+"""
+Django management command to move finished orders to the archive tables
+Usage: python manage.py archive_orders [--older-than-days 365] [--batch-size 500] [--dry-run] [--interval 3600]
+
+Moves delivered, cancelled and refunded orders that haven't changed for
+--older-than-days (default ARCHIVE_AFTER_DAYS), with their items and
+timeline, into the archive tables, --batch-size orders per transaction so
+checkout never waits long for the write lock (see Models/Archive.py).
+Without --interval it archives what is due and exits; with it, it keeps
+running and checks again every N seconds.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from lib.ECommerce.Models.Archive import ArchivedOrder
+
+
+class Command(BaseCommand):
+    help = 'Move finished orders older than ARCHIVE_AFTER_DAYS to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=float, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='Archive orders unchanged for this many days')
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE,
+                            help='Orders moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would move')
+        parser.add_argument('--interval', type=float, default=0, help='Check every N seconds (0 = run once)')
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] < 0:
+            raise CommandError('--older-than-days must not be negative')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        while True:
+            cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+            if options['dry_run']:
+                due = ArchivedOrder.archivable(cutoff).count()
+                self.stdout.write(self.style.SUCCESS(
+                    f'✅ {due} order(s) would be archived (unchanged since {cutoff:%Y-%m-%d %H:%M})'
+                ))
+                return
+
+            started = time.perf_counter()
+            moved = [0, 0, 0]
+            while True:
+                batch = ArchivedOrder.archive_batch(cutoff, options['batch_size'])
+                if not batch[0]:
+                    break
+                moved = [total + count for total, count in zip(moved, batch)]
+
+            if moved[0] or not options['interval']:
+                elapsed = time.perf_counter() - started
+                rate = moved[0] / elapsed if elapsed else 0
+                self.stdout.write(self.style.SUCCESS(
+                    f'✅ Archived {moved[0]} order(s), {moved[1]} item(s), {moved[2]} timeline event(s) '
+                    f'in {elapsed:.2f}s ({rate:.0f} orders/s)'
+                ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
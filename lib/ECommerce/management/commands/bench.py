@@ -0,0 +1,243 @@
+"""
+Django management command to benchmark the main endpoints
+Usage: python manage.py bench --iterations 20 --output bench.json
+
+Runs each scenario in-process through the Django test client against the
+current database (seed it first with `manage.py seed_scale`). Results are
+emitted as JSON with stable keys so runs from different commits can be
+compared with --compare. `queries` counts statements on every database alias
+(analytics views read from 'analytics'), with the split in `queries_by_alias`.
+"""
+import json
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from lib.ECommerce.Models.User import User
+from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Product import Product
+from lib.ECommerce.Models.Order import Order, OrderItem, InventoryTransaction, OrderTimeline
+
+
+# name -> (role, method, path, query params)
+SCENARIOS = {
+    'admin_dashboard': ('admin', 'get', '/dashboard/', {}),
+    'admin_reports_month': ('admin', 'get', '/reports/', {'period': 'month'}),
+    'admin_reports_year': ('admin', 'get', '/reports/', {'period': 'year'}),
+    'admin_orders_list': ('admin', 'get', '/orders/', {}),
+    'admin_orders_search': ('admin', 'get', '/orders/', {'search': 'SEED-0000', 'status': 'delivered'}),
+    'admin_customers': ('admin', 'get', '/customers/', {}),
+    'customer_dashboard': ('customer', 'get', '/dashboard/', {}),
+    'customer_orders_list': ('customer', 'get', '/orders/', {}),
+    'product_search': ('customer', 'get', '/products/', {'search': 'Premium'}),
+    'product_scroll_ajax': ('customer', 'get', '/products/', {'page': 3, 'ajax': '1'}),
+    'api_products_search': ('customer', 'get', '/api/products/', {'search': 'Premium'}),
+    'checkout': ('customer', 'checkout', '/checkout/', {}),
+}
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def git_revision():
+    """Short commit hash of the working tree, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Time the dashboard, reports, orders list, product search and checkout; emit JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10, help='Timed runs per scenario')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed runs per scenario')
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                            help='Only run the given scenario (repeatable)')
+        parser.add_argument('--no-writes', action='store_true', help='Skip scenarios that create orders')
+        parser.add_argument('--output', help='Write JSON results to this file instead of stdout')
+        parser.add_argument('--compare', help='Previous JSON result to print p50 deltas against')
+
+    def handle(self, *args, **options):
+        names = options['scenario'] or list(SCENARIOS)
+        if options['no_writes']:
+            names = [name for name in names if SCENARIOS[name][1] != 'checkout']
+
+        clients = {
+            'admin': self.client_for(self.bench_admin()),
+            'customer': self.client_for(self.bench_customer().user),
+        }
+        self.checkout_product = (
+            Product.objects.filter(is_active=True).order_by('-stock_quantity').first()
+        )
+        if self.checkout_product is None:
+            raise CommandError('No active products found. Run `manage.py seed_scale` first.')
+
+        results = {}
+        for name in names:
+            role, method, path, params = SCENARIOS[name]
+            results[name] = self.run_scenario(
+                clients[role], method, path, params, options['iterations'], options['warmup']
+            )
+            self.stderr.write(
+                f"{name:<24} p50 {results[name]['p50_ms']:>9.2f} ms   "
+                f"p95 {results[name]['p95_ms']:>9.2f} ms   queries {results[name]['queries']}"
+            )
+
+        report = {
+            'revision': git_revision(),
+            'timestamp': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'debug': settings.DEBUG,
+            },
+            'dataset': {
+                'products': Product.objects.count(),
+                'customers': Customer.objects.count(),
+                'orders': Order.objects.count(),
+                'order_items': OrderItem.objects.count(),
+                'timeline_events': OrderTimeline.objects.count(),
+                'inventory_transactions': InventoryTransaction.objects.count(),
+            },
+            'iterations': options['iterations'],
+            'results': results,
+        }
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"✓ Results written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            self.print_comparison(options['compare'], results)
+
+    # -------------------------------------------------------------------------
+    # Fixtures
+    # -------------------------------------------------------------------------
+
+    def bench_admin(self):
+        """An admin user to drive admin scenarios (created without a usable password)."""
+        admin = User.objects.filter(role='admin', is_active=True).order_by('id').first()
+        if admin is None:
+            admin = User.objects.create_user('bench_admin', 'bench_admin@example.com', None, role='admin')
+        return admin
+
+    def bench_customer(self):
+        """The customer with a login and the longest order history (the worst case)."""
+        customer = (
+            Customer.objects.filter(user__isnull=False, user__is_active=True)
+            .annotate(order_count=Count('orders'))
+            .order_by('-order_count')
+            .select_related('user')
+            .first()
+        )
+        if customer is None:
+            raise CommandError('No customer with a login found. Run `manage.py seed_scale` first.')
+        return customer
+
+    def client_for(self, user):
+        hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+        client = Client(HTTP_HOST='localhost' if 'localhost' in hosts or not hosts else hosts[0])
+        client.force_login(user)
+        return client
+
+    # -------------------------------------------------------------------------
+    # Measurement
+    # -------------------------------------------------------------------------
+
+    def request(self, client, method, path, params):
+        secure = not settings.DEBUG
+        if method == 'get':
+            return client.get(path, params, secure=secure)
+
+        # Checkout: fill the cart (untimed by the caller), then place the order
+        client.post(
+            '/api/cart/add/',
+            json.dumps({'product_id': self.checkout_product.id, 'quantity': 1}),
+            content_type='application/json',
+            secure=secure,
+        )
+        started = time.perf_counter()
+        response = client.post(
+            path,
+            {'payment_method': 'credit_card', 'shipping_address': '1 Bench St'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+            secure=secure,
+        )
+        response.checkout_elapsed = time.perf_counter() - started
+        return response
+
+    def run_scenario(self, client, method, path, params, iterations, warmup):
+        for _ in range(warmup):
+            self.request(client, method, path, params)
+
+        timings = []
+        statuses = set()
+        size = 0
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = self.request(client, method, path, params)
+            elapsed = getattr(response, 'checkout_elapsed', time.perf_counter() - started)
+            timings.append(elapsed * 1000)
+            statuses.add(response.status_code)
+            size = len(response.content)
+
+        # Count queries on a separate run so capture overhead doesn't skew timings.
+        # Every alias: analytics views read from 'analytics'/'replica', not 'default'
+        with ExitStack() as stack:
+            captures = {
+                alias: stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections
+            }
+            self.request(client, method, path, params)
+        queries_by_alias = {alias: len(queries) for alias, queries in captures.items() if len(queries)}
+
+        return {
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'min_ms': round(min(timings), 3),
+            'max_ms': round(max(timings), 3),
+            'queries': sum(queries_by_alias.values()),
+            'queries_by_alias': queries_by_alias,
+            'bytes': size,
+            'status_codes': sorted(statuses),
+        }
+
+    def print_comparison(self, path, results):
+        with open(path) as fh:
+            previous = json.load(fh)
+        self.stderr.write('')
+        self.stderr.write(f"Compared with {previous.get('revision') or path}:")
+        for name, current in results.items():
+            before = previous.get('results', {}).get(name)
+            if not before:
+                continue
+            change = (current['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+            self.stderr.write(
+                f"  {name:<24} {before['p50_ms']:>9.2f} → {current['p50_ms']:>9.2f} ms ({change:+.1f}%)"
+                f"   queries {before['queries']} → {current['queries']}"
+            )
@@ -0,0 +1,53 @@
+"""
+Django management command to deliver outbox events to OUTBOX_SINK
+Usage: python manage.py dispatch_outbox [--interval 1] [--batch-size 200] [--sink file:data/events.jsonl]
+
+Sends pending order/inventory events in id order, a batch at a time, and
+deletes them once delivered (see lib/ECommerce/Outbox.py). Failed batches
+are retried with backoff. Without --interval it drains what is due and
+exits; with it, it keeps polling. Run one dispatcher per database.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lib.ECommerce.Models.Outbox import OutboxEvent
+from lib.ECommerce.Outbox import dispatch_once, get_sink
+
+
+class Command(BaseCommand):
+    help = 'Deliver pending outbox events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Poll every N seconds when idle (0 = drain once)')
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE, help='Events per delivery')
+        parser.add_argument('--sink', help='Override OUTBOX_SINK')
+
+    def handle(self, *args, **options):
+        try:
+            sink = get_sink(options['sink'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        while True:
+            started = time.perf_counter()
+            delivered = failed = 0
+            while True:
+                sent, errors = dispatch_once(sink, options['batch_size'])
+                delivered += sent
+                failed += errors
+                if not sent:
+                    break
+
+            if delivered or failed or not options['interval']:
+                elapsed = time.perf_counter() - started
+                rate = delivered / elapsed if elapsed else 0
+                dead = OutboxEvent.objects.filter(status='dead').count()
+                self.stdout.write(self.style.SUCCESS(
+                    f'✅ Delivered {delivered} event(s) in {elapsed:.2f}s ({rate:.0f}/s); '
+                    f'{failed} failed, {dead} dead'
+                ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
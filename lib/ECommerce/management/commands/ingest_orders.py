@@ -0,0 +1,86 @@
+"""
+Django management command to create orders from a JSONL file
+Usage: python manage.py ingest_orders orders.jsonl [--batch-size 500] [--results results.jsonl]
+
+One order per line, in the format of POST /api/orders/ingest/ (see
+lib/ECommerce/OrderIngest.py); `-` reads standard input. Lines go in
+batches of --batch-size, each batch created in one transaction. Per-line
+results (with the 1-based line number) go to --results; failures are
+always summarized on stdout, with the overall orders/second.
+"""
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lib.ECommerce.OrderIngest import ingest_batch
+
+
+class Command(BaseCommand):
+    help = 'Create orders in batches from a JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL file, one order per line (- for stdin)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders per transaction')
+        parser.add_argument('--results', help='Write one JSON result per line to this file')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        try:
+            source = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8')
+        except OSError as e:
+            raise CommandError(f"Can't read {options['path']}: {e}")
+        results_file = open(options['results'], 'w', encoding='utf-8') if options['results'] else None
+
+        totals = {'created': 0, 'failed': 0, 'replayed': 0}
+        started = time.perf_counter()
+        try:
+            batch = []
+            for line_number, line in enumerate(source, 1):
+                if line.strip():
+                    batch.append((line_number, line))
+                if len(batch) >= options['batch_size']:
+                    self.ingest(batch, totals, results_file)
+                    batch = []
+            if batch:
+                self.ingest(batch, totals, results_file)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if results_file:
+                results_file.close()
+
+        elapsed = time.perf_counter() - started
+        rate = totals['created'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Created {totals['created']} order(s) in {elapsed:.2f}s ({rate:.0f} orders/s); "
+            f"{totals['replayed']} replayed, {totals['failed']} failed"
+        ))
+
+    def ingest(self, batch, totals, results_file):
+        entries = []
+        for line_number, line in batch:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                entries.append(None)  # reported by ingest_batch as an invalid entry
+
+        report = ingest_batch(entries)
+        for key in totals:
+            totals[key] += report[key]
+        self.stdout.write(
+            f"  {len(batch)} line(s): {report['created']} created, {report['failed']} failed "
+            f"in {report['elapsed_ms']:.0f}ms ({report['orders_per_second']:.0f} orders/s)"
+        )
+
+        for (line_number, _), entry, result in zip(batch, entries, report['results']):
+            result = dict(result, line=line_number)
+            del result['index']
+            if entry is None:
+                result['message'] = 'Invalid JSON'
+            if not result['success']:
+                self.stderr.write(f"  line {line_number}: {result['message']}")
+            if results_file:
+                results_file.write(json.dumps(result) + '\n')
@@ -0,0 +1,84 @@
+"""
+Django management command to run queued customer/order purges
+Usage: python manage.py purge_jobs [--interval 1] [--chunk-size 500] [--customer ID ...] [--list]
+
+Works through pending PurgeJobs oldest first, deleting each target's
+history a chunk at a time (see lib/ECommerce/Purge.py) and saving the
+rows deleted per table on the job after every chunk. --customer queues
+customers for purging first (e.g. a batch of erasure requests); --list
+shows the unfinished and recent jobs and exits. Without --interval it
+drains the queue and exits; with it, it keeps polling. Run one worker.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Purge import PurgeJob
+from lib.ECommerce.Purge import deactivate_user, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run queued customer and order purges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Poll every N seconds when idle (0 = drain once)')
+        parser.add_argument('--chunk-size', type=int, default=settings.PURGE_CHUNK_SIZE,
+                            help='Rows deleted per transaction')
+        parser.add_argument('--customer', type=int, action='append', default=[],
+                            help='Queue this customer id for purging (repeatable)')
+        parser.add_argument('--list', action='store_true', help='Show jobs and exit')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        if options['list']:
+            self.list_jobs()
+            return
+
+        for customer_id in options['customer']:
+            customer = Customer.objects.filter(id=customer_id).first()
+            if customer is None:
+                raise CommandError(f'Customer not found: {customer_id}')
+            deactivate_user(customer.user_id)
+            job = PurgeJob.enqueue('customer', customer.id, label=f"{customer.first_name} {customer.last_name}".strip())
+            self.stdout.write(f'Queued purge job {job.id} for customer {customer.id}')
+
+        requeued = PurgeJob.requeue_running()
+        if requeued:
+            self.stdout.write(f'Resuming {requeued} interrupted purge job(s)')
+
+        while True:
+            job = PurgeJob.claim_next()
+            if job is None:
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            started = time.perf_counter()
+            run_job(job, chunk_size=options['chunk_size'])
+            elapsed = time.perf_counter() - started
+            rows = sum(job.progress.values())
+            if job.status == 'failed':
+                self.stdout.write(self.style.ERROR(
+                    f'✗ Purge job {job.id} ({job.target} {job.target_id}) failed: {job.last_error}'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'✅ Purge job {job.id} ({job.target} {job.target_id} {job.label}): '
+                    f'{rows} row(s) in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f}/s) {job.progress}'
+                ))
+
+    def list_jobs(self):
+        jobs = list(PurgeJob.objects.filter(status__in=['pending', 'running']).order_by('id'))
+        jobs += list(PurgeJob.objects.filter(status__in=['done', 'failed']).order_by('-id')[:10])
+        if not jobs:
+            self.stdout.write('No purge jobs')
+        for job in jobs:
+            self.stdout.write(
+                f'{job.id:>6}  {job.status:<8} {job.target} {job.target_id} {job.label}  '
+                f'{sum(job.progress.values())} row(s) {job.progress}{"  " + job.last_error if job.last_error else ""}'
+            )
@@ -0,0 +1,34 @@
+"""
+Django management command to delete expired cart stock reservations
+Usage: python manage.py release_reservations [--interval 60] [--batch-size 1000]
+
+Expired holds already stop counting against available stock, so this is
+cleanup: it deletes them in batches to keep the stock_reservations table and
+its indexes small. With --interval it repeats forever (run it next to the
+web process, or from cron without --interval).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from lib.ECommerce.Models.Reservation import StockReservation
+
+
+class Command(BaseCommand):
+    help = 'Delete expired cart stock reservations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Repeat every N seconds (0 = once)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            released = StockReservation.release_expired(options['batch_size'])
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Released {released} expired reservation(s) in {elapsed_ms:.0f}ms'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,381 @@
+"""
+Django management command to generate a production-sized synthetic dataset
+Usage: python manage.py seed_scale --customers 100000 --orders 1000000
+
+Rows are written with bulk_create in large batches. Popularity is skewed so
+the data behaves like real traffic: a few hot SKUs dominate sales, a minority
+of repeat customers place most orders and order dates peak seasonally.
+"""
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from lib.ECommerce.Models.User import User
+from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Product import Product
+from lib.ECommerce.Models.Order import Order, OrderItem, InventoryTransaction, OrderTimeline
+from lib.ECommerce.Money import order_totals
+
+
+# Relative order volume per calendar month (Jan..Dec), holiday peak at the end
+MONTH_WEIGHTS = [0.8, 0.7, 0.85, 0.9, 0.95, 0.9, 0.95, 1.0, 0.95, 1.1, 1.6, 2.1]
+
+# Relative order volume per hour of day
+HOUR_WEIGHTS = [0.2, 0.1, 0.1, 0.1, 0.1, 0.2, 0.4, 0.7, 0.9, 1.0, 1.1, 1.2,
+                1.3, 1.2, 1.1, 1.1, 1.2, 1.4, 1.6, 1.8, 1.9, 1.7, 1.2, 0.6]
+
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda',
+               'William', 'Elizabeth', 'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica',
+               'Thomas', 'Sarah', 'Maria', 'Wei', 'Aisha', 'Carlos', 'Yuki', 'Fatima']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas',
+              'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee', 'Chen', 'Khan', 'Tanaka', 'Silva']
+CITIES = [('New York', 'NY', '10001'), ('Los Angeles', 'CA', '90001'), ('Chicago', 'IL', '60601'),
+          ('Houston', 'TX', '77001'), ('Phoenix', 'AZ', '85001'), ('Philadelphia', 'PA', '19101'),
+          ('San Antonio', 'TX', '78201'), ('San Diego', 'CA', '92101'), ('Dallas', 'TX', '75201'),
+          ('Seattle', 'WA', '98101'), ('Denver', 'CO', '80201'), ('Boston', 'MA', '02101')]
+STREETS = ['Main St', 'Oak Ave', 'Pine Rd', 'Elm St', 'Maple Dr', 'Cedar Ln', 'Park Blvd', 'Lake Rd']
+ADJECTIVES = ['Classic', 'Premium', 'Compact', 'Deluxe', 'Smart', 'Portable', 'Organic', 'Pro',
+              'Ultra', 'Eco', 'Vintage', 'Wireless']
+NOUNS = {
+    'Electronics': ['Headphones', 'Speaker', 'Charger', 'Keyboard', 'Monitor', 'Webcam'],
+    'Clothing': ['Jacket', 'Sneakers', 'T-Shirt', 'Hoodie', 'Jeans', 'Scarf'],
+    'Books': ['Cookbook', 'Novel', 'Guide', 'Atlas', 'Workbook', 'Anthology'],
+    'Home': ['Mug Set', 'Desk Lamp', 'Blender', 'Pillow', 'Rug', 'Kettle'],
+    'Sports': ['Yoga Mat', 'Dumbbells', 'Racket', 'Water Bottle', 'Jump Rope', 'Helmet'],
+    'Toys': ['Puzzle', 'Blocks Set', 'Board Game', 'Plush Bear', 'Kite', 'Train Set'],
+    'Food': ['Coffee Beans', 'Tea Sampler', 'Olive Oil', 'Honey', 'Granola', 'Spice Kit'],
+    'Beauty': ['Face Cream', 'Shampoo', 'Hair Dryer', 'Lip Balm', 'Serum', 'Perfume'],
+    'Automotive': ['Phone Mount', 'Tire Gauge', 'Seat Cover', 'Dash Cam', 'Wax Kit', 'Jump Starter'],
+    'Other': ['Gift Card', 'Notebook', 'Umbrella', 'Backpack', 'Wallet', 'Candle'],
+}
+
+# (status, probability) for orders older than two weeks; newer orders are still in flight
+SETTLED_STATUSES = [('delivered', 0.86), ('cancelled', 0.08), ('refunded', 0.06)]
+RECENT_STATUSES = [('pending', 0.35), ('processing', 0.3), ('shipped', 0.25), ('delivered', 0.1)]
+
+STATUS_PATH = ['pending', 'processing', 'shipped', 'delivered']
+STATUS_DESCRIPTIONS = {
+    'pending': 'Order placed',
+    'processing': 'Order is being processed',
+    'shipped': 'Order has been shipped',
+    'delivered': 'Order has been delivered',
+    'cancelled': 'Order has been cancelled',
+    'refunded': 'Order has been refunded',
+}
+
+SEED_PREFIX = 'SEED'
+
+
+def zipf_cum_weights(n, exponent):
+    """Cumulative Zipf weights for ranks 1..n (rank 1 is the most popular)."""
+    return list(accumulate(1.0 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic dataset (customers, orders, items, timeline, inventory)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=10000, help='Number of customers to create')
+        parser.add_argument('--orders', type=int, default=100000, help='Number of orders to create')
+        parser.add_argument('--products', type=int, default=500, help='Number of products to create')
+        parser.add_argument('--users', type=int, default=1000,
+                            help='How many of the customers get a login (seed_customer_<n>)')
+        parser.add_argument('--password', default='seedpass123', help='Password for seeded logins')
+        parser.add_argument('--max-items', type=int, default=5, help='Maximum line items per order')
+        parser.add_argument('--days', type=int, default=730, help='Spread order dates over this many days')
+        parser.add_argument('--sku-skew', type=float, default=1.1,
+                            help='Zipf exponent for product popularity (higher = hotter SKUs)')
+        parser.add_argument('--customer-skew', type=float, default=0.8,
+                            help='Zipf exponent for repeat-customer concentration')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create batch')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (runs are reproducible)')
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded rows first')
+        parser.add_argument('--force', action='store_true', help='Allow running with DEBUG=False')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('Refusing to seed synthetic data with DEBUG=False (use --force)')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        if options['clear']:
+            self.clear_seeded()
+
+        products = self.seed_products(options['products'])
+        customers = self.seed_customers(options['customers'], options['users'], options['password'])
+        self.seed_orders(options, products, customers)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write('-' * 60)
+        self.stdout.write(self.style.SUCCESS(f'✓ Seeding finished in {elapsed:.1f}s'))
+        self.stdout.write(f'Products: {Product.objects.count()}')
+        self.stdout.write(f'Customers: {Customer.objects.count()}')
+        self.stdout.write(f'Orders: {Order.objects.count()}')
+        self.stdout.write(f'Order items: {OrderItem.objects.count()}')
+        self.stdout.write(f'Timeline events: {OrderTimeline.objects.count()}')
+        self.stdout.write(f'Inventory transactions: {InventoryTransaction.objects.count()}')
+
+    # -------------------------------------------------------------------------
+    # Cleanup
+    # -------------------------------------------------------------------------
+
+    def clear_seeded(self):
+        """Remove rows created by a previous run (identified by the SEED prefix)."""
+        self.stdout.write('Clearing previously seeded rows...')
+        seeded_orders = Order.objects.filter(order_number__startswith=f'{SEED_PREFIX}-')
+        OrderTimeline.objects.filter(order__in=seeded_orders).delete()
+        OrderItem.objects.filter(order__in=seeded_orders).delete()
+        seeded_orders.delete()
+        seeded_products = Product.objects.filter(sku__startswith=f'{SEED_PREFIX}-')
+        InventoryTransaction.objects.filter(product__in=seeded_products).delete()
+        seeded_products.delete()
+        Customer.objects.filter(phone__startswith=f'{SEED_PREFIX}-').delete()
+        User.objects.filter(username__startswith='seed_customer_').delete()
+
+    # -------------------------------------------------------------------------
+    # Products
+    # -------------------------------------------------------------------------
+
+    def seed_products(self, count):
+        """Create the catalog. Returns list of (id, name, sku, price_cents) ordered by popularity."""
+        self.stdout.write(f'Creating {count} products...')
+        categories = Product.get_categories()
+        start_index = Product.objects.filter(sku__startswith=f'{SEED_PREFIX}-').count()
+        now = timezone.now()
+        batch = []
+        for i in range(start_index, start_index + count):
+            category = self.rng.choice(categories)
+            noun = self.rng.choice(NOUNS[category])
+            # Log-uniform price between $5 and $500, ending in .99
+            price_cents = round(5 * (100 ** self.rng.random())) * 100 - 1
+            batch.append(Product(
+                name=f'{self.rng.choice(ADJECTIVES)} {noun} {i + 1}',
+                description=f'Synthetic {category.lower()} product generated for scale testing.',
+                sku=f'{SEED_PREFIX}-{i + 1:07d}',
+                category=category,
+                price_cents=price_cents,
+                cost_cents=round(price_cents * self.rng.uniform(0.35, 0.6)),
+                # Plenty of stock so benchmarks and load tests can keep selling
+                stock_quantity=self.rng.randint(5000, 50000),
+                reorder_level=10,
+                created_at=now - timedelta(days=self.rng.randint(400, 900)),
+            ))
+        self.bulk_insert(Product, batch)
+
+        products = list(
+            Product.objects.filter(sku__startswith=f'{SEED_PREFIX}-')
+            .values_list('id', 'name', 'sku', 'price_cents')
+        )
+        # Shuffle so popularity rank is independent of SKU/category order
+        self.rng.shuffle(products)
+        return products
+
+    # -------------------------------------------------------------------------
+    # Customers
+    # -------------------------------------------------------------------------
+
+    def seed_customers(self, count, user_count, password):
+        """Create customers (the first user_count get a login). Returns list of (id, address)."""
+        self.stdout.write(f'Creating {count} customers ({min(user_count, count)} with logins)...')
+        start_index = Customer.objects.filter(phone__startswith=f'{SEED_PREFIX}-').count()
+
+        # Hash once and reuse: hashing per user would dominate the run time
+        encoded_password = make_password(password)
+        users = [
+            User(
+                username=f'seed_customer_{start_index + i + 1}',
+                email=f'seed_customer_{start_index + i + 1}@example.com',
+                password=encoded_password,
+                role='customer',
+            )
+            for i in range(min(user_count, count))
+        ]
+        self.bulk_insert(User, users)
+        user_ids = dict(
+            User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id')
+        )
+
+        now = timezone.now()
+        created = []
+        for offset in range(0, count, self.batch_size):
+            batch = []
+            for i in range(offset, min(offset + self.batch_size, count)):
+                number = start_index + i + 1
+                city, state, zip_code = self.rng.choice(CITIES)
+                batch.append(Customer(
+                    user_id=user_ids.get(f'seed_customer_{number}'),
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                    # The prefix marks seeded rows so --clear can find them again
+                    phone=f'{SEED_PREFIX}-555-{self.rng.randint(1000, 9999)}',
+                    address=f'{self.rng.randint(1, 9999)} {self.rng.choice(STREETS)}',
+                    city=city,
+                    state=state,
+                    zip_code=zip_code,
+                    created_at=now - timedelta(days=self.rng.randint(0, 900)),
+                ))
+            with transaction.atomic():
+                created.extend(Customer.objects.bulk_create(batch))
+            self.progress('customers', len(created), count)
+
+        customers = [(c.id, f'{c.address}, {c.city}, {c.state} {c.zip_code}') for c in created]
+        self.rng.shuffle(customers)
+        return customers
+
+    # -------------------------------------------------------------------------
+    # Orders, items, timeline and inventory ledger
+    # -------------------------------------------------------------------------
+
+    def seed_orders(self, options, products, customers):
+        total_orders = options['orders']
+        if not total_orders or not products or not customers:
+            return
+        self.stdout.write(f'Creating {total_orders} orders...')
+
+        product_weights = zipf_cum_weights(len(products), options['sku_skew'])
+        customer_weights = zipf_cum_weights(len(customers), options['customer_skew'])
+        hour_weights = list(accumulate(HOUR_WEIGHTS))
+        payment_methods = [m[0] for m in Order.PAYMENT_METHOD_CHOICES]
+
+        now = timezone.now()
+        days = max(options['days'], 1)
+        start_number = Order.objects.filter(order_number__startswith=f'{SEED_PREFIX}-').count()
+        created = 0
+
+        while created < total_orders:
+            size = min(self.batch_size, total_orders - created)
+            orders = []
+            lines = []  # per order: list of (product, quantity)
+
+            for i in range(size):
+                created_at = self.random_order_date(now, days, hour_weights)
+                customer_id, address = self.rng.choices(customers, cum_weights=customer_weights)[0]
+
+                order_lines = {}
+                for _ in range(self.rng.randint(1, options['max_items'])):
+                    product = self.rng.choices(products, cum_weights=product_weights)[0]
+                    quantity = self.rng.choice([1, 1, 1, 1, 2, 2, 3])
+                    previous = order_lines.get(product[0])
+                    order_lines[product[0]] = (product, quantity + (previous[1] if previous else 0))
+                lines.append(list(order_lines.values()))
+
+                totals = order_totals(sum(p[3] * qty for p, qty in order_lines.values()))
+                age_days = (now - created_at).days
+                weighted = SETTLED_STATUSES if age_days > 14 else RECENT_STATUSES
+                status = self.rng.choices([s for s, _ in weighted], weights=[w for _, w in weighted])[0]
+
+                orders.append(Order(
+                    order_number=f'{SEED_PREFIX}-{start_number + created + i + 1:09d}',
+                    customer_id=customer_id,
+                    status=status,
+                    subtotal_cents=totals['subtotal_cents'],
+                    tax_cents=totals['tax_cents'],
+                    shipping_cents=totals['shipping_cents'],
+                    total_cents=totals['total_cents'],
+                    payment_method=self.rng.choice(payment_methods),
+                    payment_status='paid' if status in ('shipped', 'delivered') else
+                                   'refunded' if status == 'refunded' else 'pending',
+                    shipping_address=address,
+                    billing_address=address,
+                    created_at=created_at,
+                ))
+
+            with transaction.atomic():
+                orders = Order.objects.bulk_create(orders)
+                self.insert_order_children(orders, lines)
+
+            created += size
+            self.progress('orders', created, total_orders)
+
+    def insert_order_children(self, orders, lines):
+        """Bulk insert items, timeline events and sale ledger rows for a batch of orders."""
+        items, events, ledger = [], [], []
+        for order, order_lines in zip(orders, lines):
+            for (product_id, name, sku, price_cents), quantity in order_lines:
+                items.append(OrderItem(
+                    order_id=order.id,
+                    product_id=product_id,
+                    product_name=name,
+                    product_sku=sku,
+                    quantity=quantity,
+                    unit_price_cents=price_cents,
+                    subtotal_cents=price_cents * quantity,
+                ))
+                ledger.append(InventoryTransaction(
+                    product_id=product_id,
+                    quantity_change=-quantity,
+                    transaction_type='sale',
+                    reference_id=order.id,
+                    notes=f'Order {order.order_number}',
+                    created_at=order.created_at,
+                ))
+                if order.status in ('cancelled', 'refunded'):
+                    ledger.append(InventoryTransaction(
+                        product_id=product_id,
+                        quantity_change=quantity,
+                        transaction_type='cancellation' if order.status == 'cancelled' else 'return',
+                        reference_id=order.id,
+                        notes=f'Order {order.order_number} {order.status}',
+                        created_at=order.created_at + timedelta(days=2),
+                    ))
+            events.extend(self.timeline_for(order))
+
+        OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+        OrderTimeline.objects.bulk_create(events, batch_size=self.batch_size)
+        InventoryTransaction.objects.bulk_create(ledger, batch_size=self.batch_size)
+
+    def timeline_for(self, order):
+        """Timeline events leading up to the order's current status."""
+        if order.status in STATUS_PATH:
+            path = STATUS_PATH[:STATUS_PATH.index(order.status) + 1]
+        elif order.status == 'cancelled':
+            path = ['pending', 'cancelled']
+        else:
+            path = STATUS_PATH + [order.status]
+
+        events = []
+        when = order.created_at
+        for status in path:
+            events.append(OrderTimeline(
+                order_id=order.id,
+                status=status,
+                description=STATUS_DESCRIPTIONS[status],
+                created_at=when,
+            ))
+            when += timedelta(hours=self.rng.randint(4, 72))
+        return events
+
+    def random_order_date(self, now, days, hour_weights):
+        """Pick an order timestamp within the window, biased towards peak months and hours."""
+        # Rejection-sample a day so the monthly seasonality shows up in any window size
+        max_weight = max(MONTH_WEIGHTS)
+        while True:
+            day = now - timedelta(days=self.rng.randrange(days))
+            if self.rng.random() * max_weight <= MONTH_WEIGHTS[day.month - 1]:
+                break
+        hour = self.rng.choices(range(24), cum_weights=hour_weights)[0]
+        moment = day.replace(hour=hour, minute=self.rng.randrange(60), second=self.rng.randrange(60))
+        return min(moment, now)
+
+    # -------------------------------------------------------------------------
+    # Helpers
+    # -------------------------------------------------------------------------
+
+    def bulk_insert(self, model, objects):
+        """bulk_create in batches, each in its own transaction."""
+        for offset in range(0, len(objects), self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(objects[offset:offset + self.batch_size])
+
+    def progress(self, label, done, total):
+        self.stdout.write(f'  {label}: {done}/{total}')
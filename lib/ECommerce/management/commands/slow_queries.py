@@ -0,0 +1,94 @@
+"""
+Django management command to rank slow queries from the slow query log
+Usage: python manage.py slow_queries --hours 24 --limit 20 [--explain]
+
+With --explain (or SLOW_QUERY_EXPLAIN) the slowest statement of each ranked
+fingerprint is run through EXPLAIN here, against the database it was logged
+on, rather than inside the request that was already slow.
+"""
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from lib.ECommerce.SlowQueryLog import explain, read_entries
+
+
+SORT_KEYS = {
+    'total': lambda f: f['total_ms'],
+    'count': lambda f: f['count'],
+    'max': lambda f: f['max_ms'],
+    'mean': lambda f: f['mean_ms'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Aggregate the slow query log by fingerprint and rank the worst offenders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24, help='Only include the last N hours (0 = all)')
+        parser.add_argument('--limit', type=int, default=20, help='Number of fingerprints to show')
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='total', help='Ranking key')
+        parser.add_argument('--log', help='Read this log file instead of SLOW_QUERY_LOG')
+        parser.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+        parser.add_argument('--explain', action='store_true', help='Show the EXPLAIN plan of each slowest statement')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options['hours']) if options['hours'] else None
+
+        groups = {}
+        for entry in read_entries(since, options['log']):
+            group = groups.setdefault(entry['fingerprint'], {
+                'fingerprint': entry['fingerprint'],
+                'normalized': entry['normalized'],
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'views': {},
+                'call_sites': {},
+                'slowest': None,
+                'last_seen': None,
+            })
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            if entry['duration_ms'] >= group['max_ms']:
+                group['max_ms'] = entry['duration_ms']
+                group['slowest'] = entry
+            view = entry.get('view') or '(no view)'
+            group['views'][view] = group['views'].get(view, 0) + 1
+            site = entry.get('call_site') or '(unknown)'
+            group['call_sites'][site] = group['call_sites'].get(site, 0) + 1
+            group['last_seen'] = max(group['last_seen'] or '', entry['timestamp'])
+
+        for group in groups.values():
+            group['mean_ms'] = round(group['total_ms'] / group['count'], 3)
+            group['total_ms'] = round(group['total_ms'], 3)
+        ranked = sorted(groups.values(), key=SORT_KEYS[options['sort']], reverse=True)[:options['limit']]
+        show_plans = options['explain'] or settings.SLOW_QUERY_EXPLAIN
+        for group in ranked:
+            slowest = group.pop('slowest')
+            group['plan'] = explain(slowest) if show_plans else None
+
+        if options['json']:
+            self.stdout.write(json.dumps(ranked, indent=2))
+            return
+
+        if not ranked:
+            self.stdout.write('No slow queries recorded.')
+            return
+
+        for rank, group in enumerate(ranked, 1):
+            self.stdout.write('-' * 78)
+            self.stdout.write(self.style.WARNING(
+                f"#{rank} [{group['fingerprint']}] {group['count']}x  total {group['total_ms']:.1f}ms  "
+                f"mean {group['mean_ms']:.1f}ms  max {group['max_ms']:.1f}ms"
+            ))
+            self.stdout.write(f"  SQL:   {group['normalized'][:300]}")
+            for view, count in sorted(group['views'].items(), key=lambda v: -v[1])[:3]:
+                self.stdout.write(f'  View:  {view} ({count}x)')
+            for site, count in sorted(group['call_sites'].items(), key=lambda s: -s[1])[:3]:
+                self.stdout.write(f'  Site:  {site} ({count}x)')
+            for line in (group['plan'] or [])[:8]:
+                self.stdout.write(f'  Plan:  {line}')
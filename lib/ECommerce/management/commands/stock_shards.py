@@ -0,0 +1,63 @@
+"""
+Django management command to turn sharded stock on or off for hot products
+Usage: python manage.py stock_shards SKU [SKU ...] --shards 8
+       python manage.py stock_shards SKU --off
+       python manage.py stock_shards --list
+
+Sharded products keep their stock in N counter rows so flash-sale checkouts
+of the same SKU don't all wait on one row lock (see Models/Product.py).
+Changing the shard count redistributes the current total; --off folds the
+shards back into products.stock_quantity.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from lib.ECommerce.Models.Product import Product
+
+MAX_SHARDS = 64
+
+
+class Command(BaseCommand):
+    help = 'Enable, resize or disable sharded stock counters per product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('skus', nargs='*', help='Product SKUs')
+        parser.add_argument('--shards', type=int, help=f'Number of stock shards (1-{MAX_SHARDS})')
+        parser.add_argument('--off', action='store_true', help='Fold the shards back into one counter')
+        parser.add_argument('--list', action='store_true', help='Show the sharded products')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            return self.list_sharded()
+
+        if not options['skus']:
+            raise CommandError('Give at least one SKU (or --list)')
+        if options['off'] == (options['shards'] is not None):
+            raise CommandError('Give either --shards N or --off')
+        shards = 0 if options['off'] else options['shards']
+        if not options['off'] and not 1 <= shards <= MAX_SHARDS:
+            raise CommandError(f'--shards must be between 1 and {MAX_SHARDS}')
+
+        products = {product.sku: product for product in Product.objects.filter(sku__in=options['skus'])}
+        missing = [sku for sku in options['skus'] if sku not in products]
+        if missing:
+            raise CommandError(f"Unknown SKU(s): {', '.join(missing)}")
+
+        for sku in options['skus']:
+            product = products[sku]
+            product.shard_stock(shards)
+            state = f'{shards} shards' if shards else 'unsharded'
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {sku}: {state}, {product.stock_quantity} units'
+            ))
+
+    def list_sharded(self):
+        products = Product.objects.filter(stock_shard_count__gt=0).order_by('sku')
+        if not products:
+            self.stdout.write('No sharded products.')
+            return
+        for product in products:
+            quantities = list(product.stock_shards.order_by('shard').values_list('quantity', flat=True))
+            self.stdout.write(
+                f'{product.sku:<20} {product.stock_shard_count:>3} shards  '
+                f'{sum(quantities):>8} units  {quantities}'
+            )
@@ -0,0 +1,55 @@
+"""
+Django management command to copy the primary SQLite database to the replica
+Usage: python manage.py sync_replica [--interval 5]
+
+Local stand-in for replication when DATABASE_REPLICA_URL points at a second
+SQLite file: takes an online backup of the primary into the replica. With
+--interval it repeats forever, so the replica lags the primary by up to that
+many seconds, like an asynchronous replica would.
+"""
+import sqlite3
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from lib.ECommerce.DatabaseRouter import REPLICA_ALIAS, replica_configured
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into the replica (replication stand-in)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Repeat every N seconds (0 = once)')
+        parser.add_argument('--pages', type=int, default=1024, help='Pages copied per backup step')
+
+    def handle(self, *args, **options):
+        if not replica_configured():
+            raise CommandError('No replica database configured (set DATABASE_REPLICA_URL)')
+
+        primary = connections['default']
+        replica = connections[REPLICA_ALIAS]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('sync_replica only copies SQLite to SQLite; use real replication for other databases')
+
+        target = Path(replica.settings_dict['NAME'])
+        target.parent.mkdir(parents=True, exist_ok=True)
+
+        while True:
+            started = time.perf_counter()
+            self.sync(primary, target, options['pages'])
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.stdout.write(self.style.SUCCESS(f'✅ Replica synced to {target} in {elapsed_ms:.0f}ms'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self, primary, target, pages):
+        """Online backup of the primary into the replica file."""
+        primary.ensure_connection()
+        destination = sqlite3.connect(str(target), timeout=30)
+        try:
+            primary.connection.backup(destination, pages=pages)
+        finally:
+            destination.close()
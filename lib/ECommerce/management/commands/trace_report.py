@@ -0,0 +1,82 @@
+"""
+Django management command to summarize exported request traces per phase
+Usage: python manage.py trace_report --route checkout --export traces.json
+"""
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from lib.ECommerce.Tracing import read_traces
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = 'Latency breakdown per span name from the trace export, optionally merged into one OTLP JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--traces', help='Read this file instead of TRACE_EXPORT_PATH')
+        parser.add_argument('--route', help='Only traces whose root span name contains this text')
+        parser.add_argument('--export', help='Write the selected traces as a single OTLP JSON document')
+        parser.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+
+    def handle(self, *args, **options):
+        documents = []
+        durations = {}
+        for document in read_traces(options['traces']):
+            spans = [
+                s
+                for resource in document.get('resourceSpans', [])
+                for scope in resource.get('scopeSpans', [])
+                for s in scope.get('spans', [])
+            ]
+            root = next((s for s in spans if not s.get('parentSpanId')), None)
+            if root is None or (options['route'] and options['route'] not in root['name']):
+                continue
+            documents.append(document)
+            for s in spans:
+                name = s['name'] if s is not root else f"{s['name']} (request)"
+                elapsed_ms = (int(s['endTimeUnixNano']) - int(s['startTimeUnixNano'])) / 1e6
+                durations.setdefault(name, []).append(elapsed_ms)
+
+        if options['export']:
+            merged = {'resourceSpans': [rs for doc in documents for rs in doc.get('resourceSpans', [])]}
+            Path(options['export']).write_text(json.dumps(merged))
+            self.stdout.write(self.style.SUCCESS(f"✅ Wrote {len(documents)} traces to {options['export']}"))
+
+        summary = []
+        for name, values in durations.items():
+            values.sort()
+            summary.append({
+                'span': name,
+                'count': len(values),
+                'total_ms': round(sum(values), 3),
+                'mean_ms': round(sum(values) / len(values), 3),
+                'p50_ms': round(percentile(values, 50), 3),
+                'p95_ms': round(percentile(values, 95), 3),
+                'max_ms': round(values[-1], 3),
+            })
+        summary.sort(key=lambda row: row['total_ms'], reverse=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps({'traces': len(documents), 'spans': summary}, indent=2))
+            return
+
+        if not summary:
+            self.stdout.write('No traces recorded.')
+            return
+
+        self.stdout.write(f'{len(documents)} traces')
+        self.stdout.write(f"{'span':<44} {'count':>6} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9}")
+        for row in summary:
+            self.stdout.write(
+                f"{row['span'][:44]:<44} {row['count']:>6} {row['mean_ms']:>8.2f}ms "
+                f"{row['p50_ms']:>7.2f}ms {row['p95_ms']:>7.2f}ms {row['max_ms']:>7.2f}ms"
+            )
@@ -0,0 +1,73 @@
+# Money as integer cents (see lib/ECommerce/Money.py)
+
+from django.db import migrations, models
+from django.db.models import F, IntegerField
+from django.db.models.functions import Cast, Round
+
+
+# model -> [(decimal field, cents field)]
+MONEY_FIELDS = {
+    'product': [('price', 'price_cents'), ('cost', 'cost_cents')],
+    'order': [('subtotal', 'subtotal_cents'), ('tax', 'tax_cents'),
+              ('shipping', 'shipping_cents'), ('total', 'total_cents')],
+    'orderitem': [('unit_price', 'unit_price_cents'), ('subtotal', 'subtotal_cents')],
+}
+
+
+def to_cents(apps, schema_editor):
+    for model_name, fields in MONEY_FIELDS.items():
+        model = apps.get_model('ECommerce', model_name)
+        model.objects.update(**{
+            cents: Cast(Round(F(decimal) * 100), IntegerField()) for decimal, cents in fields
+        })
+
+
+def from_cents(apps, schema_editor):
+    for model_name, fields in MONEY_FIELDS.items():
+        model = apps.get_model('ECommerce', model_name)
+        model.objects.update(**{decimal: F(cents) / 100.0 for decimal, cents in fields})
+
+
+def add_cents_fields():
+    operations = []
+    for model_name, fields in MONEY_FIELDS.items():
+        for decimal, cents in fields:
+            operations.append(migrations.AddField(
+                model_name=model_name, name=cents, field=models.IntegerField(default=0),
+            ))
+    return operations
+
+
+def remove_decimal_fields():
+    # Default 0 first, so reversing can re-add the columns to tables that have
+    # rows before from_cents() fills them in
+    return [
+        operation
+        for model_name, fields in MONEY_FIELDS.items()
+        for decimal, cents in fields
+        for operation in (
+            migrations.AlterField(
+                model_name=model_name, name=decimal,
+                field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+            ),
+            migrations.RemoveField(model_name=model_name, name=decimal),
+        )
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ECommerce', '0002_ordertimeline'),
+    ]
+
+    operations = [
+        *add_cents_fields(),
+        migrations.RunPython(to_cents, from_cents),
+        *remove_decimal_fields(),
+        migrations.AlterField(model_name='product', name='price_cents', field=models.IntegerField()),
+        migrations.AlterField(model_name='order', name='subtotal_cents', field=models.IntegerField()),
+        migrations.AlterField(model_name='order', name='total_cents', field=models.IntegerField()),
+        migrations.AlterField(model_name='orderitem', name='unit_price_cents', field=models.IntegerField()),
+        migrations.AlterField(model_name='orderitem', name='subtotal_cents', field=models.IntegerField()),
+    ]
@@ -5,7 +5,11 @@ Django models module that imports all model classes
 
 from lib.ECommerce.Models.User import User
 from lib.ECommerce.Models.Customer import Customer
-from lib.ECommerce.Models.Product import Product
-from lib.ECommerce.Models.Order import Order, OrderItem, InventoryTransaction
+from lib.ECommerce.Models.Product import Product, StockShard
+from lib.ECommerce.Models.Reservation import StockReservation
+from lib.ECommerce.Models.Outbox import OutboxEvent
+from lib.ECommerce.Models.Order import Order, OrderItem, InventoryTransaction, IdempotencyKey
+from lib.ECommerce.Models.Archive import ArchivedOrder, ArchivedOrderItem, ArchivedOrderTimeline
+from lib.ECommerce.Models.Purge import PurgeJob
 
-__all__ = ['User', 'Customer', 'Product', 'Order', 'OrderItem', 'InventoryTransaction']
+__all__ = ['User', 'Customer', 'Product', 'StockShard', 'StockReservation', 'OutboxEvent', 'Order', 'OrderItem', 'InventoryTransaction', 'IdempotencyKey', 'ArchivedOrder', 'ArchivedOrderItem', 'ArchivedOrderTimeline', 'PurgeJob']
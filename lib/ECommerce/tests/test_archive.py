@@ -0,0 +1,72 @@
+"""
+Archiving moves each batch in one transaction, so a run that dies halfway
+leaves whole orders on one side or the other and the next run finishes.
+"""
+
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from lib.ECommerce.Models.Archive import ArchivedOrder, ArchivedOrderItem, ArchivedOrderTimeline
+from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Order import Order, OrderItem, OrderTimeline
+
+
+class ArchiveResumeTests(TransactionTestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(first_name='Buyer')
+        for i in range(5):
+            order = Order.objects.create(
+                order_number=f'ORD-{i}', customer=customer, status='delivered',
+                subtotal_cents=1000 * (i + 1), total_cents=1000 * (i + 1),
+            )
+            for line in range(2):
+                OrderItem.objects.create(
+                    order=order, product_name='Widget', product_sku=f'WID-{line}', quantity=1,
+                    unit_price_cents=500 * (i + 1), subtotal_cents=500 * (i + 1),
+                )
+            OrderTimeline.objects.create(order=order, status='delivered', description='Delivered')
+            Order.objects.filter(id=order.id).update(updated_at=timezone.now() - timedelta(days=400))
+        # Still open: must stay live
+        Order.objects.create(order_number='ORD-open', customer=customer, subtotal_cents=1, total_cents=1)
+
+    def archive(self):
+        call_command('archive_orders', older_than_days=365, batch_size=2, stdout=StringIO())
+
+    def test_interrupted_run_resumes_without_loss_or_duplicates(self):
+        revenue = Order.objects.filter(status='delivered').aggregate(total=Sum('total_cents'))['total']
+        real_bulk_create = ArchivedOrderTimeline.objects.bulk_create
+        calls = []
+
+        def crash_on_second_batch(rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise KeyboardInterrupt  # the worker is killed inside the transaction
+            return real_bulk_create(rows)
+
+        with mock.patch.object(ArchivedOrderTimeline.objects, 'bulk_create', side_effect=crash_on_second_batch):
+            with self.assertRaises(KeyboardInterrupt):
+                self.archive()
+
+        # The first batch moved completely, the second not at all
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+        self.assertEqual(ArchivedOrderItem.objects.count(), 4)
+        self.assertEqual(ArchivedOrderTimeline.objects.count(), 2)
+        self.assertEqual(Order.objects.count(), 4)
+        self.assertEqual(OrderItem.objects.count(), 6)
+
+        self.archive()
+
+        self.assertEqual(list(Order.objects.values_list('order_number', flat=True)), ['ORD-open'])
+        self.assertEqual(ArchivedOrder.objects.count(), 5)
+        self.assertEqual(ArchivedOrderItem.objects.count(), 10)
+        self.assertEqual(ArchivedOrderTimeline.objects.count(), 5)
+        self.assertEqual(ArchivedOrder.objects.aggregate(total=Sum('total_cents'))['total'], revenue)
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(OrderTimeline.objects.exists())
@@ -0,0 +1,117 @@
+"""
+Order changefeed paging: following the cursor returns every order exactly
+once, ties on updated_at included, and later calls only what changed.
+"""
+
+from datetime import timedelta
+
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from lib.ECommerce.Changefeed import InvalidCursor, decode_cursor, read_changes
+from lib.ECommerce.Controllers.admin_routes import api_order_changes
+from lib.ECommerce.DatabaseRouter import RoutingState, _request_state
+from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Order import Order, OrderTimeline
+
+
+@override_settings(CHANGEFEED_SETTLE_SECONDS=5)
+class ChangefeedPagingTests(TestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(first_name='Buyer')
+        self.start = timezone.now() - timedelta(hours=1)
+        self.orders = []
+        for i in range(7):
+            order = Order.objects.create(
+                order_number=f'ORD-{i}', customer=customer, subtotal_cents=1000, total_cents=1000
+            )
+            # Pairs share an updated_at, so pages have to break ties by id
+            Order.objects.filter(id=order.id).update(updated_at=self.start + timedelta(minutes=i // 2))
+            OrderTimeline.objects.create(order=order, status='pending', description='Order placed',
+                                         created_at=self.start)
+            self.orders.append(order)
+
+    def follow(self, cursor='', channels=('orders',), limit=2):
+        """Read pages until has_more is false; returns (rows per channel, last cursor)."""
+        rows = {channel: [] for channel in channels}
+        while True:
+            page = read_changes(cursor, list(channels), limit)
+            for channel in channels:
+                self.assertLessEqual(len(page[channel]), limit)
+                rows[channel].extend(page[channel])
+            cursor = page['cursor']
+            if not page['has_more']:
+                return rows, cursor
+
+    def test_pages_return_every_order_once_in_order(self):
+        rows, _ = self.follow()
+
+        self.assertEqual([row['id'] for row in rows['orders']], [order.id for order in self.orders])
+
+    def test_cursor_only_returns_later_changes(self):
+        _, cursor = self.follow()
+        changed = self.orders[1]
+        Order.objects.filter(id=changed.id).update(status='shipped', updated_at=timezone.now() - timedelta(minutes=1))
+
+        rows, cursor = self.follow(cursor)
+        self.assertEqual([(row['id'], row['status']) for row in rows['orders']], [(changed.id, 'shipped')])
+
+        rows, _ = self.follow(cursor)
+        self.assertEqual(rows['orders'], [])
+
+    def test_unsettled_changes_wait_for_the_next_call(self):
+        _, cursor = self.follow()
+        fresh = self.orders[0]
+        Order.objects.filter(id=fresh.id).update(updated_at=timezone.now())
+
+        rows, _ = self.follow(cursor)
+        self.assertEqual(rows['orders'], [])
+
+        with override_settings(CHANGEFEED_SETTLE_SECONDS=0):
+            rows, _ = self.follow(cursor)
+        self.assertEqual([row['id'] for row in rows['orders']], [fresh.id])
+
+    def test_timeline_channel_pages_by_id(self):
+        rows, cursor = self.follow(channels=('timeline',), limit=3)
+
+        self.assertEqual(len(rows['timeline']), 7)
+        self.assertEqual(len({row['id'] for row in rows['timeline']}), 7)
+        self.assertEqual(decode_cursor(cursor)['timeline'], rows['timeline'][-1]['id'])
+
+    def test_now_skips_existing_rows(self):
+        page = read_changes('now', ['orders', 'timeline'], 10)
+
+        self.assertEqual(page['orders'], [])
+        self.assertEqual(page['timeline'], [])
+        self.assertFalse(page['has_more'])
+
+    def test_foreign_cursor_is_rejected(self):
+        with self.assertRaises(InvalidCursor):
+            read_changes('not-a-cursor', ['orders'], 10)
+
+
+class ChangefeedPrimaryReadTests(TransactionTestCase):
+    """The settle window assumes the primary: a lagging replica could skip rows."""
+
+    databases = {'default', 'analytics'}
+
+    def test_feed_never_reads_the_analytics_alias(self):
+        Order.objects.create(
+            order_number='ORD-1', customer=Customer.objects.create(first_name='Buyer'),
+            subtotal_cents=1000, total_cents=1000,
+        )
+        state = RoutingState()
+        state.use_replica = True
+        token = _request_state.set(state)
+        try:
+            with CaptureQueriesContext(connections['analytics']) as analytics_queries:
+                read_changes('', ['orders', 'timeline', 'inventory'], 10)
+                read_changes('now', ['orders', 'timeline', 'inventory'], 10)
+        finally:
+            _request_state.reset(token)
+
+        self.assertEqual(len(analytics_queries), 0)
+        self.assertNotEqual(getattr(api_order_changes, 'workload_class', None), 'analytics')
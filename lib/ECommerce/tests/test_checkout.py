@@ -0,0 +1,73 @@
+"""
+Checkout and cancellation under concurrency: stock is decremented with a
+conditional UPDATE inside the write lock, so racing checkouts can't oversell
+and racing cancels can't restore stock twice.
+"""
+
+import threading
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Order import Order
+from lib.ECommerce.Models.Product import Product
+
+
+def run_concurrently(func, args_list):
+    """Call func(*args) on one thread each, released together; returns the results."""
+    barrier = threading.Barrier(len(args_list))
+    results = [None] * len(args_list)
+
+    def worker(index, args):
+        barrier.wait()
+        try:
+            results[index] = func(*args)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i, args)) for i, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Widget', sku='WID-1', category='Electronics', price_cents=1000, stock_quantity=3
+        )
+        self.customers = [Customer.objects.create(first_name=f'Buyer {i}') for i in range(8)]
+
+    def checkout(self, customer, quantity=1):
+        return Order.create_from_cart(
+            customer,
+            [{'product_id': self.product.id, 'quantity': quantity, 'name': self.product.name}],
+            'credit_card',
+            '1 Test Street',
+        )
+
+    def test_concurrent_checkouts_never_oversell(self):
+        results = run_concurrently(self.checkout, [(customer,) for customer in self.customers])
+
+        self.product.refresh_from_db()
+        successes = [result for result in results if result['success']]
+        self.assertEqual(len(successes), 3)
+        self.assertEqual(self.product.stock_quantity, 0)
+        self.assertEqual(Order.objects.count(), 3)
+        for result in results:
+            if not result['success']:
+                self.assertIn('Insufficient stock', result['message'])
+
+    def test_concurrent_cancels_restore_stock_once(self):
+        order_id = self.checkout(self.customers[0], quantity=2)['order_id']
+
+        results = run_concurrently(lambda: Order.objects.get(id=order_id).cancel_order(), [()] * 4)
+
+        self.product.refresh_from_db()
+        self.assertEqual(sum(result['success'] for result in results), 1)
+        self.assertEqual(self.product.stock_quantity, 3)
+        self.assertEqual(Order.objects.get(id=order_id).status, 'cancelled')
@@ -0,0 +1,80 @@
+"""
+Idempotent checkout: a repeated Idempotency-Key returns the first result
+instead of creating a second order, also when both requests race.
+"""
+
+from django.test import TestCase, TransactionTestCase
+
+from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Order import IdempotencyKey, Order
+from lib.ECommerce.Models.Product import Product
+from lib.ECommerce.tests.test_checkout import run_concurrently
+
+
+def checkout(customer, product, key, quantity=1):
+    return Order.create_from_cart(
+        customer,
+        [{'product_id': product.id, 'quantity': quantity, 'name': product.name}],
+        'credit_card',
+        '1 Test Street',
+        idempotency_key=key,
+    )
+
+
+class IdempotentCheckoutTests(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Widget', sku='WID-1', category='Electronics', price_cents=1000, stock_quantity=10
+        )
+        self.customer = Customer.objects.create(first_name='Buyer')
+
+    def test_replay_returns_first_result(self):
+        first = checkout(self.customer, self.product, 'key-1')
+        second = checkout(self.customer, self.product, 'key-1')
+
+        self.assertTrue(first['success'])
+        self.assertNotIn('replayed', first)
+        self.assertTrue(second['replayed'])
+        self.assertEqual(second['order_id'], first['order_id'])
+        self.assertEqual(second['order_number'], first['order_number'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 9)
+
+    def test_keys_are_per_customer(self):
+        other = Customer.objects.create(first_name='Other')
+
+        first = checkout(self.customer, self.product, 'shared-key')
+        second = checkout(other, self.product, 'shared-key')
+
+        self.assertNotIn('replayed', second)
+        self.assertNotEqual(second['order_id'], first['order_id'])
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_failed_attempt_can_be_retried_with_same_key(self):
+        failed = checkout(self.customer, self.product, 'key-2', quantity=11)
+        self.assertFalse(failed['success'])
+        self.assertFalse(IdempotencyKey.objects.filter(key='key-2').exists())
+
+        retried = checkout(self.customer, self.product, 'key-2', quantity=2)
+        self.assertTrue(retried['success'])
+        self.assertNotIn('replayed', retried)
+
+
+class ConcurrentReplayTests(TransactionTestCase):
+
+    def test_racing_duplicates_create_one_order(self):
+        product = Product.objects.create(
+            name='Widget', sku='WID-1', category='Electronics', price_cents=1000, stock_quantity=10
+        )
+        customer = Customer.objects.create(first_name='Buyer')
+
+        results = run_concurrently(checkout, [(customer, product, 'double-click')] * 4)
+
+        self.assertTrue(all(result['success'] for result in results))
+        self.assertEqual(len({result['order_id'] for result in results}), 1)
+        self.assertEqual(sum(not result.get('replayed') for result in results), 1)
+        self.assertEqual(Order.objects.count(), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 9)
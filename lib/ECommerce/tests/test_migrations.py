@@ -0,0 +1,70 @@
+"""
+0003_money_cents converts the decimal money columns to integer cents and
+back without losing a cent.
+"""
+
+from decimal import Decimal
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MoneyCentsMigrationTests(TransactionTestCase):
+
+    before = [('ECommerce', '0002_ordertimeline')]
+    after = [('ECommerce', '0003_money_cents')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        # Leave the schema at the latest migration for the other tests
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_round_trip(self):
+        apps = self.migrate(self.before)
+        Product = apps.get_model('ECommerce', 'Product')
+        Customer = apps.get_model('ECommerce', 'Customer')
+        Order = apps.get_model('ECommerce', 'Order')
+        OrderItem = apps.get_model('ECommerce', 'OrderItem')
+
+        # Values that binary floats can't represent exactly
+        product = Product.objects.create(
+            name='Widget', sku='WID-1', category='Other', price=Decimal('19.99'), cost=Decimal('0.07')
+        )
+        customer = Customer.objects.create(first_name='Buyer')
+        order = Order.objects.create(
+            order_number='ORD-1', customer=customer, subtotal=Decimal('59.97'), tax=Decimal('4.80'),
+            shipping=Decimal('0.00'), total=Decimal('64.77'),
+        )
+        item = OrderItem.objects.create(
+            order=order, product=product, product_name='Widget', product_sku='WID-1', quantity=3,
+            unit_price=Decimal('19.99'), subtotal=Decimal('59.97'),
+        )
+
+        apps = self.migrate(self.after)
+        product_cents = apps.get_model('ECommerce', 'Product').objects.get(id=product.id)
+        order_cents = apps.get_model('ECommerce', 'Order').objects.get(id=order.id)
+        item_cents = apps.get_model('ECommerce', 'OrderItem').objects.get(id=item.id)
+        self.assertEqual((product_cents.price_cents, product_cents.cost_cents), (1999, 7))
+        self.assertEqual(
+            (order_cents.subtotal_cents, order_cents.tax_cents, order_cents.shipping_cents, order_cents.total_cents),
+            (5997, 480, 0, 6477),
+        )
+        self.assertEqual((item_cents.unit_price_cents, item_cents.subtotal_cents), (1999, 5997))
+
+        apps = self.migrate(self.before)
+        product = apps.get_model('ECommerce', 'Product').objects.get(id=product.id)
+        order = apps.get_model('ECommerce', 'Order').objects.get(id=order.id)
+        item = apps.get_model('ECommerce', 'OrderItem').objects.get(id=item.id)
+        self.assertEqual((product.price, product.cost), (Decimal('19.99'), Decimal('0.07')))
+        self.assertEqual(
+            (order.subtotal, order.tax, order.shipping, order.total),
+            (Decimal('59.97'), Decimal('4.80'), Decimal('0.00'), Decimal('64.77')),
+        )
+        self.assertEqual((item.unit_price, item.subtotal), (Decimal('19.99'), Decimal('59.97')))
@@ -0,0 +1,55 @@
+"""
+Cancelled orders are never left charged: cancelling voids a payment not
+captured yet and marks a captured one refund_pending, whichever path
+cancels the order.
+"""
+
+import json
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from lib.ECommerce.Models.Archive import ArchivedOrder
+from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Order import Order, OrderTimeline
+from lib.ECommerce.Models.User import User
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class BulkCancelPaymentTests(TestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(first_name='Buyer')
+        self.paid = Order.objects.create(
+            order_number='ORD-paid', customer=customer, subtotal_cents=1000, total_cents=1000,
+            status='processing', payment_status='paid', payment_reference='ref_paid',
+        )
+        self.pending = Order.objects.create(
+            order_number='ORD-pending', customer=customer, subtotal_cents=1000, total_cents=1000,
+            payment_status='pending',
+        )
+        self.admin = User.objects.create(username='admin', email='admin@example.com', role='admin')
+        self.client.force_login(self.admin)
+
+    def test_bulk_cancel_voids_and_refunds(self):
+        response = self.client.post(
+            '/api/orders/bulk-update/',
+            json.dumps({'order_ids': [self.paid.id, self.pending.id], 'status': 'cancelled'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.paid.refresh_from_db()
+        self.pending.refresh_from_db()
+        self.assertEqual((self.paid.status, self.paid.payment_status), ('cancelled', 'refund_pending'))
+        self.assertEqual((self.pending.status, self.pending.payment_status), ('cancelled', 'voided'))
+        self.assertEqual(
+            list(OrderTimeline.objects.filter(order=self.paid).values_list('description', flat=True)),
+            ['Refund due for payment ref_paid'],
+        )
+        self.assertFalse(OrderTimeline.objects.filter(order=self.pending).exists())
+
+        # The refund is still owed, so the order stays live
+        cutoff = timezone.now() + timedelta(days=1)
+        self.assertFalse(ArchivedOrder.archivable(cutoff).filter(id=self.paid.id).exists())
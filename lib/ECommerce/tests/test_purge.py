@@ -0,0 +1,90 @@
+"""
+Chunked purges: a worker that dies partway leaves its job 'running', and the
+next `manage.py purge_jobs` picks it up and deletes whatever is left.
+"""
+
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from lib.ECommerce.Models.Customer import Customer
+from lib.ECommerce.Models.Order import InventoryTransaction, Order, OrderItem, OrderTimeline
+from lib.ECommerce.Models.Product import Product
+from lib.ECommerce.Models.Purge import PurgeJob
+from lib.ECommerce.Models.User import User
+from lib.ECommerce.Purge import Purger, delete_customer
+
+
+@override_settings(PURGE_INLINE_MAX_ORDERS=2, PURGE_CHUNK_PAUSE_MS=0)
+class PurgeResumeTests(TransactionTestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Widget', sku='WID-1', category='Electronics', price_cents=1000, stock_quantity=100
+        )
+        self.user = User.objects.create(username='buyer', email='buyer@example.com')
+        self.customer = Customer.objects.create(user=self.user, first_name='Buyer')
+        for i in range(5):
+            order = Order.objects.create(
+                order_number=f'ORD-{i}', customer=self.customer, subtotal_cents=2000, total_cents=2000
+            )
+            for _ in range(2):
+                OrderItem.objects.create(
+                    order=order, product=self.product, product_name='Widget', product_sku='WID-1',
+                    quantity=1, unit_price_cents=1000, subtotal_cents=1000,
+                )
+            OrderTimeline.objects.create(order=order, status='pending', description='Order placed')
+            InventoryTransaction.objects.create(
+                product=self.product, quantity_change=-2, transaction_type='sale', reference_id=order.id
+            )
+
+    def run_worker(self):
+        call_command('purge_jobs', chunk_size=3, stdout=StringIO())
+
+    def test_large_customer_is_queued_and_login_disabled(self):
+        result = delete_customer(self.customer)
+
+        self.assertTrue(result['queued'])
+        self.assertEqual(PurgeJob.objects.get(id=result['job_id']).status, 'pending')
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(Order.objects.count(), 5)
+
+    def test_interrupted_job_resumes_and_finishes(self):
+        job_id = delete_customer(self.customer)['job_id']
+        real_rest = Purger.rest
+        chunks = []
+
+        def die_after_three_chunks(purger):
+            chunks.append(purger)
+            if len(chunks) == 3:
+                raise KeyboardInterrupt  # the worker is killed between chunks
+            return real_rest(purger)
+
+        with mock.patch.object(Purger, 'rest', autospec=True, side_effect=die_after_three_chunks):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_worker()
+
+        job = PurgeJob.objects.get(id=job_id)
+        self.assertEqual(job.status, 'running')
+        self.assertTrue(Customer.objects.filter(id=self.customer.id).exists())
+        self.assertLess(OrderItem.objects.count(), 10)
+
+        self.run_worker()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertFalse(Customer.objects.filter(id=self.customer.id).exists())
+        self.assertFalse(User.objects.filter(id=self.user.id).exists())
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(OrderTimeline.objects.exists())
+        # Progress adds up across both runs: nothing counted twice
+        self.assertEqual(job.progress['order_items'], 10)
+        self.assertEqual(job.progress['orders'], 5)
+        self.assertEqual(job.progress['order_timeline'], 5)
+        # Stock history stays, only unlinked from the purged orders
+        self.assertEqual(InventoryTransaction.objects.count(), 5)
+        self.assertFalse(InventoryTransaction.objects.filter(reference_id__isnull=False).exists())
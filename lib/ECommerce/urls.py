@@ -9,7 +9,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 # Import route modules
-from lib.ECommerce.Controllers import shared_routes, admin_routes, customer_routes
+from lib.ECommerce.Controllers import shared_routes, admin_routes, customer_routes, async_routes
 
 urlpatterns = [
     # Shared routes (accessible by all authenticated users)
@@ -22,6 +22,10 @@ urlpatterns = [
     path('', include(customer_routes)),
 ]
 
+# Async JSON endpoints (ASGI) take precedence over their sync versions
+if settings.ASYNC_API:
+    urlpatterns.insert(0, path('', include(async_routes)))
+
 # Serve static and media files in development
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0])
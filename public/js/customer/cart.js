@@ -111,8 +111,13 @@ function updateQuantity(productId, delta) {
     setQuantity(productId, newQuantity);
 }
 
+// Busy store: say where the customer is in line
+function showQueuePosition(data) {
+    showToast(data.message, 'info', 'Waiting in line');
+}
+
 function setQuantity(productId, quantity) {
-    fetch(window.cartUrls.update, {
+    fetchAdmitted(window.cartUrls.update, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -122,7 +127,7 @@ function setQuantity(productId, quantity) {
             product_id: productId,
             quantity: quantity
         })
-    })
+    }, showQueuePosition)
     .then(response => {
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
@@ -146,14 +151,14 @@ function removeItem(productId) {
     const item = document.querySelector(`.cart-item[data-product-id="${productId}"]`);
     item.classList.add('removing');
 
-    fetch(window.cartUrls.remove, {
+    fetchAdmitted(window.cartUrls.remove, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
             'X-CSRFToken': window.csrfToken
         },
         body: JSON.stringify({ product_id: productId })
-    })
+    }, showQueuePosition)
     .then(response => response.json())
     .then(data => {
         if (data.success) {
@@ -181,13 +186,13 @@ function clearCart() {
     const clearCartModal = document.getElementById('clear-cart-modal');
     clearCartModal.classList.remove('show');
 
-    fetch(window.cartUrls.clear, {
+    fetchAdmitted(window.cartUrls.clear, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
             'X-CSRFToken': window.csrfToken
         }
-    })
+    }, showQueuePosition)
     .then(response => response.json())
     .then(data => {
         if (data.success) {
@@ -199,6 +204,11 @@ function clearCart() {
     .catch(() => showToast('An error occurred', 'error'));
 }
 
+// Amounts arrive as integer cents
+function formatCents(cents) {
+    return (cents / 100).toFixed(2);
+}
+
 function updateCartDisplay(data) {
     // Update header cart count
     if (typeof updateCartBadge === 'function') {
@@ -211,16 +221,16 @@ function updateCartDisplay(data) {
     const totalEl = document.getElementById('cart-total');
     const shippingEl = document.getElementById('cart-shipping');
     
-    if (subtotalEl) subtotalEl.textContent = '$' + data.subtotal.toFixed(2);
-    if (taxEl) taxEl.textContent = '$' + data.tax.toFixed(2);
-    if (totalEl) totalEl.textContent = '$' + data.total.toFixed(2);
+    if (subtotalEl) subtotalEl.textContent = '$' + formatCents(data.subtotal_cents);
+    if (taxEl) taxEl.textContent = '$' + formatCents(data.tax_cents);
+    if (totalEl) totalEl.textContent = '$' + formatCents(data.total_cents);
 
     // Update shipping
     if (shippingEl) {
         if (data.free_shipping) {
             shippingEl.innerHTML = '<span class="free-shipping">FREE</span>';
         } else {
-            shippingEl.textContent = '$' + data.shipping.toFixed(2);
+            shippingEl.textContent = '$' + formatCents(data.shipping_cents);
         }
     }
 
@@ -233,8 +243,8 @@ function updateCartDisplay(data) {
                 const cartItem = input.closest('.cart-item');
                 if (cartItem) {
                     const subtotalEl = cartItem.querySelector('.item-subtotal');
-                    if (subtotalEl && item.subtotal !== undefined) {
-                        subtotalEl.textContent = item.subtotal.toFixed(2);
+                    if (subtotalEl && item.subtotal_cents !== undefined) {
+                        subtotalEl.textContent = formatCents(item.subtotal_cents);
                     }
                 }
             }
@@ -254,13 +264,16 @@ function handleCheckout(e) {
     const form = document.getElementById('checkout-form');
     const formData = new FormData(form);
 
-    fetch(window.cartUrls.checkout, {
+    fetchAdmitted(window.cartUrls.checkout, {
         method: 'POST',
         headers: {
             'X-CSRFToken': window.csrfToken,
             'X-Requested-With': 'XMLHttpRequest'
         },
         body: formData
+    }, data => {
+        // Keep the button busy with the customer's place in line
+        confirmBtn.innerHTML = `<span class="spinner-small"></span> In line: #${data.position} (~${data.eta_seconds}s)`;
     })
     .then(response => response.json())
     .then(data => {
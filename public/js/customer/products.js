@@ -61,6 +61,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const urlParams = new URLSearchParams(window.location.search);
         urlParams.set('page', page);
         urlParams.set('ajax', '1');
+        urlParams.set('fields', 'id,name,description,category,price_cents,stock,image_url');
 
         fetch(window.productsUrls.products + '?' + urlParams.toString())
             .then(response => response.json())
@@ -190,7 +191,7 @@ function addToCart(productId, button, quantity = 1) {
     
     const apiUrl = window.productsUrls.apiCartAdd;
 
-    fetch(apiUrl, {
+    fetchAdmitted(apiUrl, {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -202,6 +203,8 @@ function addToCart(productId, button, quantity = 1) {
             quantity: quantity
         }),
         credentials: 'same-origin'
+    }, data => {
+        button.innerHTML = `In line: #${data.position}`;
     })
     .then(response => {
         if (!response.ok) {
@@ -300,7 +303,7 @@ function createProductCard(product) {
                 <p class="product-description">${product.description}</p>
                 <div class="product-footer">
                     <div class="product-price-section">
-                        <span class="product-price">$${parseFloat(product.price).toFixed(2)}</span>
+                        <span class="product-price">$${(product.price_cents / 100).toFixed(2)}</span>
                         ${quantitySpinner}
                     </div>
                     ${addButton}
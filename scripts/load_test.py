@@ -0,0 +1,783 @@
+#!/usr/bin/env python
+"""
+Concurrent checkout load test against a local gunicorn server.
+Usage: python scripts/load_test.py --users 50 --duration 60 [--seed]
+       python scripts/load_test.py --scenario capacity --server asgi --connections 25,50,100,200
+       python scripts/load_test.py --scenario hot-sku --shards 0,1,2,4,8 --users 50
+
+Boots the app with the Procfile settings (2 workers x 4 threads, gthread),
+or with --server asgi the Procfile.asgi ones (2 uvicorn workers), logs in N
+seeded customers (see `manage.py seed_scale`) and runs one of:
+
+- checkout  cart-add / cart-update / checkout flows from one thread per
+            customer. Reports p50/p95/p99 latency per operation, error rates,
+            lock errors and oversell / lost-update incidents found by
+            reconciling the inventory ledger. Each checkout carries an
+            idempotency key; --double-submit resends a share of them
+            (checkout_repeat), which must not place second orders.
+- capacity  steps up the number of concurrent keep-alive connections, each
+            browsing /api/products/ and adding to / clearing its cart, and
+            reports throughput, latency and errors per step plus the largest
+            step that stayed within --slo-ms at p95 with under 1% errors.
+            Run it once per --server to compare WSGI and ASGI.
+- hot-sku   flash sale: every customer checks out the same product. Runs
+            one step per --shards count (0 = unsharded, see
+            `manage.py stock_shards`) and reports checkouts/second, latency
+            and oversell per step, so throughput can be compared as the
+            shard count grows. The product's sharding is restored afterwards.
+
+Requests queued by checkout admission control (503 with a queue ticket) are
+resent with their ticket like the browser does, so latencies include time
+spent waiting in line.
+
+Needs nothing but this repository, its requirements and the database.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import secrets
+import socket
+import string
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from itertools import accumulate
+from http.cookies import SimpleCookie
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+# Setup Django (used for seeding and for reconciling stock after the run)
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lib.ECommerce.Config')
+
+import django
+django.setup()
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+
+from lib.ECommerce.Models.Product import Product, StockShard
+from lib.ECommerce.Models.Order import InventoryTransaction
+
+LOCK_MARKERS = ('database is locked', 'could not obtain lock', 'deadlock detected', 'lock timeout')
+STOCK_MARKERS = ('insufficient stock', 'not enough stock')
+
+# --server presets: (application, worker class) as in Procfile / Procfile.asgi
+SERVER_PROFILES = {
+    'wsgi': ('lib.ECommerce.wsgi:application', 'gthread'),
+    'asgi': ('lib.ECommerce.asgi:application', 'uvicorn.workers.UvicornWorker'),
+}
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Stats:
+    """Thread-safe collector of per-operation latencies and outcomes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(lambda: defaultdict(int))
+
+    def record(self, operation, elapsed_ms, outcome):
+        with self.lock:
+            self.latencies[operation].append(elapsed_ms)
+            self.outcomes[operation][outcome] += 1
+
+    def summary(self, duration):
+        report = {}
+        for operation, samples in sorted(self.latencies.items()):
+            outcomes = dict(self.outcomes[operation])
+            total = sum(outcomes.values())
+            report[operation] = {
+                'requests': total,
+                'throughput_rps': round(total / duration, 2),
+                'p50_ms': round(percentile(samples, 50), 2),
+                'p95_ms': round(percentile(samples, 95), 2),
+                'p99_ms': round(percentile(samples, 99), 2),
+                'max_ms': round(max(samples), 2),
+                'outcomes': outcomes,
+                'error_rate': round((outcomes.get('error', 0) + outcomes.get('lock_error', 0)) / total, 4),
+            }
+        return report
+
+
+class VirtualCustomer:
+    """One simulated shopper with its own keep-alive connection and cookie jar."""
+
+    def __init__(self, base_url, forwarded_proto):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.origin = f'{forwarded_proto or parts.scheme}://{parts.netloc}'
+        self.forwarded_proto = forwarded_proto
+        self.cookies = {}
+        # A self-issued CSRF secret is accepted by Django, so no page render is needed
+        self.csrf = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
+        self.cookies['csrftoken'] = self.csrf
+        self.conn = None
+        self.queue_polls = 0
+
+    def request(self, method, path, body=None, content_type=None, ajax=False):
+        """Send a request; while the checkout waiting room queues it, wait and resend with the ticket."""
+        ticket = None
+        while True:
+            status, location, payload = self.send(method, path, body, content_type, ajax, ticket)
+            if status != 503:
+                return status, location, payload
+            try:
+                data = json.loads(payload)
+            except ValueError:
+                return status, location, payload
+            if not isinstance(data, dict) or not data.get('queued'):
+                return status, location, payload
+            self.queue_polls += 1
+            ticket = data['ticket']
+            time.sleep(data['retry_after_ms'] / 1000)
+
+    def send(self, method, path, body, content_type, ajax, ticket):
+        headers = {
+            'Cookie': '; '.join(f'{k}={v}' for k, v in self.cookies.items()),
+            'X-CSRFToken': self.cookies.get('csrftoken', self.csrf),
+            'Origin': self.origin,
+            'Referer': self.origin + '/',
+        }
+        if self.forwarded_proto:
+            headers['X-Forwarded-Proto'] = self.forwarded_proto
+        if content_type:
+            headers['Content-Type'] = content_type
+        if ajax:
+            headers['X-Requested-With'] = 'XMLHttpRequest'
+        if ticket:
+            headers['X-Queue-Ticket'] = ticket
+
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                payload = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError, socket.timeout):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+        for header in response.msg.get_all('Set-Cookie') or []:
+            cookie = SimpleCookie()
+            cookie.load(header)
+            for key, morsel in cookie.items():
+                self.cookies[key] = morsel.value
+        return response.status, response.getheader('Location', ''), payload
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def post_json(self, path, data):
+        return self.request('POST', path, json.dumps(data), 'application/json')
+
+    def post_form(self, path, data, ajax=False):
+        data = dict(data, csrfmiddlewaretoken=self.cookies.get('csrftoken', self.csrf))
+        return self.request('POST', path, urlencode(data), 'application/x-www-form-urlencoded', ajax)
+
+    def login(self, username, password):
+        status, location, _ = self.post_form('/login/', {'username': username, 'password': password})
+        return status == 302 and 'dashboard' in location
+
+
+def classify(status, payload):
+    """Map a response to ok / rejected (business rule, e.g. no stock) / lock_error / error."""
+    text = payload.decode('utf-8', 'replace').lower()
+    if any(marker in text for marker in LOCK_MARKERS):
+        return 'lock_error'
+    if status >= 400:
+        return 'error'
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return 'ok' if status < 400 else 'error'
+    if data.get('success', True):
+        return 'ok'
+    if any(marker in str(data.get('message', '')).lower() for marker in STOCK_MARKERS):
+        return 'rejected'
+    return 'error'
+
+
+def shopper_loop(customer, products, weights, deadline, stats, args, rng):
+    """Repeat add -> (update) -> checkout until the deadline."""
+    while time.monotonic() < deadline:
+        product_id = rng.choices(products, cum_weights=weights)[0]
+        quantity = rng.randint(1, args.max_quantity)
+
+        outcome = timed(stats, 'cart_add', customer.post_json,
+                        '/api/cart/add/', {'product_id': product_id, 'quantity': quantity})
+        if outcome != 'ok':
+            timed(stats, 'cart_clear', customer.post_json, '/api/cart/clear/', {})
+            continue
+
+        if rng.random() < args.update_ratio:
+            quantity = rng.randint(1, args.max_quantity)
+            timed(stats, 'cart_update', customer.post_json,
+                  '/api/cart/update/', {'product_id': product_id, 'quantity': quantity})
+
+        form = {'payment_method': 'credit_card', 'shipping_address': '1 Load Test Way',
+                'idempotency_key': f'{rng.getrandbits(64):016x}'}
+        outcome = timed(stats, 'checkout', customer.post_form, '/checkout/', form, True)
+        if outcome == 'ok' and rng.random() < args.double_submit:
+            # A double click: same key, so the original answer comes back and no second order is placed
+            timed(stats, 'checkout_repeat', customer.post_form, '/checkout/', form, True)
+        if outcome != 'ok':
+            timed(stats, 'cart_clear', customer.post_json, '/api/cart/clear/', {})
+
+        if args.think_ms:
+            time.sleep(rng.uniform(0, args.think_ms) / 1000)
+
+
+def browse_loop(customer, products, deadline, stats, rng):
+    """Capacity scenario: mostly product pages, sometimes a cart add + clear."""
+    while time.monotonic() < deadline:
+        if rng.random() < 0.8:
+            timed(stats, 'products', customer.request, 'GET', f'/api/products/?page={rng.randint(1, 5)}')
+        else:
+            timed(stats, 'cart_add', customer.post_json,
+                  '/api/cart/add/', {'product_id': rng.choice(products), 'quantity': 1})
+            timed(stats, 'cart_clear', customer.post_json, '/api/cart/clear/', {})
+
+
+def timed(stats, operation, func, *args):
+    started = time.perf_counter()
+    try:
+        status, _, payload = func(*args)
+        outcome = classify(status, payload)
+    except (OSError, http.client.HTTPException):
+        outcome = 'error'
+    stats.record(operation, (time.perf_counter() - started) * 1000, outcome)
+    return outcome
+
+
+class LockSampler(threading.Thread):
+    """Samples ungranted lock requests on PostgreSQL while the test runs."""
+
+    def __init__(self, interval=0.25):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        from django.db import connection as thread_connection
+        try:
+            while not self.stopped.is_set():
+                with thread_connection.cursor() as cursor:
+                    cursor.execute('SELECT count(*) FROM pg_locks WHERE NOT granted')
+                    self.samples.append(cursor.fetchone()[0])
+                self.stopped.wait(self.interval)
+        finally:
+            thread_connection.close()
+
+    def summary(self):
+        waiting = [s for s in self.samples if s]
+        return {
+            'samples': len(self.samples),
+            'samples_with_waiters': len(waiting),
+            'max_waiters': max(self.samples, default=0),
+            'avg_waiters': round(sum(self.samples) / len(self.samples), 3) if self.samples else 0,
+        }
+
+
+# =============================================================================
+# SERVER
+# =============================================================================
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def boot_server(args):
+    """Start gunicorn with the Procfile (or Procfile.asgi) worker model and wait until it answers."""
+    port = args.port or free_port()
+    env = dict(os.environ, DEBUG=args.server_debug, PYTHONUNBUFFERED='1')
+    env['ALLOWED_HOSTS'] = ','.join(filter(None, [env.get('ALLOWED_HOSTS', ''), 'localhost', '127.0.0.1']))
+    # Every virtual customer logs in from 127.0.0.1
+    env.setdefault('LOGIN_THROTTLE_ENABLED', 'False')
+    command = [
+        sys.executable, '-m', 'gunicorn', args.app,
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(args.workers),
+        '--threads', str(args.threads),
+        '--worker-class', args.worker_class,
+        '--graceful-timeout', '5',
+        '--log-level', 'warning',
+    ]
+    print(f"🚀 Starting: {' '.join(command[2:])}")
+    server = subprocess.Popen(command, cwd=ROOT_DIR, env=env)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit('❌ Server exited during startup (is gunicorn installed?)')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/products/')
+            conn.getresponse().read()
+            conn.close()
+            return server, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.25)
+    server.terminate()
+    raise SystemExit('❌ Server did not become ready within 30 seconds')
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=['checkout', 'capacity', 'hot-sku'], default='checkout')
+    parser.add_argument('--users', type=int, default=20, help='Concurrent simulated customers')
+    parser.add_argument('--duration', type=float, default=30, help='Test length in seconds')
+    parser.add_argument('--hot-products', type=int, default=20, help='How many products shoppers buy from')
+    parser.add_argument('--skew', type=float, default=1.2, help='Zipf exponent for product choice')
+    parser.add_argument('--stock', type=int, help='Reset the hot products to this stock level first')
+    parser.add_argument('--max-quantity', type=int, default=3, help='Maximum quantity per cart line')
+    parser.add_argument('--update-ratio', type=float, default=0.3, help='Share of flows that update the cart')
+    parser.add_argument('--double-submit', type=float, default=0,
+                        help='Share of checkouts sent twice with the same idempotency key')
+    parser.add_argument('--think-ms', type=float, default=0, help='Max random pause between flows')
+    parser.add_argument('--password', default='seedpass123', help='Password of the seeded customers')
+    parser.add_argument('--seed', action='store_true', help='Run seed_scale before the test')
+    parser.add_argument('--connections', default='25,50,100,200',
+                        help='Capacity scenario: comma-separated concurrent connection steps')
+    parser.add_argument('--step-duration', type=float, default=15, help='Capacity scenario: seconds per step')
+    parser.add_argument('--slo-ms', type=float, default=500, help='Capacity scenario: p95 latency target')
+    parser.add_argument('--shards', default='0,1,2,4,8',
+                        help='Hot-SKU scenario: comma-separated stock shard counts, one step each')
+    parser.add_argument('--url', help='Target an already running server instead of booting gunicorn')
+    parser.add_argument('--server', choices=sorted(SERVER_PROFILES), default='wsgi',
+                        help='Server preset: wsgi (Procfile) or asgi (Procfile.asgi)')
+    parser.add_argument('--app', help='Application to serve (default: from --server)')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--worker-class', help='Gunicorn worker class (default: from --server)')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--server-debug', default='False', help='DEBUG value for the booted server')
+    parser.add_argument('--forwarded-proto', default='https',
+                        help='X-Forwarded-Proto to send, empty to omit (avoids the HTTPS redirect with DEBUG=False)')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--random-seed', type=int, default=7)
+    args = parser.parse_args()
+
+    app, worker_class = SERVER_PROFILES[args.server]
+    args.app = args.app or app
+    args.worker_class = args.worker_class or worker_class
+    return args
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.random_seed)
+
+    if args.seed:
+        call_command('seed_scale', customers=max(args.users * 10, 1000), orders=20000,
+                     users=args.users, password=args.password, force=True)
+
+    products = list(
+        Product.objects.filter(is_active=True, sku__startswith='SEED-')
+        .order_by('-stock_quantity').values_list('id', flat=True)[:args.hot_products]
+    ) or list(Product.objects.filter(is_active=True).values_list('id', flat=True)[:args.hot_products])
+    if not products:
+        raise SystemExit('❌ No products found. Run with --seed or `manage.py seed_scale` first.')
+    if args.stock is not None:
+        Product.objects.filter(id__in=products).update(stock_quantity=args.stock)
+    weights = list(accumulate(1.0 / rank ** args.skew for rank in range(1, len(products) + 1)))
+
+    if args.scenario == 'capacity':
+        connection.close()
+        return run_capacity(args, products, rng)
+    if args.scenario == 'hot-sku':
+        return run_hot_sku(args, Product.objects.get(id=products[0]), rng)
+
+    stock_before = dict(Product.objects.filter(id__in=products).values_list('id', 'stock_quantity'))
+    ledger_mark = InventoryTransaction.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    connection.close()
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server, base_url = boot_server(args)
+
+    try:
+        customers = []
+        for i in range(1, args.users + 1):
+            customer = VirtualCustomer(base_url, args.forwarded_proto)
+            if not customer.login(f'seed_customer_{i}', args.password):
+                raise SystemExit(f'❌ Login failed for seed_customer_{i} (seed the database first)')
+            customers.append(customer)
+        print(f'✓ Logged in {len(customers)} customers against {base_url}')
+
+        sampler = LockSampler() if connection.vendor == 'postgresql' else None
+        if sampler:
+            sampler.start()
+
+        stats = Stats()
+        started = time.monotonic()
+        deadline = started + args.duration
+        threads = [
+            threading.Thread(
+                target=shopper_loop,
+                args=(customer, products, weights, deadline, stats, args, random.Random(rng.random())),
+            )
+            for customer in customers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.monotonic() - started
+        for customer in customers:
+            customer.close()
+
+        if sampler:
+            sampler.stopped.set()
+            sampler.join()
+    finally:
+        if server:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    report = {
+        'target': base_url,
+        'server': None if args.url else {
+            'profile': args.server, 'app': args.app, 'workers': args.workers,
+            'threads': args.threads, 'worker_class': args.worker_class,
+        },
+        'database': connection.vendor,
+        'users': args.users,
+        'duration_s': round(duration, 2),
+        'operations': stats.summary(duration),
+        'inventory': reconcile(stock_before, ledger_mark),
+        'lock_waits': sampler.summary() if sampler else {
+            'lock_errors': sum(stats.outcomes[op].get('lock_error', 0) for op in stats.outcomes),
+        },
+    }
+    checkouts = report['operations'].get('checkout', {})
+    report['checkouts_per_second'] = round(checkouts.get('outcomes', {}).get('ok', 0) / duration, 2)
+    report['admission_queue_polls'] = sum(customer.queue_polls for customer in customers)
+
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + '\n')
+        print(f'✓ Report written to {args.output}')
+
+
+# =============================================================================
+# CAPACITY SCENARIO
+# =============================================================================
+
+def run_capacity(args, products, rng):
+    """Step up concurrent connections and record throughput / latency per step."""
+    steps = [int(step) for step in args.connections.split(',') if step.strip()]
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server, base_url = boot_server(args)
+
+    results = []
+    try:
+        # Log in once per seeded customer; extra connections share those sessions
+        sessions = []
+        for i in range(1, args.users + 1):
+            customer = VirtualCustomer(base_url, args.forwarded_proto)
+            if not customer.login(f'seed_customer_{i}', args.password):
+                raise SystemExit(f'❌ Login failed for seed_customer_{i} (seed the database first)')
+            customer.close()
+            sessions.append(customer.cookies)
+        print(f'✓ Logged in {len(sessions)} customers against {base_url}')
+
+        for step in steps:
+            clients = []
+            for i in range(step):
+                client = VirtualCustomer(base_url, args.forwarded_proto)
+                client.cookies = dict(sessions[i % len(sessions)])
+                clients.append(client)
+
+            stats = Stats()
+            started = time.monotonic()
+            deadline = started + args.step_duration
+            threads = [
+                threading.Thread(
+                    target=browse_loop,
+                    args=(client, products, deadline, stats, random.Random(rng.random())),
+                )
+                for client in clients
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            duration = time.monotonic() - started
+            for client in clients:
+                client.close()
+
+            results.append(capacity_step(step, duration, stats))
+            row = results[-1]
+            print(f"  {step:>5} connections: {row['throughput_rps']:>8} rps  p95 {row['p95_ms']:>8}ms  "
+                  f"errors {row['error_rate'] * 100:.1f}%")
+    finally:
+        if server:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    within_slo = [row['connections'] for row in results
+                  if row['p95_ms'] <= args.slo_ms and row['error_rate'] < 0.01]
+    report = {
+        'scenario': 'capacity',
+        'target': base_url,
+        'server': None if args.url else {
+            'profile': args.server, 'app': args.app, 'workers': args.workers,
+            'threads': args.threads, 'worker_class': args.worker_class,
+        },
+        'database': connection.vendor,
+        'step_duration_s': args.step_duration,
+        'slo_p95_ms': args.slo_ms,
+        'steps': results,
+        'max_connections_within_slo': max(within_slo, default=0),
+    }
+
+    print_capacity_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + '\n')
+        print(f'✓ Report written to {args.output}')
+
+
+# =============================================================================
+# HOT-SKU SCENARIO
+# =============================================================================
+
+def run_hot_sku(args, product, rng):
+    """One checkout step per shard count, everyone buying `product`."""
+    steps = [int(step) for step in args.shards.split(',') if step.strip()]
+    stock = args.stock if args.stock is not None else 1_000_000
+    original_shards = product.stock_shard_count
+    connection.close()
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server, base_url = boot_server(args)
+
+    results = []
+    try:
+        customers = []
+        for i in range(1, args.users + 1):
+            customer = VirtualCustomer(base_url, args.forwarded_proto)
+            if not customer.login(f'seed_customer_{i}', args.password):
+                raise SystemExit(f'❌ Login failed for seed_customer_{i} (seed the database first)')
+            customers.append(customer)
+        print(f'✓ Logged in {len(customers)} customers against {base_url}, hot SKU {product.sku}')
+
+        for shards in steps:
+            product.shard_stock(shards)
+            product.set_stock(stock)
+            stock_before = {product.id: stock}
+            ledger_mark = InventoryTransaction.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            connection.close()
+
+            stats = Stats()
+            started = time.monotonic()
+            deadline = started + args.step_duration
+            threads = [
+                threading.Thread(
+                    target=shopper_loop,
+                    args=(customer, [product.id], [1.0], deadline, stats, args, random.Random(rng.random())),
+                )
+                for customer in customers
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            duration = time.monotonic() - started
+
+            results.append(hot_sku_step(shards, duration, stats, reconcile(stock_before, ledger_mark)))
+            row = results[-1]
+            print(f"  {shards:>3} shards: {row['checkouts_per_second']:>8} checkouts/s  "
+                  f"p95 {row['checkout_p95_ms']:>8}ms  lock errors {row['lock_errors']}")
+        for customer in customers:
+            customer.close()
+    finally:
+        if server:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        product.shard_stock(original_shards)
+
+    report = {
+        'scenario': 'hot-sku',
+        'target': base_url,
+        'server': None if args.url else {
+            'profile': args.server, 'app': args.app, 'workers': args.workers,
+            'threads': args.threads, 'worker_class': args.worker_class,
+        },
+        'database': connection.vendor,
+        'product': {'id': product.id, 'sku': product.sku, 'stock': stock},
+        'users': args.users,
+        'step_duration_s': args.step_duration,
+        'steps': results,
+    }
+
+    print_hot_sku_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + '\n')
+        print(f'✓ Report written to {args.output}')
+
+
+def hot_sku_step(shards, duration, stats, inventory):
+    """Checkout throughput and inventory outcome of one shard count."""
+    operations = stats.summary(duration)
+    checkout = operations.get('checkout', {})
+    return {
+        'shards': shards,
+        'checkouts_per_second': round(checkout.get('outcomes', {}).get('ok', 0) / duration, 2),
+        'checkout_p50_ms': checkout.get('p50_ms', 0),
+        'checkout_p95_ms': checkout.get('p95_ms', 0),
+        'checkout_p99_ms': checkout.get('p99_ms', 0),
+        'lock_errors': sum(stats.outcomes[op].get('lock_error', 0) for op in stats.outcomes),
+        'oversell_incidents': inventory['oversell_incidents'],
+        'ledger_mismatches': inventory['ledger_mismatches'],
+        'operations': operations,
+    }
+
+
+def print_hot_sku_report(report):
+    server = report['server'] or {'profile': report['target']}
+    print('=' * 78)
+    print(f"HOT SKU  {report['product']['sku']}  {report['users']} users  server={server['profile']}  "
+          f"{report['step_duration_s']}s/step  database={report['database']}")
+    print('=' * 78)
+    print(f"{'shards':>7}{'ckout/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'locks':>7}{'oversell':>10}{'mismatch':>10}")
+    for row in report['steps']:
+        print(f"{row['shards']:>7}{row['checkouts_per_second']:>9}{row['checkout_p50_ms']:>9}"
+              f"{row['checkout_p95_ms']:>9}{row['checkout_p99_ms']:>9}{row['lock_errors']:>7}"
+              f"{row['oversell_incidents']:>10}{row['ledger_mismatches']:>10}")
+    print('-' * 78)
+    baseline = report['steps'][0]['checkouts_per_second'] if report['steps'] else 0
+    if baseline:
+        scaling = ', '.join(f"{row['shards']}: {row['checkouts_per_second'] / baseline:.2f}x"
+                            for row in report['steps'])
+        print(f"Throughput vs {report['steps'][0]['shards']} shards: {scaling}")
+
+
+def capacity_step(connections, duration, stats):
+    """Totals across all operations of one capacity step."""
+    samples = [ms for latencies in stats.latencies.values() for ms in latencies]
+    outcomes = defaultdict(int)
+    for per_operation in stats.outcomes.values():
+        for outcome, count in per_operation.items():
+            outcomes[outcome] += count
+    total = sum(outcomes.values()) or 1
+    return {
+        'connections': connections,
+        'requests': sum(outcomes.values()),
+        'throughput_rps': round(sum(outcomes.values()) / duration, 2),
+        'p50_ms': round(percentile(samples, 50), 2),
+        'p95_ms': round(percentile(samples, 95), 2),
+        'p99_ms': round(percentile(samples, 99), 2),
+        'error_rate': round((outcomes.get('error', 0) + outcomes.get('lock_error', 0)) / total, 4),
+        'outcomes': dict(outcomes),
+        'operations': stats.summary(duration),
+    }
+
+
+def print_capacity_report(report):
+    server = report['server'] or {'profile': report['target']}
+    print('=' * 78)
+    print(f"CAPACITY  server={server['profile']}  {report['step_duration_s']}s/step  "
+          f"database={report['database']}")
+    print('=' * 78)
+    print(f"{'conns':>7}{'reqs':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>7}")
+    for row in report['steps']:
+        print(f"{row['connections']:>7}{row['requests']:>8}{row['throughput_rps']:>9}{row['p50_ms']:>9}"
+              f"{row['p95_ms']:>9}{row['p99_ms']:>9}{row['error_rate'] * 100:>6.1f}%")
+    print('-' * 78)
+    print(f"Max connections within p95 <= {report['slo_p95_ms']:g}ms and <1% errors: "
+          f"{report['max_connections_within_slo']}")
+
+
+def reconcile(stock_before, ledger_mark):
+    """Compare final stock with the starting stock plus the ledger written during the run."""
+    ledger = dict(
+        InventoryTransaction.objects.filter(id__gt=ledger_mark, product_id__in=stock_before)
+        .values('product_id').annotate(change=Sum('quantity_change')).values_list('product_id', 'change')
+    )
+    stock_after = dict(Product.objects.filter(id__in=stock_before).values_list('id', 'stock_quantity'))
+    # Sharded products: compare against the shards themselves, not the synced total
+    for product_id in Product.objects.filter(id__in=stock_before, stock_shard_count__gt=0).values_list('id', flat=True):
+        stock_after[product_id] = StockShard.total(product_id)
+
+    oversold, lost_updates = [], []
+    for product_id, before in stock_before.items():
+        change = ledger.get(product_id, 0)
+        after = stock_after.get(product_id, 0)
+        if before + change < 0 or after < 0:
+            oversold.append({'product_id': product_id, 'units': -min(before + change, after)})
+        if before + change != after:
+            lost_updates.append({'product_id': product_id, 'expected': before + change, 'actual': after})
+    return {
+        'products_checked': len(stock_before),
+        'oversell_incidents': len(oversold),
+        'oversold': oversold,
+        'ledger_mismatches': len(lost_updates),
+        'mismatched': lost_updates,
+    }
+
+
+def print_report(report):
+    print('=' * 78)
+    print(f"LOAD TEST  {report['users']} users  {report['duration_s']}s  database={report['database']}")
+    print('=' * 78)
+    print(f"{'operation':<12}{'reqs':>7}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>7}  outcomes")
+    for operation, row in report['operations'].items():
+        print(f"{operation:<12}{row['requests']:>7}{row['throughput_rps']:>8}{row['p50_ms']:>9}"
+              f"{row['p95_ms']:>9}{row['p99_ms']:>9}{row['error_rate'] * 100:>6.1f}%  {row['outcomes']}")
+    print('-' * 78)
+    print(f"Checkouts/second: {report['checkouts_per_second']}")
+    inventory = report['inventory']
+    print(f"Oversell incidents: {inventory['oversell_incidents']}   "
+          f"Ledger mismatches (lost updates): {inventory['ledger_mismatches']}")
+    print(f"Lock waits: {report['lock_waits']}")
+    print(f"Admission queue polls: {report['admission_queue_polls']}")
+
+
+if __name__ == '__main__':
+    main()
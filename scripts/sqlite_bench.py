@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+"""
+SQLite read/write concurrency benchmark: stock settings vs the tuned profile.
+Usage: python scripts/sqlite_bench.py --readers 8 --writers 4 --duration 20
+
+Copies the SQLite database twice (rollback journal for "stock", WAL for
+"tuned"), then runs the same workload against each copy in a child process:
+writer threads place orders through Order.create_from_cart (the checkout
+path) while reader threads run dashboard-style queries. Reports throughput,
+p50/p95/p99 latency and `database is locked` errors per operation and mode.
+The original database is never written to.
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+MODES = {
+    # mode: (SQLITE_TUNED, journal_mode of the copy)
+    'stock': ('False', 'DELETE'),
+    'tuned': ('True', 'WAL'),
+}
+LOCK_MARKERS = ('database is locked', 'database table is locked')
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def prepare_copy(source, target, journal_mode):
+    """Consistent copy of the database with the given journal mode and ample stock."""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    with dst:
+        src.backup(dst)
+    src.close()
+    dst.execute(f'PRAGMA journal_mode = {journal_mode}')
+    # Keep checkouts from being rejected for stock; we measure locking, not inventory
+    dst.execute('UPDATE products SET stock_quantity = 1000000 WHERE is_active = 1')
+    dst.commit()
+    dst.close()
+
+
+# =============================================================================
+# WORKER (runs inside the child process)
+# =============================================================================
+
+def run_worker(args):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lib.ECommerce.Config')
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.db.models import Sum
+    from django.db.utils import OperationalError
+
+    from lib.ECommerce.Models.Customer import Customer
+    from lib.ECommerce.Models.Order import Order
+    from lib.ECommerce.Models.Product import Product
+
+    customer_ids = list(Customer.objects.values_list('id', flat=True)[:500])
+    products = list(Product.objects.filter(is_active=True).values('id', 'name', 'price_cents'))
+    connection.close()
+    if not customer_ids or not products:
+        raise SystemExit('Database needs customers and products (run `manage.py seed_scale`)')
+
+    lock = threading.Lock()
+    latencies = defaultdict(list)
+    outcomes = defaultdict(lambda: defaultdict(int))
+    error_samples = defaultdict(set)
+    deadline = time.monotonic() + args.duration
+
+    def record(operation, started, outcome, message=None):
+        with lock:
+            latencies[operation].append((time.perf_counter() - started) * 1000)
+            outcomes[operation][outcome] += 1
+            if message and len(error_samples[operation]) < 5:
+                error_samples[operation].add(str(message)[:200])
+
+    def classify_error(error):
+        return 'lock_error' if any(m in str(error).lower() for m in LOCK_MARKERS) else 'error'
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while time.monotonic() < deadline:
+            product = rng.choice(products)
+            started = time.perf_counter()
+            try:
+                customer = Customer.objects.get(id=rng.choice(customer_ids))
+                result = Order.create_from_cart(
+                    customer=customer,
+                    cart_items=[{
+                        'product_id': product['id'],
+                        'name': product['name'],
+                        'price_cents': product['price_cents'],
+                        'quantity': rng.randint(1, 3),
+                    }],
+                    payment_method='credit_card',
+                    shipping_address='1 Bench Street',
+                )
+                message = None if result['success'] else result['message']
+            except OperationalError as e:
+                message = e
+            record('checkout', started, classify_error(message) if message else 'ok', message)
+        connection.close()
+
+    def reader(seed):
+        rng = random.Random(seed)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                list(Order.get_recent_orders(20))
+                Order.objects.filter(customer_id=rng.choice(customer_ids)).count()
+                Order.objects.exclude(status='cancelled').aggregate(total=Sum('total_cents'))
+                message = None
+            except OperationalError as e:
+                message = e
+            record('dashboard_read', started, classify_error(message) if message else 'ok', message)
+        connection.close()
+
+    threads = [threading.Thread(target=writer, args=(args.seed + i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(args.seed + 1000 + i,)) for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        journal_mode = cursor.fetchone()[0]
+
+    report = {'journal_mode': journal_mode, 'operations': {}}
+    for operation, samples in sorted(latencies.items()):
+        counts = dict(outcomes[operation])
+        report['operations'][operation] = {
+            'count': len(samples),
+            'ok_per_sec': round(counts.get('ok', 0) / args.duration, 2),
+            'p50_ms': round(percentile(samples, 50), 2),
+            'p95_ms': round(percentile(samples, 95), 2),
+            'p99_ms': round(percentile(samples, 99), 2),
+            'max_ms': round(max(samples), 2),
+            'outcomes': counts,
+            'error_samples': sorted(error_samples[operation]),
+        }
+    print(json.dumps(report))
+
+
+# =============================================================================
+# DRIVER
+# =============================================================================
+
+def run_mode(mode, database, args):
+    tuned, journal_mode = MODES[mode]
+    with tempfile.TemporaryDirectory(prefix=f'shoppy-bench-{mode}-') as workdir:
+        copy = Path(workdir) / 'bench.db'
+        print(f'📋 {mode}: copying {database} ({journal_mode} journal)...')
+        prepare_copy(database, copy, journal_mode)
+
+        env = dict(os.environ, SQLITE_TUNED=tuned, SQLITE_PATH=str(copy),
+                   SLOW_QUERY_ENABLED='False', TRACING_ENABLED='False')
+        env.pop('DATABASE_URL', None)
+        command = [sys.executable, __file__, '--worker',
+                   '--readers', str(args.readers), '--writers', str(args.writers),
+                   '--duration', str(args.duration), '--seed', str(args.seed)]
+        print(f'🚀 {mode}: {args.writers} writers + {args.readers} readers for {args.duration}s...')
+        result = subprocess.run(command, env=env, cwd=ROOT_DIR, capture_output=True, text=True)
+        if result.returncode != 0:
+            sys.stderr.write(result.stderr)
+            raise SystemExit(f'❌ {mode} run failed')
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare SQLite concurrency with stock vs tuned settings')
+    parser.add_argument('--database', default=str(ROOT_DIR / 'data' / 'ecommerce.db'), help='SQLite file to copy')
+    parser.add_argument('--readers', type=int, default=8, help='Reader threads')
+    parser.add_argument('--writers', type=int, default=4, help='Writer (checkout) threads')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per mode')
+    parser.add_argument('--mode', choices=sorted(MODES), action='append', help='Only run this mode (repeatable)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    if not Path(args.database).exists():
+        raise SystemExit(f'❌ Database not found: {args.database}')
+
+    results = {mode: run_mode(mode, args.database, args) for mode in (args.mode or ['stock', 'tuned'])}
+
+    print()
+    print(f"{'mode':<7} {'operation':<16} {'ok/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'locked':>7} {'errors':>7}")
+    for mode, report in results.items():
+        for operation, row in report['operations'].items():
+            print(f"{mode:<7} {operation:<16} {row['ok_per_sec']:>8.1f} {row['p50_ms']:>7.1f}ms "
+                  f"{row['p95_ms']:>7.1f}ms {row['p99_ms']:>7.1f}ms "
+                  f"{row['outcomes'].get('lock_error', 0):>7} {row['outcomes'].get('error', 0):>7}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({
+            'readers': args.readers,
+            'writers': args.writers,
+            'duration': args.duration,
+            'results': results,
+        }, indent=2))
+        print(f'\n✅ Report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()